@@ -0,0 +1,48 @@
+"""
+Following N accounts: N calls to Database.follow_user (one round trip and
+transaction each) vs one Database.bulk_follow call.
+
+    PYTHONPATH=src python benchmarks/bench_bulk_follow.py [--follows 1000]
+
+Runs in an isolated bench_bulk_follow schema of the POSTGRES_* database, which is dropped at the end.
+"""
+import argparse
+import time
+from sqlalchemy import text
+from business_logic.users.users_schemas import FollowEdge
+from database.db import Database
+from isolated_schema import isolated_engine
+
+SCHEMA = "bench_bulk_follow"
+
+SEED_USERS = """
+INSERT INTO users (internal_id, id, username, name, email, createdat)
+SELECT gen_random_uuid(), gen_random_uuid(), 'user' || i, 'User', 'user' || i || '@gmail.com', now()
+FROM generate_series(0, :users) AS i
+"""
+
+def run(follows: int) -> dict:
+    with isolated_engine(SCHEMA) as engine:
+        database = Database(engine)
+        with engine.begin() as connection:
+            connection.execute(text(SEED_USERS), {"users": 2 * follows + 1})
+            ids = connection.execute(text("SELECT id FROM users ORDER BY username")).scalars().all()
+        single_follower, bulk_follower, followed = ids[0], ids[1], ids[2:follows + 2]
+
+        start = time.perf_counter()
+        for followed_id in followed:
+            database.follow_user(str(single_follower), str(followed_id))
+        single_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = database.bulk_follow([FollowEdge(follower_id=bulk_follower, followed_id=followed_id) for followed_id in followed])
+        bulk_s = time.perf_counter() - start
+        assert all(result.status == "followed" for result in results)
+        return {"follows": follows, "single_s": round(single_s, 3), "bulk_s": round(bulk_s, 3), "speedup": round(single_s / bulk_s, 1)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--follows", type=int, default=1000)
+    args = parser.parse_args()
+    result = run(args.follows)
+    print(f"{result['follows']} follows: follow_user loop {result['single_s']} s, bulk_follow {result['bulk_s']} s ({result['speedup']}x)")
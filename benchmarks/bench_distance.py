@@ -0,0 +1,69 @@
+"""
+Nearby users distance computation: geopy loop (previous get_near_users) vs
+vectorized haversine (utils.geo.rank_by_distance).
+
+    PYTHONPATH=src python benchmarks/bench_distance.py [--sizes 10000 100000 1000000] [--geopy-sample 20000]
+
+The geopy loop is timed on at most --geopy-sample points and extrapolated
+linearly, at 1M points it would take minutes.
+"""
+import argparse
+import time
+import numpy as np
+from geopy.distance import geodesic
+from utils.geo import rank_by_distance
+
+ORIGIN = (-34.6274, -58.4431)
+RADIUS_KM = 10.0
+
+def make_points(n: int, rng) -> list[tuple[float, float]]:
+    # half of the points around the origin, like a bounding box candidate set
+    lats = np.concatenate([rng.normal(ORIGIN[0], 0.1, n // 2), rng.uniform(-60, 60, n - n // 2)])
+    longs = np.concatenate([rng.normal(ORIGIN[1], 0.1, n // 2), rng.uniform(-180, 180, n - n // 2)])
+    return list(zip(lats.tolist(), longs.tolist()))
+
+def geopy_loop(points):
+    near = []
+    for point in points:
+        distance_km = geodesic(ORIGIN, point).kilometers
+        if distance_km <= RADIUS_KM:
+            near.append((point, distance_km))
+    near.sort(key=lambda item: item[1])
+    return near
+
+def timed(fn, *args) -> tuple[float, object]:
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+def run(sizes: list[int], geopy_sample: int) -> list[dict]:
+    rng = np.random.default_rng(42)
+    results = []
+    for n in sizes:
+        points = make_points(n, rng)
+        vectorized_s, ranked = timed(rank_by_distance, ORIGIN, points, RADIUS_KM, lambda point: point)
+        sample = points[:min(n, geopy_sample)]
+        geopy_s, near = timed(geopy_loop, sample)
+        geopy_s *= n / len(sample)
+        if len(sample) == n:
+            # same cut as the exact geodesic loop (order may differ by the haversine error)
+            assert {point for point, _ in ranked} == {point for point, _ in near}
+        results.append({
+            "points": n,
+            "geopy_s": round(geopy_s, 4),
+            "vectorized_s": round(vectorized_s, 4),
+            "speedup": round(geopy_s / vectorized_s, 1),
+            "geopy_extrapolated": len(sample) < n,
+        })
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--geopy-sample", type=int, default=20_000)
+    args = parser.parse_args()
+    print(f"{'points':>10} {'geopy (s)':>12} {'vectorized (s)':>15} {'speedup':>8}")
+    for row in run(args.sizes, args.geopy_sample):
+        mark = "*" if row["geopy_extrapolated"] else " "
+        print(f"{row['points']:>10} {row['geopy_s']:>11}{mark} {row['vectorized_s']:>15} {row['speedup']:>7}x")
+    print("* extrapolated from --geopy-sample points")
@@ -0,0 +1,76 @@
+"""
+Streaming NDJSON export (Database.export_users) vs loading the whole users
+table in memory, at growing table sizes: the export's peak memory must stay
+flat while the in-memory one grows with the table.
+
+    PYTHONPATH=src python benchmarks/bench_export.py [--users 10000,100000,300000]
+
+Users are seeded with generate_series into an isolated bench_export schema of
+the POSTGRES_* database, which is dropped at the end. Peak memory is the
+Python heap (tracemalloc), measured on a second, untimed pass.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from database.db import Database, USER_RESPONSE_COLUMNS, user_to_response
+from isolated_schema import isolated_engine
+
+SCHEMA = "bench_export"
+
+SEED_USERS = """
+INSERT INTO users (internal_id, id, username, name, email, "profilePic", createdat)
+SELECT gen_random_uuid(), gen_random_uuid(), 'user' || i, 'Name' || i, 'user' || i || '@gmail.com', '',
+       now() - i * interval '1 second'
+FROM generate_series(:start, :end) AS i
+"""
+
+def load_all(engine) -> int:
+    with Session(engine) as session:
+        users = [user_to_response(row) for row in session.execute(select(*USER_RESPONSE_COLUMNS)).all()]
+        return len("".join(json.dumps(user, default=str) + "\n" for user in users))
+
+def export_all(database: Database) -> int:
+    return sum(len(chunk) for chunk in database.export_users())
+
+def measure(fn) -> tuple[float, float]:
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak / 2**20
+
+def run(sizes: list[int]) -> list[dict]:
+    with isolated_engine(SCHEMA) as engine:
+        database = Database(engine)
+        results, seeded = [], 0
+        for size in sorted(sizes):
+            with engine.begin() as connection:
+                connection.execute(text(SEED_USERS), {"start": seeded + 1, "end": size})
+                connection.execute(text("ANALYZE users"))
+            seeded = size
+            load_seconds, load_mb = measure(lambda: load_all(engine))
+            export_seconds, export_mb = measure(lambda: export_all(database))
+            results.append({
+                "users": size,
+                "load_all_seconds": round(load_seconds, 2),
+                "load_all_peak_mb": round(load_mb, 1),
+                "export_seconds": round(export_seconds, 2),
+                "export_peak_mb": round(export_mb, 1),
+                "export_rows_per_second": round(size / export_seconds),
+            })
+        return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="10000,100000,300000", help="comma separated table sizes")
+    args = parser.parse_args()
+    results = run([int(size) for size in args.users.split(",")])
+    print(f"{'users':>8} {'load all s':>11} {'load all MB':>12} {'export s':>9} {'export MB':>10} {'export rows/s':>14}")
+    for row in results:
+        print(f"{row['users']:>8} {row['load_all_seconds']:>11} {row['load_all_peak_mb']:>12} {row['export_seconds']:>9} {row['export_peak_mb']:>10} {row['export_rows_per_second']:>14}")
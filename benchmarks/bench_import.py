@@ -0,0 +1,57 @@
+"""
+Bulk user import throughput (jobs.import_users) vs one insert_user per user
+(the /users/temp path).
+
+    PYTHONPATH=src python benchmarks/bench_import.py [--users 100000] [--batch-size 5000] [--single-sample 2000]
+
+Half of the generated users are completed (userinfo and interests), 1% are
+duplicates. Runs in an isolated bench_import schema of the POSTGRES_*
+database, which is dropped at the end.
+"""
+import argparse
+import io
+import json
+import random
+import time
+from sqlalchemy import text
+from business_logic.users.users_schemas import UserAccountBase
+from database.db import Database
+from jobs.import_users import import_users, read_rows
+from isolated_schema import isolated_engine
+from uuid import uuid4
+
+SCHEMA = "bench_import"
+INTERESTS = ["music", "sports", "reading", "travel", "cooking", "movies", "gaming", "art"]
+
+def make_ndjson(n: int, rng) -> io.StringIO:
+    lines = []
+    for i in range(n):
+        # 1% repeat an earlier username
+        username = f"user{rng.randrange(i)}" if i and rng.random() < 0.01 else f"user{i}"
+        record = {"username": username, "name": "User", "email": f"{username}.{i}@gmail.com"}
+        if i % 2:
+            record.update(supabase_id=str(uuid4()), birthdate="01/01/2000", locationLat=rng.uniform(-60, 60),
+                          locationLong=rng.uniform(-180, 180), interests=",".join(rng.sample(INTERESTS, 3)))
+        lines.append(json.dumps(record))
+    return io.StringIO("\n".join(lines))
+
+def run(users: int, batch_size: int, single_sample: int) -> dict:
+    with isolated_engine(SCHEMA) as engine:
+        database = Database(engine)
+        summary = import_users(database, read_rows(make_ndjson(users, random.Random(42)), "ndjson"), batch_size)
+
+        start = time.perf_counter()
+        for i in range(single_sample):
+            database.insert_user(UserAccountBase(username=f"single{i}", name="User", email=f"single{i}@gmail.com"))
+        single_rows_per_second = round(single_sample / (time.perf_counter() - start))
+        return {**summary, "users": users, "single_rows_per_second": single_rows_per_second}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--single-sample", type=int, default=2000)
+    args = parser.parse_args()
+    result = run(args.users, args.batch_size, args.single_sample)
+    print(f"import: {result['imported']} imported, {result['rejected']} rejected in {result['seconds']} s ({result['rows_per_second']} rows/s)")
+    print(f"insert_user: {result['single_rows_per_second']} rows/s ({result['rows_per_second'] / result['single_rows_per_second']:.1f}x slower)")
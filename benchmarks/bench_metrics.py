@@ -0,0 +1,87 @@
+"""
+Overhead of the metrics subsystem on the hot path: MetricsMiddleware per
+request (trivial route, in-process ASGI calls) and the engine hooks per SQL
+statement (SELECT 1 on the POSTGRES_* database).
+
+    PYTHONPATH=src python benchmarks/bench_metrics.py [--requests 5000] [--statements 5000]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import text
+from database.instrumentation import instrument_engine, track_queries
+from middleware.metrics import MetricsMiddleware
+from utils.engine import get_engine
+from utils.metrics import MetricsRegistry
+
+def make_app(metrics: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/users/{user_id}")
+    async def get_user(user_id: str):
+        return {"id": user_id}
+
+    if metrics:
+        app.add_middleware(MetricsMiddleware, registry=MetricsRegistry())
+    return app
+
+ROUNDS = 5
+
+async def request_us(client: httpx.AsyncClient, requests: int) -> float:
+    start = time.perf_counter()
+    for i in range(requests):
+        await client.get(f"/users/{i}")
+    return (time.perf_counter() - start) / requests * 1e6
+
+async def compare_requests(requests: int) -> tuple[float, float]:
+    # rounds alternate between both apps so drift affects them alike, medians are compared
+    clients = [httpx.AsyncClient(transport=httpx.ASGITransport(app=make_app(metrics)), base_url="http://bench") for metrics in (False, True)]
+    samples = ([], [])
+    for _ in range(ROUNDS):
+        for client, client_samples in zip(clients, samples):
+            client_samples.append(await request_us(client, requests // ROUNDS))
+    for client in clients:
+        await client.aclose()
+    return statistics.median(samples[0]), statistics.median(samples[1])
+
+def statement_us(connection, statements: int) -> float:
+    start = time.perf_counter()
+    for _ in range(statements):
+        connection.execute(text("SELECT 1"))
+    return (time.perf_counter() - start) / statements * 1e6
+
+def compare_statements(statements: int) -> tuple[float, float]:
+    engines = [get_engine(), get_engine()]
+    instrument_engine(engines[1])
+    samples = ([], [])
+    try:
+        with track_queries(), engines[0].connect() as plain, engines[1].connect() as hooked:
+            for _ in range(ROUNDS):
+                for connection, connection_samples in zip((plain, hooked), samples):
+                    connection_samples.append(statement_us(connection, statements // ROUNDS))
+    finally:
+        for engine in engines:
+            engine.dispose()
+    return statistics.median(samples[0]), statistics.median(samples[1])
+
+def run(requests: int, statements: int) -> dict:
+    plain, measured = asyncio.run(compare_requests(requests))
+    raw, hooked = compare_statements(statements)
+    return {
+        "request_us": round(plain, 1),
+        "request_with_metrics_us": round(measured, 1),
+        "statement_us": round(raw, 1),
+        "statement_with_hooks_us": round(hooked, 1),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--statements", type=int, default=5000)
+    args = parser.parse_args()
+    result = run(args.requests, args.statements)
+    print(f"request:   {result['request_us']} us -> {result['request_with_metrics_us']} us with MetricsMiddleware (+{round(result['request_with_metrics_us'] - result['request_us'], 1)} us)")
+    print(f"statement: {result['statement_us']} us -> {result['statement_with_hooks_us']} us with the engine hooks (+{round(result['statement_with_hooks_us'] - result['statement_us'], 1)} us)")
@@ -0,0 +1,103 @@
+"""
+Transactional outbox: what a follow pays for writing its event in its own
+transaction, and how fast concurrent dispatchers (standing for the workers of
+several replicas) drain a backlog, checking no event is delivered twice.
+
+    PYTHONPATH=src:benchmarks python benchmarks/bench_outbox.py [--follows 1000] [--events 20000]
+        [--dispatchers 1,2,4] [--batch-size 100] [--broker-ms 5]
+
+Runs against an isolated bench_outbox schema of the POSTGRES_* database. The
+broker is in memory, every batch waits --broker-ms as a round trip to RabbitMQ
+would.
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+from uuid import uuid4
+from sqlalchemy import text
+from isolated_schema import isolated_engine
+from business_logic.users.users_service import UserAccountService
+from database.db import Database
+from utils.events import InMemoryBroker, OutboxDispatcher
+from utils.metrics import MetricsRegistry
+
+SCHEMA = "bench_outbox"
+
+class RemoteBroker(InMemoryBroker):
+    def __init__(self, latency: float):
+        super().__init__()
+        self.latency = latency
+
+    async def publish_batch(self, events: list[dict]):
+        await asyncio.sleep(self.latency)
+        await super().publish_batch(events)
+
+def follow_ms(engine, follows: int, outbox: bool) -> float:
+    database = Database(engine, outbox=outbox)
+    database.clear_table()
+    with engine.begin() as connection:
+        ids = [uuid4() for _ in range(follows + 1)]
+        connection.execute(text("INSERT INTO users (internal_id, id, username) SELECT gen_random_uuid(), id, id::text FROM unnest(CAST(:ids AS uuid[])) AS id"), {"ids": ids})
+    start = time.perf_counter()
+    for followed_id in ids[1:]:
+        database.follow_user(str(ids[0]), str(followed_id))
+    return (time.perf_counter() - start) / follows * 1000
+
+def write_backlog(engine, events: int):
+    database = Database(engine, outbox=True)
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM outbox_events"))
+        for start in range(0, events, 5000):
+            database.add_events(connection, "user.followed", *({"n": n} for n in range(start, min(events, start + 5000))))
+
+async def drain(engine, dispatchers: int, batch_size: int, broker_ms: float) -> tuple[float, list[dict]]:
+    broker = RemoteBroker(broker_ms / 1000)
+    services = []
+    for _ in range(dispatchers):
+        service = UserAccountService(engine, OutboxDispatcher(broker, batch_size=batch_size, poll_interval=0.01, registry=MetricsRegistry()))
+        services.append(service)
+    start = time.perf_counter()
+    for service in services:
+        service.outbox.start(service)
+    with engine.connect() as connection:
+        while connection.execute(text("SELECT EXISTS (SELECT 1 FROM outbox_events WHERE delivered_at IS NULL)")).scalar():
+            connection.rollback()
+            await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    for service in services:
+        await service.outbox.stop()
+    return elapsed, broker.events
+
+def run(follows: int, events: int, dispatcher_counts: list[int], batch_size: int, broker_ms: float) -> dict:
+    with isolated_engine(SCHEMA) as engine:
+        result = {
+            "follow_ms": round(follow_ms(engine, follows, outbox=False), 3),
+            "follow_with_outbox_ms": round(follow_ms(engine, follows, outbox=True), 3),
+            "drain": [],
+        }
+        for dispatchers in dispatcher_counts:
+            write_backlog(engine, events)
+            elapsed, published = asyncio.run(drain(engine, dispatchers, batch_size, broker_ms))
+            duplicates = sum(count - 1 for count in Counter(event["id"] for event in published).values())
+            result["drain"].append({
+                "dispatchers": dispatchers,
+                "events_per_second": round(len(published) / elapsed),
+                "published": len(published),
+                "duplicates": duplicates,
+            })
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--follows", type=int, default=1000)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--dispatchers", default="1,2,4", help="concurrent dispatchers, comma separated")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--broker-ms", type=float, default=5, help="simulated broker round trip per batch")
+    args = parser.parse_args()
+    result = run(args.follows, args.events, [int(count) for count in args.dispatchers.split(",")], args.batch_size, args.broker_ms)
+    print(f"follow_user: {result['follow_ms']} ms, {result['follow_with_outbox_ms']} ms with its outbox event")
+    print(f"{'dispatchers':>12} {'events/s':>10} {'published':>10} {'duplicates':>11}")
+    for row in result["drain"]:
+        print(f"{row['dispatchers']:>12} {row['events_per_second']:>10} {row['published']:>10} {row['duplicates']:>11}")
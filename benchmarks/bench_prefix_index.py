@@ -0,0 +1,58 @@
+"""
+Username prefix lookups on utils.prefix_index.PrefixIndex (GET /users?filter=<prefix>%).
+
+    PYTHONPATH=src python benchmarks/bench_prefix_index.py [--users 1000000] [--limit 20] [--repeat 200]
+
+Usernames are random lowercase strings, shorter prefixes match (and sort) more users.
+"""
+import argparse
+import random
+import string
+import statistics
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+from utils.prefix_index import PrefixIndex
+
+def make_rows(n: int, rng) -> list[tuple]:
+    start = datetime(2024, 1, 1)
+    return [
+        ("".join(rng.choices(string.ascii_lowercase, k=rng.randint(6, 14))), start + timedelta(seconds=i), uuid4())
+        for i in range(n)
+    ]
+
+def run(users: int, limit: int, repeat: int) -> dict:
+    rng = random.Random(42)
+    rows = make_rows(users, rng)
+    index = PrefixIndex()
+    start = time.perf_counter()
+    index.load(rows)
+    load_s = time.perf_counter() - start
+
+    lookups = []
+    for length in range(1, 6):
+        prefixes = [rows[rng.randrange(users)][0][:length] for _ in range(repeat)]
+        samples = []
+        for prefix in prefixes:
+            start = time.perf_counter()
+            index.lookup(prefix, limit)
+            samples.append((time.perf_counter() - start) * 1_000_000)
+        samples.sort()
+        lookups.append({
+            "prefix_length": length,
+            "p50_us": round(statistics.median(samples), 1),
+            "p95_us": round(samples[int(len(samples) * 0.95) - 1], 1),
+        })
+    return {"users": users, "load_s": round(load_s, 2), "lookups": lookups}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    result = run(args.users, args.limit, args.repeat)
+    print(f"{result['users']} usernames loaded in {result['load_s']} s")
+    print(f"{'prefix':>7} {'p50 (us)':>10} {'p95 (us)':>10}")
+    for row in result["lookups"]:
+        print(f"{row['prefix_length']:>7} {row['p50_us']:>10} {row['p95_us']:>10}")
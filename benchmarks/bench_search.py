@@ -0,0 +1,75 @@
+"""
+User search: previous unbounded ILIKE scan vs ranked, paginated search
+(Database.search_users) on a synthetic users table.
+
+    PYTHONPATH=src python benchmarks/bench_search.py [--users 1000000] [--repeat 20] [--limit 20]
+
+Users are seeded with generate_series into an isolated bench_search schema of
+the POSTGRES_* database, which is dropped at the end. Trigram indexes and fuzzy
+matches are only used when the server has pg_trgm.
+"""
+import argparse
+import statistics
+import time
+from sqlalchemy import or_, select, text
+from sqlalchemy.orm import Session
+from business_logic.users.users_model import Users
+from database.db import Database, USER_RESPONSE_COLUMNS, user_to_response
+from isolated_schema import isolated_engine
+
+SCHEMA = "bench_search"
+QUERIES = ["u", "user42", "user9999", "name12", "sofia", "99999"]
+
+SEED_USERS = """
+INSERT INTO users (internal_id, id, username, name, email, "profilePic", createdat)
+SELECT gen_random_uuid(), gen_random_uuid(), 'user' || i, 'Name' || (i % 50000), 'user' || i || '@gmail.com', '',
+       now() - i * interval '1 second'
+FROM generate_series(1, :users) AS i
+"""
+
+def old_search(engine, username: str) -> list:
+    with Session(engine) as session:
+        statement = select(*USER_RESPONSE_COLUMNS).where(or_(Users.username.ilike(f"%{username}%"), Users.name.ilike(f"%{username}%")))
+        return [user_to_response(row) for row in session.execute(statement).all()]
+
+def latencies_ms(fn, repeat: int) -> tuple[float, float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+def run(users: int, repeat: int, limit: int) -> list[dict]:
+    with isolated_engine(SCHEMA) as engine:
+        database = Database(engine)
+        with engine.begin() as connection:
+            connection.execute(text(SEED_USERS), {"users": users})
+            connection.execute(text("ANALYZE users"))
+
+        results = []
+        for query in QUERIES:
+            old_p50, old_p95 = latencies_ms(lambda: old_search(engine, query), repeat)
+            new_p50, new_p95 = latencies_ms(lambda: database.search_users(query, limit), repeat)
+            results.append({
+                "query": query,
+                "old_p50_ms": round(old_p50, 2),
+                "old_p95_ms": round(old_p95, 2),
+                "new_p50_ms": round(new_p50, 2),
+                "new_p95_ms": round(new_p95, 2),
+                "trigram": database.trigram,
+            })
+        return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+    results = run(args.users, args.repeat, args.limit)
+    print(f"pg_trgm: {'yes' if results[0]['trigram'] else 'no'}")
+    print(f"{'query':>10} {'old p50':>9} {'old p95':>9} {'new p50':>9} {'new p95':>9}  (ms)")
+    for row in results:
+        print(f"{row['query']:>10} {row['old_p50_ms']:>9} {row['old_p95_ms']:>9} {row['new_p50_ms']:>9} {row['new_p95_ms']:>9}")
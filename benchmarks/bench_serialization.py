@@ -0,0 +1,113 @@
+"""
+Cost of sending a list of users, per 10k users, previous path vs fast path:
+
+  before: Users entities, mapped to UserCreationResponse models that FastAPI
+          validates again against response_model and serializes
+  after:  rows of USER_RESPONSE_COLUMNS mapped to plain dicts, sent with
+          FastJSONResponse (orjson)
+
+    PYTHONPATH=src python benchmarks/bench_serialization.py [--users 10000] [--repeat 20]
+
+"serialization" maps and encodes users already in memory, "query + serialization"
+also fetches them from an isolated bench_serialization schema of the POSTGRES_*
+database, which is dropped at the end. Both go through a throwaway app.
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from business_logic.users.users_model import Users
+from business_logic.users.users_schemas import UserCreationResponse
+from database.db import USER_RESPONSE_COLUMNS, user_to_response
+from utils.json_response import FastJSONResponse
+from isolated_schema import isolated_engine
+
+SCHEMA = "bench_serialization"
+
+SEED_USERS = """
+INSERT INTO users (internal_id, id, username, name, email, "profilePic", createdat)
+SELECT gen_random_uuid(), gen_random_uuid(), 'user' || i, 'Name ' || i, 'user' || i || '@gmail.com', '',
+       now() - i * interval '1 second'
+FROM generate_series(1, :users) AS i
+"""
+
+def old_user_to_response(user: Users) -> UserCreationResponse:
+    return UserCreationResponse(
+        id=user.id,
+        username=user.username,
+        name=user.name,
+        email=user.email,
+        created_at=user.createdat.isoformat(),
+        profilePic=user.profilePic
+    )
+
+def make_app(entities: list[Users], rows: list, engine) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/memory/before", response_model=list[UserCreationResponse])
+    async def memory_before():
+        return [old_user_to_response(user) for user in entities]
+
+    @app.get("/memory/after", response_model=list[UserCreationResponse])
+    async def memory_after():
+        return FastJSONResponse([user_to_response(row) for row in rows])
+
+    @app.get("/query/before", response_model=list[UserCreationResponse])
+    def query_before():
+        with Session(engine) as session:
+            return [old_user_to_response(user) for user in session.scalars(select(Users)).all()]
+
+    @app.get("/query/after", response_model=list[UserCreationResponse])
+    def query_after():
+        with Session(engine) as session:
+            return FastJSONResponse([user_to_response(row) for row in session.execute(select(*USER_RESPONSE_COLUMNS)).all()])
+
+    return app
+
+def median_ms(client: TestClient, path: str, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(path)
+        samples.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200
+    return statistics.median(samples)
+
+def run(users: int, repeat: int) -> list[dict]:
+    with isolated_engine(SCHEMA) as engine:
+        with engine.begin() as connection:
+            connection.execute(text(SEED_USERS), {"users": users})
+        with Session(engine) as session:
+            rows = session.execute(select(*USER_RESPONSE_COLUMNS)).all()
+        now = datetime.now()
+        entities = [
+            Users(id=uuid4(), internal_id=uuid4(), username=f"user{i}", name=f"Name {i}", email=f"user{i}@gmail.com", profilePic="", createdat=now - timedelta(seconds=i))
+            for i in range(users)
+        ]
+        client = TestClient(make_app(entities, rows, engine))
+        assert client.get("/query/before").json() == client.get("/query/after").json()
+        per_10k = 10000 / users
+        results = []
+        for name, path in [("serialization", "/memory"), ("query + serialization", "/query")]:
+            before, after = median_ms(client, f"{path}/before", repeat), median_ms(client, f"{path}/after", repeat)
+            results.append({
+                "path": name,
+                "before_ms_per_10k": round(before * per_10k, 1),
+                "after_ms_per_10k": round(after * per_10k, 1),
+                "speedup": round(before / after, 1),
+            })
+        return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    print(f"{'':>22} {'before':>8} {'after':>8}  (ms per 10k users)")
+    for result in run(args.users, args.repeat):
+        print(f"{result['path']:>22} {result['before_ms_per_10k']:>8} {result['after_ms_per_10k']:>8}  {result['speedup']}x")
@@ -0,0 +1,81 @@
+"""
+Cold start of the service: time from a fresh interpreter importing the app to
+its first 200 response, with the schema DDL run on every start (as importing
+the routes used to do) vs the lazy startup (DDL in the migrate step, engine
+and service created in the lifespan).
+
+    PYTHONPATH=src python benchmarks/bench_startup.py [--runs 10]
+
+Every run is a new process, the app is served in-process (TestClient, which
+runs the lifespan) against the POSTGRES_* database with ENV=test. The database
+is migrated once before the runs.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from sqlalchemy import text
+from database.migrations import migrate
+from utils.engine import get_engine
+
+# runs in the child process, prints the phases in seconds as JSON
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+from fastapi.testclient import TestClient
+from main import app
+imported = time.perf_counter()
+if sys.argv[1] == "eager":
+    from database.migrations import migrate
+    from utils.engine import get_engine
+    engine = get_engine()
+    with engine.begin() as connection:
+        migrate(connection)
+    engine.dispose()
+ddl = time.perf_counter()
+with TestClient(app) as client:
+    started = time.perf_counter()
+    response = client.get("/users", params={"limit": 1}, headers={"Authorization": "Bearer bench"})
+    assert response.status_code == 200, response.text
+    served = time.perf_counter()
+print(json.dumps({"import_s": imported - start, "ddl_s": ddl - imported, "lifespan_s": started - ddl, "first_response_s": served - started, "total_s": served - start}))
+"""
+
+def start_once(mode: str) -> dict:
+    env = {**os.environ, "ENV": "test"}
+    spawned = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", CHILD, mode], env=env, capture_output=True, text=True, check=True).stdout
+    phases = json.loads(output.strip().splitlines()[-1])
+    # interpreter start included
+    phases["process_s"] = time.perf_counter() - spawned
+    return phases
+
+def run(runs: int) -> dict:
+    engine = get_engine()
+    with engine.begin() as connection:
+        migrate(connection)
+        users = connection.execute(text("SELECT count(*) FROM users")).scalar()
+    engine.dispose()
+
+    samples = {"eager": [], "lazy": []}
+    # alternated so drift affects both alike, medians are compared
+    for _ in range(runs):
+        for mode, mode_samples in samples.items():
+            mode_samples.append(start_once(mode))
+    result = {"runs": runs, "users": users}
+    for mode, mode_samples in samples.items():
+        for phase in mode_samples[0]:
+            result[f"{mode}_{phase.removesuffix('_s')}_ms"] = round(statistics.median(sample[phase] for sample in mode_samples) * 1000, 1)
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+    result = run(args.runs)
+    print(f"{'':>16} {'import':>8} {'ddl':>8} {'lifespan':>9} {'first 200':>10} {'total':>8} {'process':>8}  (ms, median of {result['runs']})")
+    for mode in ("eager", "lazy"):
+        print(f"{mode:>16} {result[f'{mode}_import_ms']:>8} {result[f'{mode}_ddl_ms']:>8} {result[f'{mode}_lifespan_ms']:>9} {result[f'{mode}_first_response_ms']:>10} {result[f'{mode}_total_ms']:>8} {result[f'{mode}_process_ms']:>8}")
@@ -0,0 +1,88 @@
+"""
+GET /users/suggestions/{user_id}/ first page latency (p50/p95) with the
+bounded friends-of-friends walk (SUGGESTIONS_MAX_FOLLOWING latest follows,
+SUGGESTIONS_FANOUT latest follows of each) vs walking every second-degree
+edge, for typical users and for users following thousands of accounts.
+
+    PYTHONPATH=src:benchmarks python benchmarks/bench_suggestions.py [--users 20000] [--mean-following 50]
+        [--heavy 20] [--heavy-following 5000] [--runs 20]
+
+The graph is synthetic (social_graph.py), seeded in an isolated
+bench_suggestions schema of the POSTGRES_* database. The heavy users follow
+--heavy-following accounts drawn by popularity. overlap is the share of the
+exact top page (unbounded walk) the bounded one also returns.
+"""
+import argparse
+import statistics
+import time
+import numpy as np
+from sqlalchemy.orm import Session
+from isolated_schema import isolated_engine
+from social_graph import generate, seed_graph
+from business_logic.users.users_schemas import FollowEdge
+from database.db import Database, suggestions_page, SUGGESTIONS_MAX_FOLLOWING, SUGGESTIONS_FANOUT
+
+SCHEMA = "bench_suggestions"
+PAGE = 20
+UNBOUNDED = 10 ** 9
+
+def suggestions(engine, user_id, max_following: int, fanout: int) -> tuple[float, list]:
+    with Session(engine) as session:
+        start = time.perf_counter()
+        rows = session.execute(suggestions_page(user_id, PAGE, None, max_following, fanout)).all()
+        return (time.perf_counter() - start) * 1000, [row.id for row in rows[:PAGE]]
+
+def measure(engine, user_ids: list, runs: int) -> dict:
+    samples = {"bounded": [], "unbounded": []}
+    overlaps = []
+    for run in range(runs):
+        user_id = user_ids[run % len(user_ids)]
+        bounded_ms, bounded = suggestions(engine, user_id, SUGGESTIONS_MAX_FOLLOWING, SUGGESTIONS_FANOUT)
+        unbounded_ms, exact = suggestions(engine, user_id, UNBOUNDED, UNBOUNDED)
+        samples["bounded"].append(bounded_ms)
+        samples["unbounded"].append(unbounded_ms)
+        if exact:
+            overlaps.append(len(set(bounded) & set(exact)) / len(exact))
+    result = {}
+    for walk, walk_samples in samples.items():
+        walk_samples.sort()
+        result[f"{walk}_p50_ms"] = round(statistics.median(walk_samples), 2)
+        result[f"{walk}_p95_ms"] = round(walk_samples[min(len(walk_samples) - 1, int(len(walk_samples) * 0.95))], 2)
+    result["overlap"] = round(statistics.mean(overlaps), 3) if overlaps else None
+    return result
+
+def run(users: int, mean_following: float, heavy: int, heavy_following: int, runs: int) -> dict:
+    graph = generate(users, mean_following)
+    rng = np.random.default_rng(7)
+    ids = graph.ids
+    popularity = (graph.follower_counts + 1) / (graph.follower_counts + 1).sum()
+    heavy_users = rng.choice(users, size=heavy, replace=False)
+    typical_users = rng.choice(users, size=runs, replace=False)
+    with isolated_engine(SCHEMA) as engine:
+        database = Database(engine)
+        seed_graph(database, graph)
+        for user in heavy_users:
+            followed = rng.choice(users, size=min(heavy_following, users - 1), replace=False, p=popularity)
+            database.bulk_follow([FollowEdge(follower_id=ids[user], followed_id=ids[target]) for target in followed if target != user])
+        # warm up the cache and the statistics
+        suggestions(engine, ids[heavy_users[0]], UNBOUNDED, UNBOUNDED)
+        return {
+            **graph.stats(),
+            "typical": measure(engine, [ids[user] for user in typical_users], runs),
+            "heavy": measure(engine, [ids[user] for user in heavy_users], runs),
+        }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=20000)
+    parser.add_argument("--mean-following", type=float, default=50)
+    parser.add_argument("--heavy", type=int, default=20, help="users following --heavy-following accounts")
+    parser.add_argument("--heavy-following", type=int, default=5000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    result = run(args.users, args.mean_following, args.heavy, args.heavy_following, args.runs)
+    print(f"{result['users']} users, {result['edges']} follows, SUGGESTIONS_MAX_FOLLOWING={SUGGESTIONS_MAX_FOLLOWING}, SUGGESTIONS_FANOUT={SUGGESTIONS_FANOUT}")
+    print(f"{'':>8} {'bounded p50':>12} {'p95':>8} {'unbounded p50':>14} {'p95':>8} {'overlap':>8}  (ms)")
+    for kind in ("typical", "heavy"):
+        row = result[kind]
+        print(f"{kind:>8} {row['bounded_p50_ms']:>12} {row['bounded_p95_ms']:>8} {row['unbounded_p50_ms']:>14} {row['unbounded_p95_ms']:>8} {row['overlap']:>8}")
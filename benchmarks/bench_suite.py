@@ -0,0 +1,362 @@
+"""
+Benchmark suite: seeds a synthetic social graph (benchmarks/social_graph.py)
+and measures the latency of every Database method and the latency and
+throughput of every HTTP route, then writes the results as JSON so runs can
+be compared across commits.
+
+    PYTHONPATH=src:benchmarks python benchmarks/bench_suite.py [--users 10000] [--mean-following 20] [--repeat 200]
+        [--concurrency 8] [--only get_followers] [--output bench_suite.json] [--compare baseline.json] [--threshold 1.2]
+
+Runs in an isolated bench_suite schema of the POSTGRES_* database, which is
+dropped at the end. HTTP routes are called in-process (httpx ASGITransport, the
+API key check is skipped with ENV=test) against the sync service, with
+--concurrency requests in flight. With --compare, cases whose p50 grew more
+than --threshold times against the baseline file are listed and the exit code is 1.
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+import httpx
+import numpy as np
+from loguru import logger
+from business_logic.users.users_schemas import FollowEdge, UserAccountBase, UserCompleteCreation, UserEditProfile, UserImportRow
+from business_logic.users.users_service import UserAccountService
+from database.db import Database
+from database.instrumentation import instrument_engine
+from isolated_schema import isolated_engine
+from social_graph import generate, seed_graph
+
+SCHEMA = "bench_suite"
+# users per lookup of the authors cases, edges per bulk follow / unfollow
+AUTHORS = 50
+BULK_EDGES = 100
+IMPORT_BATCH = 1000
+# cases whose calls feed later ones (users to complete, follows to undo), they run even when --only leaves them out
+FEEDERS = ("insert_user", "follow_user", "bulk_follow", "POST /users/temp", "POST /users/follow/{user_id}/", "POST /users/bulk/follow/")
+
+def selected(name: str, only: list[str]) -> bool:
+    return not only or name in FEEDERS or any(part in name for part in only)
+
+def percentile(samples: list[float], p: float) -> float:
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+def summary(kind: str, name: str, samples_ms: list[float], seconds: float, errors: int = 0) -> dict:
+    samples_ms = sorted(samples_ms)
+    return {
+        "kind": kind,
+        "name": name,
+        "calls": len(samples_ms),
+        "errors": errors,
+        "p50_ms": round(percentile(samples_ms, 0.5), 3),
+        "p95_ms": round(percentile(samples_ms, 0.95), 3),
+        "p99_ms": round(percentile(samples_ms, 0.99), 3),
+        "mean_ms": round(sum(samples_ms) / len(samples_ms), 3),
+        "ops_per_second": round(len(samples_ms) / seconds, 1) if seconds else 0.0,
+    }
+
+class Workload:
+    """
+    Arguments of the benchmarked calls, drawn from the seeded graph: typical
+    users uniformly, popular ones among the 1% most followed.
+    """
+    def __init__(self, graph, seed: int):
+        self.rng = np.random.default_rng(seed)
+        self.graph = graph
+        self.ids = [str(user_id) for user_id in graph.ids]
+        self.usernames = [user.username for user in graph.users]
+        self.popular = graph.by_followers()[:max(1, len(self.ids) // 100)]
+        self.following = {tuple(edge) for edge in graph.edges.tolist()}
+        self.created = 0
+
+    def user(self) -> int:
+        return int(self.rng.integers(len(self.ids)))
+
+    def popular_user(self) -> int:
+        return int(self.rng.choice(self.popular))
+
+    def sample(self, n: int) -> list[int]:
+        return self.rng.choice(len(self.ids), size=min(n, len(self.ids)), replace=False).tolist()
+
+    def new_edges(self, n: int) -> list[tuple[int, int]]:
+        # pairs that are not in the graph yet, added to it so they are not drawn twice
+        edges = []
+        while len(edges) < n:
+            edge = (self.user(), self.user())
+            if edge[0] != edge[1] and edge not in self.following:
+                self.following.add(edge)
+                edges.append(edge)
+        return edges
+
+    def new_username(self) -> str:
+        self.created += 1
+        return f"bench{self.created}_{uuid4().hex[:8]}"
+
+    def edge_models(self, edges: list[tuple[int, int]]) -> list[FollowEdge]:
+        return [FollowEdge(follower_id=self.ids[follower], followed_id=self.ids[followed]) for follower, followed in edges]
+
+def database_cases(database: Database, work: Workload, repeat: int) -> list[tuple]:
+    """
+    (name, calls, prepare() -> args, call(*args)), args are built outside the timed part.
+    """
+    ids, usernames = work.ids, work.usernames
+    created = []
+    follows = []
+    bulk_follows = []
+
+    def new_user():
+        username = work.new_username()
+        return (UserAccountBase(username=username, name="Bench", email=f"{username}@gmail.com"),)
+
+    def insert_user(user):
+        created.append(str(database.insert_user(user).id))
+
+    def complete_user():
+        return created.pop(), UserCompleteCreation(supabase_id=str(uuid4()), birthdate="01/01/2000", locationLat=-34.6, locationLong=-58.4)
+
+    def follow_edge():
+        edge = work.new_edges(1)[0]
+        follows.append(edge)
+        return ids[edge[0]], ids[edge[1]]
+
+    def unfollow_edge():
+        follower, followed = follows.pop()
+        return ids[follower], ids[followed]
+
+    def bulk_edges():
+        edges = work.edge_models(work.new_edges(BULK_EDGES))
+        bulk_follows.append(edges)
+        return (edges,)
+
+    def import_rows():
+        rows = []
+        for line in range(IMPORT_BATCH):
+            username = work.new_username()
+            rows.append((line, UserImportRow(username=username, name="Bench", email=f"{username}@gmail.com")))
+        return (rows,)
+
+    def consume(chunks) -> int:
+        return sum(len(chunk) for chunk in chunks)
+
+    few = max(1, min(repeat, 5))
+    return [
+        ("load_username_index", few, lambda: (), database.load_username_index),
+        ("insert_user", repeat, new_user, insert_user),
+        ("update_user_id", repeat, complete_user, database.update_user_id),
+        ("import_users", few, import_rows, database.import_users),
+        ("get_user_by_id", repeat, lambda: (ids[work.user()],), database.get_user_by_id),
+        ("get_email_by_username", repeat, lambda: (usernames[work.user()],), database.get_email_by_username),
+        ("check_email_exists", repeat, lambda: (f"{usernames[work.user()]}@gmail.com",), database.check_email_exists),
+        ("get_users", repeat, lambda: (), database.get_users),
+        ("get_authors", repeat, lambda: ([ids[i] for i in work.sample(AUTHORS)], []), database.get_authors),
+        ("get_user_authors_info", repeat, lambda: (ids[0], [usernames[i] for i in work.sample(AUTHORS)]), database.get_user_authors_info),
+        ("get_user_authors_info_id", repeat, lambda: (ids[0], [ids[i] for i in work.sample(AUTHORS)]), database.get_user_authors_info_id),
+        ("get_usernames_starting_with", repeat, lambda: (f"user{work.user() % 1000}%",), database.get_usernames_starting_with),
+        ("search_users", repeat, lambda: (f"user{work.user() % 1000}",), database.search_users),
+        ("follow_user", repeat, follow_edge, database.follow_user),
+        ("unfollow_user", repeat, unfollow_edge, database.unfollow_user),
+        ("bulk_follow", few, bulk_edges, database.bulk_follow),
+        ("bulk_unfollow", few, lambda: (bulk_follows.pop(),), database.bulk_unfollow),
+        ("get_followers", repeat, lambda: (ids[work.user()],), database.get_followers),
+        ("get_followers[popular]", repeat, lambda: (ids[work.popular_user()],), database.get_followers),
+        ("get_following", repeat, lambda: (ids[work.user()],), database.get_following),
+        ("update_user_profile", repeat, lambda: (ids[work.user()], UserEditProfile(name="Edited")), database.update_user_profile),
+        ("get_near_users", repeat, lambda: (ids[work.user()],), database.get_near_users),
+        ("get_users_with_common_interests", repeat, lambda: (ids[work.user()],), database.get_users_with_common_interests),
+        ("get_follow_suggestions", repeat, lambda: (ids[work.user()],), database.get_follow_suggestions),
+        ("export_users", few, lambda: (), lambda: consume(database.export_users())),
+        ("export_followers", few, lambda: (), lambda: consume(database.export_followers())),
+        ("reconcile_follow_counters", few, lambda: (), database.reconcile_follow_counters),
+    ]
+
+def run_database(database: Database, work: Workload, repeat: int, only: list[str]) -> list[dict]:
+    results = []
+    for name, calls, prepare, call in database_cases(database, work, repeat):
+        if not selected(name, only):
+            continue
+        samples = []
+        for _ in range(calls):
+            args = prepare()
+            start = time.perf_counter()
+            call(*args)
+            samples.append((time.perf_counter() - start) * 1000)
+        results.append(summary("database", name, samples, sum(samples) / 1000))
+        logger.warning(f"database {name}: p50 {results[-1]['p50_ms']} ms")
+    return results
+
+def http_cases(work: Workload) -> list[tuple]:
+    """
+    (route, request() -> httpx request kwargs), routes named "METHOD template".
+    """
+    ids, usernames = work.ids, work.usernames
+    created = []
+    follows = []
+    bulk_follows = []
+
+    def new_user():
+        username = work.new_username()
+        return {"json": {"username": username, "name": "Bench", "email": f"{username}@gmail.com"}}
+
+    def follow():
+        follower, followed = work.new_edges(1)[0]
+        follows.append((follower, followed))
+        return {"url": f"/users/follow/{ids[followed]}/", "json": {"user_id": ids[follower]}}
+
+    def unfollow():
+        follower, followed = follows.pop()
+        return {"url": f"/users/unfollow/{ids[followed]}/", "json": {"user_id": ids[follower]}}
+
+    def bulk_follow():
+        edges = [{"follower_id": ids[follower], "followed_id": ids[followed]} for follower, followed in work.new_edges(BULK_EDGES)]
+        bulk_follows.append(edges)
+        return {"url": "/users/bulk/follow/", "json": {"edges": edges}}
+
+    return [
+        ("POST /users/temp", lambda: {"url": "/users/temp", **new_user()}, created),
+        ("GET /users", lambda: {"url": "/users"}, None),
+        ("GET /users?filter", lambda: {"url": "/users", "params": {"filter": f"user{work.user() % 1000}%"}}, None),
+        ("GET /users/{user_id}", lambda: {"url": f"/users/{ids[work.user()]}"}, None),
+        ("GET /users/{username}/email", lambda: {"url": f"/users/{usernames[work.user()]}/email"}, None),
+        ("GET /users/{email}/email/exists", lambda: {"url": f"/users/{usernames[work.user()]}@gmail.com/email/exists"}, None),
+        ("GET /users/{user_id}/authorsUsernames/", lambda: {"url": f"/users/{ids[0]}/authorsUsernames/", "params": {"authors": [usernames[i] for i in work.sample(AUTHORS)]}}, None),
+        ("GET /users/{user_id}/authorsIds/", lambda: {"url": f"/users/{ids[0]}/authorsIds/", "params": {"authors": [ids[i] for i in work.sample(AUTHORS)]}}, None),
+        ("POST /users/authors/batch", lambda: {"url": "/users/authors/batch", "json": {"ids": [ids[i] for i in work.sample(AUTHORS)]}}, None),
+        ("GET /users/search/", lambda: {"url": "/users/search/", "params": {"username": f"user{work.user() % 1000}"}}, None),
+        ("POST /users/follow/{user_id}/", follow, None),
+        ("DELETE /users/unfollow/{user_id}/", unfollow, None),
+        ("POST /users/bulk/follow/", bulk_follow, None),
+        ("POST /users/bulk/unfollow/", lambda: {"url": "/users/bulk/unfollow/", "json": {"edges": bulk_follows.pop()}}, None),
+        ("GET /users/followers/{user_id}/", lambda: {"url": f"/users/followers/{ids[work.user()]}/"}, None),
+        ("GET /users/followers/{user_id}/[popular]", lambda: {"url": f"/users/followers/{ids[work.popular_user()]}/"}, None),
+        ("GET /users/following/{user_id}/", lambda: {"url": f"/users/following/{ids[work.user()]}/"}, None),
+        ("PUT /users/edit/{user_id}", lambda: {"url": f"/users/edit/{ids[work.user()]}", "json": {"name": "Edited"}}, None),
+        ("PUT /users/{user_id}", lambda: {"url": f"/users/{created.pop()}", "json": {"supabase_id": str(uuid4()), "birthdate": "01/01/2000", "locationLat": -34.6, "locationLong": -58.4}}, None),
+        ("GET /users/near/{user_id}/", lambda: {"url": f"/users/near/{ids[work.user()]}/"}, None),
+        ("GET /users/common-interests/{user_id}/", lambda: {"url": f"/users/common-interests/{ids[work.user()]}/"}, None),
+        ("GET /users/suggestions/{user_id}/", lambda: {"url": f"/users/suggestions/{ids[work.user()]}/"}, None),
+        ("GET /users/export/", lambda: {"url": "/users/export/"}, None),
+        ("GET /users/export/followers/", lambda: {"url": "/users/export/followers/"}, None),
+        ("GET /monitoring/metrics", lambda: {"url": "/monitoring/metrics"}, None),
+    ]
+
+# exports and bulk calls run 5 times, like their Database cases
+FEW_CALLS_ROUTES = ("GET /users/export/", "GET /users/export/followers/", "POST /users/bulk/follow/", "POST /users/bulk/unfollow/")
+
+async def run_http(engine, work: Workload, repeat: int, concurrency: int, only: list[str]) -> list[dict]:
+    from main import app
+    from routers.routers import services
+
+    # the routes use the lazily created service of the routers module, pointed at the seeded schema
+    service = UserAccountService(engine)
+    services.set(service)
+    instrument_engine(engine)
+    await service.startup()
+    await service.username_index_task
+
+    results = []
+    headers = {"Authorization": "Bearer bench"}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", headers=headers, timeout=None) as client:
+        for route, request, created in http_cases(work):
+            if not selected(route, only):
+                continue
+            method = route.split(" ", 1)[0]
+            calls = max(1, min(repeat, 5)) if route in FEW_CALLS_ROUTES else repeat
+            # requests are built up front so only the calls are timed, follows before their unfollows
+            requests = [request() for _ in range(calls)]
+            samples, errors = [], 0
+            pending = iter(requests)
+
+            async def worker():
+                nonlocal errors
+                for kwargs in pending:
+                    start = time.perf_counter()
+                    response = await client.request(method, **kwargs)
+                    samples.append((time.perf_counter() - start) * 1000)
+                    if response.status_code >= 400:
+                        errors += 1
+                    elif created is not None:
+                        created.append(response.json()["id"])
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            results.append(summary("http", route, samples, time.perf_counter() - start, errors))
+            logger.warning(f"http {route}: p50 {results[-1]['p50_ms']} ms, {results[-1]['ops_per_second']} req/s, {errors} errors")
+    return results
+
+def git_commit() -> str | None:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, check=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(users: int, mean_following: float, exponent: float, seed: int, repeat: int, concurrency: int, only: list[str]) -> dict:
+    graph = generate(users, mean_following, exponent, seed)
+    with isolated_engine(SCHEMA) as engine:
+        database = Database(engine)
+        start = time.perf_counter()
+        seed_graph(database, graph)
+        seed_seconds = time.perf_counter() - start
+        work = Workload(graph, seed)
+        results = run_database(database, work, repeat, only)
+        results += asyncio.run(run_http(engine, work, repeat, concurrency, only))
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {"users": users, "mean_following": mean_following, "exponent": exponent, "seed": seed, "repeat": repeat, "concurrency": concurrency, "database_mode": "sync"},
+        "dataset": {**graph.stats(), "seed_seconds": round(seed_seconds, 2)},
+        "results": results,
+    }
+
+def compare(report: dict, baseline: dict, threshold: float) -> list[dict]:
+    """
+    Cases of report whose p50 is more than threshold times the baseline one.
+    """
+    previous = {(result["kind"], result["name"]): result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        before = previous.get((result["kind"], result["name"]))
+        if before and before["p50_ms"] and result["p50_ms"] / before["p50_ms"] > threshold:
+            regressions.append({"kind": result["kind"], "name": result["name"], "baseline_p50_ms": before["p50_ms"], "p50_ms": result["p50_ms"], "ratio": round(result["p50_ms"] / before["p50_ms"], 2)})
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--mean-following", type=float, default=20)
+    parser.add_argument("--exponent", type=float, default=2.1, help="power law exponent of the follower counts")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=200, help="calls per case, exports and batch jobs run 5 times")
+    parser.add_argument("--concurrency", type=int, default=8, help="HTTP requests in flight")
+    parser.add_argument("--only", action="append", default=[], help="run the cases whose name contains this, repeatable")
+    parser.add_argument("--output", default="bench_suite.json")
+    parser.add_argument("--compare", help="results file of a previous run")
+    parser.add_argument("--threshold", type=float, default=1.2, help="p50 ratio reported as a regression")
+    parser.add_argument("--log-level", default="WARNING", help="the service logs every call at INFO")
+    args = parser.parse_args()
+
+    os.environ["ENV"] = "test"
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+    report = run(args.users, args.mean_following, args.exponent, args.seed, args.repeat, args.concurrency, args.only)
+    with open(args.output, "w") as file:
+        json.dump(report, file, indent=2)
+
+    print(f"{report['dataset']['users']} users, {report['dataset']['edges']} follows (max {report['dataset']['max_followers']} followers) seeded in {report['dataset']['seed_seconds']} s")
+    print(f"{'case':<52} {'p50':>9} {'p95':>9} {'p99':>9} {'ops/s':>9} {'errors':>6}  (ms)")
+    for result in report["results"]:
+        print(f"{result['kind'] + ' ' + result['name']:<52} {result['p50_ms']:>9} {result['p95_ms']:>9} {result['p99_ms']:>9} {result['ops_per_second']:>9} {result['errors']:>6}")
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(report, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression['kind']} {regression['name']}: p50 {regression['baseline_p50_ms']} -> {regression['p50_ms']} ms ({regression['ratio']}x)")
+        sys.exit(1 if regressions else 0)
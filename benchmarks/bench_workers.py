@@ -0,0 +1,135 @@
+"""
+Throughput of the production server (gunicorn + uvicorn workers, src/gunicorn.conf.py)
+as the worker count grows, on a synthetic social graph.
+
+    PYTHONPATH=src:benchmarks python benchmarks/bench_workers.py [--workers 1,2,4] [--users 2000] [--seconds 10]
+        [--clients 2] [--connections 32]
+
+For every worker count the server is started on a local port against an
+isolated bench_workers schema of the POSTGRES_* database (PGOPTIONS
+search_path, ENV=test), warmed up, then loaded by --clients processes keeping
+--connections requests in flight each, half GET /users/{user_id} (mostly served
+by the per-worker profile cache, CPU bound) and half GET /users/followers/{user_id}/
+(one query). Scaling needs as many free cores as workers plus clients.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+import httpx
+from isolated_schema import isolated_engine
+from social_graph import generate, seed_graph
+from database.db import Database
+
+SCHEMA = "bench_workers"
+SRC = Path(__file__).resolve().parents[1] / "src"
+# any bearer token, the API key check is skipped with ENV=test
+HEADERS = {"Authorization": "Bearer bench"}
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "ENV": "test",
+        "PYTHONPATH": str(SRC),
+        "WEB_CONCURRENCY": str(workers),
+        "BIND": f"127.0.0.1:{port}",
+        "MAX_REQUESTS": "0",
+        "DB_STATEMENT_TIMEOUT_MS": "0",
+        "PGOPTIONS": f"-c search_path={SCHEMA},public",
+    }
+    return subprocess.Popen([sys.executable, "-m", "gunicorn", "main:app"], cwd=SRC, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def wait_ready(base_url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/users", params={"limit": 1}, headers=HEADERS).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError("The server did not start")
+
+async def load(base_url: str, ids: list[str], seconds: float, connections: int, seed: int) -> tuple[int, int, list[float]]:
+    rng = random.Random(seed)
+    requests, errors, samples = 0, 0, []
+    deadline = time.perf_counter() + seconds
+    limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+    async with httpx.AsyncClient(base_url=base_url, headers=HEADERS, limits=limits, timeout=30) as client:
+        async def connection():
+            nonlocal requests, errors
+            while time.perf_counter() < deadline:
+                user_id = rng.choice(ids)
+                path = f"/users/{user_id}" if rng.random() < 0.5 else f"/users/followers/{user_id}/"
+                start = time.perf_counter()
+                response = await client.get(path)
+                samples.append((time.perf_counter() - start) * 1000)
+                requests += 1
+                errors += response.status_code != 200
+        await asyncio.gather(*(connection() for _ in range(connections)))
+    return requests, errors, samples
+
+def client_process(args) -> tuple[int, int, list[float]]:
+    return asyncio.run(load(*args))
+
+def measure(workers: int, ids: list[str], seconds: float, clients: int, connections: int) -> dict:
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(workers, port)
+    try:
+        wait_ready(base_url)
+        # every worker boots and warms its cache before the measured run
+        with multiprocessing.Pool(clients) as pool:
+            pool.map(client_process, [(base_url, ids, min(3.0, seconds), connections, i) for i in range(clients)])
+            start = time.perf_counter()
+            results = pool.map(client_process, [(base_url, ids, seconds, connections, 100 + i) for i in range(clients)])
+            elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait(30)
+    samples = sorted(sample for _, _, client_samples in results for sample in client_samples)
+    requests = sum(result[0] for result in results)
+    return {
+        "workers": workers,
+        "requests": requests,
+        "errors": sum(result[1] for result in results),
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": round(statistics.median(samples), 2),
+        "p99_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))], 2),
+    }
+
+def run(worker_counts: list[int], users: int, seconds: float, clients: int, connections: int) -> list[dict]:
+    graph = generate(users)
+    with isolated_engine(SCHEMA) as engine:
+        seed_graph(Database(engine), graph)
+        ids = [str(user_id) for user_id in graph.ids]
+        results = [measure(workers, ids, seconds, clients, connections) for workers in worker_counts]
+    for result in results:
+        result["speedup"] = round(result["requests_per_second"] / results[0]["requests_per_second"], 2)
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="worker counts, comma separated")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--clients", type=int, default=2, help="load generator processes")
+    parser.add_argument("--connections", type=int, default=32, help="requests in flight per client")
+    args = parser.parse_args()
+    results = run([int(workers) for workers in args.workers.split(",")], args.users, args.seconds, args.clients, args.connections)
+    print(f"{multiprocessing.cpu_count()} cores")
+    print(f"{'workers':>8} {'req/s':>9} {'speedup':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for result in results:
+        print(f"{result['workers']:>8} {result['requests_per_second']:>9} {result['speedup']:>8} {result['p50_ms']:>8} {result['p99_ms']:>8} {result['errors']:>7}")
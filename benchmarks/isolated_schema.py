@@ -0,0 +1,34 @@
+"""
+Engine bound to a throwaway schema of the POSTGRES_* database, shared by the benchmarks.
+"""
+from contextlib import contextmanager
+from sqlalchemy import create_engine, text
+from database.migrations import migrate
+from utils.engine import MonitoredQueuePool, get_database_url, get_pool_settings
+
+@contextmanager
+def isolated_engine(schema: str):
+    """
+    Yields an engine whose tables (created by the migrate step) live in schema,
+    dropped (with its data) on exit.
+
+    The ORM and DDL are routed with schema_translate_map: with a plain search_path
+    create_all would see the public tables and skip creating them. Raw SQL finds
+    the schema first in search_path, public stays last for extensions (pg_trgm).
+    """
+    admin = create_engine(get_database_url())
+    with admin.begin() as connection:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {schema}"))
+    # same pool as the service (get_engine), so pool waits show up in the results
+    engine = create_engine(get_database_url(), poolclass=MonitoredQueuePool, connect_args={"options": f"-c search_path={schema},public"}, **get_pool_settings())
+    engine = engine.execution_options(schema_translate_map={None: schema})
+    with engine.begin() as connection:
+        migrate(connection)
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+        with admin.begin() as connection:
+            connection.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+        admin.dispose()
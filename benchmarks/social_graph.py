@@ -0,0 +1,124 @@
+"""
+Synthetic social graph for the benchmarks: users with a power-law follower
+distribution (a few accounts are followed by a large share of the graph, most
+by a handful), interests drawn with skewed popularity and home coordinates
+clustered around cities.
+
+    graph = generate(users=10000, mean_following=20, seed=42)
+    seed_graph(Database(engine), graph)
+
+The same users / mean_following / exponent / seed always generate the same graph.
+"""
+from dataclasses import dataclass
+from uuid import UUID
+import numpy as np
+from business_logic.users.users_schemas import FollowEdge, UserImportRow
+
+INTERESTS = [
+    "music", "sports", "reading", "travel", "cooking", "movies", "gaming", "art", "photography", "fitness",
+    "technology", "fashion", "nature", "history", "science", "politics", "dance", "theatre", "cars", "pets",
+    "anime", "football", "tennis", "yoga", "writing", "design", "startups", "wine", "coffee", "gardening",
+]
+
+# (lat, long, country, isoCountry, region, share of the users)
+CITIES = [
+    (-34.6037, -58.3816, "Argentina", "AR", "Buenos Aires", 0.45),
+    (-31.4201, -64.1888, "Argentina", "AR", "Córdoba", 0.12),
+    (-32.9442, -60.6505, "Argentina", "AR", "Santa Fe", 0.1),
+    (-32.8895, -68.8458, "Argentina", "AR", "Mendoza", 0.08),
+    (-34.9011, -56.1645, "Uruguay", "UY", "Montevideo", 0.08),
+    (-33.4489, -70.6693, "Chile", "CL", "Santiago", 0.07),
+    (40.4168, -3.7038, "Spain", "ES", "Madrid", 0.05),
+    (25.7617, -80.1918, "United States", "US", "Florida", 0.05),
+]
+# degrees, about 20 km of spread around the city center
+CITY_SPREAD = 0.2
+
+@dataclass
+class SocialGraph:
+    """
+    users[i] follows users[j] for every (i, j) in edges, follower_counts[i] is
+    how many users follow users[i].
+    """
+    users: list[UserImportRow]
+    edges: np.ndarray
+    follower_counts: np.ndarray
+
+    @property
+    def ids(self) -> list[UUID]:
+        return [user.supabase_id for user in self.users]
+
+    def stats(self) -> dict:
+        following_counts = np.bincount(self.edges[:, 0], minlength=len(self.users))
+        return {
+            "users": len(self.users),
+            "edges": len(self.edges),
+            "max_followers": int(self.follower_counts.max(initial=0)),
+            "median_followers": float(np.median(self.follower_counts)) if len(self.users) else 0.0,
+            "max_following": int(following_counts.max(initial=0)),
+            # share of the follows received by the top 1% accounts
+            "top_1pct_follower_share": round(float(np.sort(self.follower_counts)[::-1][:max(1, len(self.users) // 100)].sum() / max(1, len(self.edges))), 3),
+        }
+
+    def by_followers(self) -> np.ndarray:
+        """
+        User indexes, most followed first.
+        """
+        return np.argsort(-self.follower_counts, kind="stable")
+
+def generate(users: int, mean_following: float = 20, exponent: float = 2.1, seed: int = 42) -> SocialGraph:
+    """
+    Follow targets are drawn with probability proportional to rank^(-1 / (exponent - 1)),
+    so follower counts follow a power law with that exponent. How many accounts each
+    user follows is log-normal around mean_following. Self follows and repeats are dropped.
+    """
+    rng = np.random.default_rng(seed)
+
+    weights = np.arange(1, users + 1, dtype=float) ** (-1 / (exponent - 1))
+    # popularity is not tied to the creation order of the users
+    weights = rng.permutation(weights / weights.sum())
+    sigma = 1.0
+    following = rng.lognormal(np.log(max(mean_following, 1e-9)) - sigma ** 2 / 2, sigma, users).round().astype(np.int64)
+    following = np.minimum(following, users - 1)
+    followers = np.repeat(np.arange(users), following)
+    followed = rng.choice(users, size=len(followers), p=weights)
+    edges = np.unique(np.column_stack((followers, followed))[followers != followed], axis=0)
+
+    interest_weights = 1 / np.arange(1, len(INTERESTS) + 1)
+    interest_weights /= interest_weights.sum()
+    city_weights = np.array([city[-1] for city in CITIES])
+    cities = rng.choice(len(CITIES), size=users, p=city_weights / city_weights.sum())
+    offsets = rng.normal(0, CITY_SPREAD, size=(users, 2))
+    interest_counts = rng.integers(1, 6, size=users)
+    ids = rng.bytes(16 * users)
+
+    rows = []
+    for i in range(users):
+        lat, long, country, iso_country, region, _ = CITIES[cities[i]]
+        interests = rng.choice(len(INTERESTS), size=interest_counts[i], replace=False, p=interest_weights)
+        rows.append(UserImportRow(
+            username=f"user{i}",
+            name=f"User {i}",
+            email=f"user{i}@gmail.com",
+            supabase_id=UUID(bytes=ids[16 * i:16 * (i + 1)], version=4),
+            birthdate=f"{rng.integers(1, 29):02d}/{rng.integers(1, 13):02d}/{rng.integers(1960, 2008)}",
+            locationLat=round(lat + offsets[i, 0], 6),
+            locationLong=round(long + offsets[i, 1], 6),
+            country=country,
+            isoCountry=iso_country,
+            region=region,
+            interests=",".join(INTERESTS[j] for j in interests),
+        ))
+    return SocialGraph(rows, edges, np.bincount(edges[:, 1], minlength=users))
+
+def seed_graph(database, graph: SocialGraph, batch_size: int = 5000):
+    """
+    Inserts the users (with their userinfo and interests) and the follow edges
+    (updating the follower counters) through Database, batch_size rows per statement.
+    """
+    for start in range(0, len(graph.users), batch_size):
+        batch = graph.users[start:start + batch_size]
+        database.import_users(list(enumerate(batch, start=start)))
+    ids = graph.ids
+    for start in range(0, len(graph.edges), batch_size):
+        database.bulk_follow([FollowEdge(follower_id=ids[follower], followed_id=ids[followed]) for follower, followed in graph.edges[start:start + batch_size]])
@@ -0,0 +1,19 @@
+from pydantic import BaseModel
+
+class PoolStatsResponse(BaseModel):
+    pool_size: int
+    max_overflow: int
+    checked_out: int
+    checked_in: int
+    overflow: int
+    checkouts: int
+    waits: int
+    wait_time_ms: float
+    timeouts: int
+
+class CacheStatsResponse(BaseModel):
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+    evictions: int
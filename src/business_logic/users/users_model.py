@@ -1,12 +1,12 @@
 from typing import List
 from typing import Optional
-from sqlalchemy import create_engine, MetaData, Table, Column, String, Integer, ForeignKey, DateTime
+from sqlalchemy import create_engine, MetaData, Table, Column, String, Integer, BigInteger, Identity, ForeignKey, DateTime, Index, Float, func, text
 from sqlalchemy import ForeignKey
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import relationship
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import UUID, JSONB
 import uuid
 import datetime
 
@@ -25,6 +25,9 @@ class Users(Base):
     email = Column(String, unique=True)
     profilePic = Column(String)
     createdat = Column(DateTime, default=datetime.datetime.utcnow)
+    # maintained by follow / unfollow in the same transaction as the followers row
+    followers_count = Column(Integer, nullable=False, default=0, server_default="0")
+    following_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     userinfo = relationship("UserInfo", back_populates="user", uselist=False)
 
@@ -34,6 +37,14 @@ class Users(Base):
     # Representa a los usuarios que el usuario sigue
     following = relationship("Followers", foreign_keys="[Followers.follower_id]", back_populates="follower", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Keyset pagination order of GET /users
+        Index("ix_users_createdat_internal_id", "createdat", "internal_id"),
+        # exact and prefix matches of /users/search/ (lower(column) LIKE 'query%')
+        Index("ix_users_username_lower_pattern", func.lower(username).label("username_lower"), postgresql_ops={"username_lower": "text_pattern_ops"}),
+        Index("ix_users_name_lower_pattern", func.lower(name).label("name_lower"), postgresql_ops={"name_lower": "text_pattern_ops"}),
+    )
+
     def __repr__(self) -> str:
         return f"User(id={self.id!r}, username={self.username!r}, email={self.email!r})"
 
@@ -41,13 +52,18 @@ class UserInfo(Base):
     __tablename__ = "userinfo"
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True, nullable=False)
     birthdate = Column(String)
-    locationLat = Column(String)
-    locationLong = Column(String)
+    locationLat = Column(Float)
+    locationLong = Column(Float)
     country = Column(String)
     isoCountry = Column(String)
     region = Column(String)
     interests = Column(String)
 
+    # Bounding box prefilter of /users/near/{user_id}/
+    __table_args__ = (
+        Index("ix_userinfo_location", "locationLat", "locationLong"),
+    )
+
     user = relationship("Users", back_populates="userinfo", uselist=False)
 
     def __repr__(self) -> str:
@@ -60,8 +76,61 @@ class Followers(Base):
     followed_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True, nullable=False) # Usuario que es seguido
     followed_at = Column(DateTime, default=datetime.datetime.now(tz=datetime.timezone.utc))
 
+    # Keyset pagination of /users/followers/{id}/ and /users/following/{id}/
+    __table_args__ = (
+        Index("ix_followers_followed_id_followed_at", "followed_id", "followed_at", "follower_id"),
+        Index("ix_followers_follower_id_followed_at", "follower_id", "followed_at", "followed_id"),
+        # followed_at ranges of incremental exports
+        Index("ix_followers_followed_at", "followed_at"),
+    )
+
     follower = relationship("Users", foreign_keys=[follower_id], back_populates="following")
     followed = relationship("Users", foreign_keys=[followed_id], back_populates="followers")
 
     def __repr__(self) -> str:
-        return f"Followers(follower_id={self.follower_id!r}, followed_id={self.followed_id!r}, followed_at={self.followed_at!r})"
\ No newline at end of file
+        return f"Followers(follower_id={self.follower_id!r}, followed_id={self.followed_id!r}, followed_at={self.followed_at!r})"
+
+class UserInterests(Base):
+    """
+    One row per (user, interest), normalized from UserInfo.interests so users
+    sharing interests are found through the interest index instead of scanning userinfo.
+    """
+    __tablename__ = "user_interests"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE", onupdate="CASCADE"), primary_key=True, nullable=False)
+    interest = Column(String, primary_key=True, nullable=False)
+
+    __table_args__ = (
+        Index("ix_user_interests_interest_user_id", "interest", "user_id"),
+    )
+
+    def __repr__(self) -> str:
+        return f"UserInterests(user_id={self.user_id!r}, interest={self.interest!r})"
+
+class OutboxEvents(Base):
+    """
+    Domain events written in the same transaction as the change they describe,
+    published to the broker by the outbox dispatcher (utils.events.OutboxDispatcher).
+    A pending row is claimed until claimed_until by one dispatcher, delivered
+    rows are purged after the retention period.
+    """
+    __tablename__ = "outbox_events"
+
+    id = Column(BigInteger, Identity(), primary_key=True)
+    # message id of the published event, consumers deduplicate by it
+    event_id = Column(UUID(as_uuid=True), unique=True, nullable=False, default=uuid.uuid4)
+    type = Column(String, nullable=False)
+    payload = Column(JSONB, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    claimed_until = Column(DateTime(timezone=True))
+    attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    delivered_at = Column(DateTime(timezone=True))
+
+    __table_args__ = (
+        # claims walk the pending rows in id order
+        Index("ix_outbox_events_pending", "id", postgresql_where=text("delivered_at IS NULL")),
+        Index("ix_outbox_events_delivered_at", "delivered_at", postgresql_where=text("delivered_at IS NOT NULL")),
+    )
+
+    def __repr__(self) -> str:
+        return f"OutboxEvents(id={self.id!r}, event_id={self.event_id!r}, type={self.type!r}, delivered_at={self.delivered_at!r})"
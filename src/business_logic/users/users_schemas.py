@@ -1,5 +1,11 @@
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 from uuid import UUID
+import os
+
+# ids / usernames accepted by POST /users/authors/batch
+MAX_AUTHORS_LOOKUP = int(os.getenv("MAX_AUTHORS_LOOKUP", "5000"))
+# edges accepted by POST /users/bulk/follow/ and /users/bulk/unfollow/
+MAX_BULK_FOLLOWS = int(os.getenv("MAX_BULK_FOLLOWS", "1000"))
 
 class UserAccountBase(BaseModel):
     username: str
@@ -31,9 +37,25 @@ class UserInfoResponse(UserCreationResponse):
     isoCountry: str | None = None
     region: str | None = None
     interests: str | None = None
+    followers_count: int = 0
+    following_count: int = 0
 
     model_config = ConfigDict(from_attributes=True)
 
+class AuthorsLookup(BaseModel):
+    ids: list[UUID] = Field(default_factory=list, max_length=MAX_AUTHORS_LOOKUP)
+    usernames: list[str] = Field(default_factory=list, max_length=MAX_AUTHORS_LOOKUP)
+
+class NearUserResponse(UserCreationResponse):
+    distance_km: float
+
+class CommonInterestsUserResponse(UserCreationResponse):
+    shared_interests: int
+
+class SuggestedUserResponse(UserCreationResponse):
+    # accounts followed by the user that follow this one
+    mutual_connections: int
+
 class UserCompleteCreation(BaseModel):
     supabase_id: str
     birthdate: str
@@ -44,6 +66,21 @@ class UserCompleteCreation(BaseModel):
     region: str | None = None
     profilePic: str | None = None
 
+class UserImportRow(UserAccountBase):
+    """
+    One user of a bulk import (jobs.import_users). With supabase_id the user is
+    imported already completed (as after PUT /users/{user_id}) and gets its userinfo.
+    """
+    supabase_id: UUID | None = None
+    profilePic: str | None = None
+    birthdate: str | None = None
+    locationLat: float | None = None
+    locationLong: float | None = None
+    country: str | None = None
+    isoCountry: str | None = None
+    region: str | None = None
+    interests: str | None = None
+
 class UserEmailResponse(BaseModel):
     email: str
 
@@ -57,6 +94,17 @@ class FollowResponse(BaseModel):
 
 class FollowerAccountBase(BaseModel):
     user_id: str
+
+class FollowEdge(BaseModel):
+    follower_id: UUID
+    followed_id: UUID
+
+class BulkFollowRequest(BaseModel):
+    edges: list[FollowEdge] = Field(max_length=MAX_BULK_FOLLOWS)
+
+class BulkFollowResult(FollowEdge):
+    # followed / already_following / unfollowed / not_following / user_not_found
+    status: str
     
 class UserEditProfile(BaseModel):
     name: str | None = None
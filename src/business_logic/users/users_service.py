@@ -1,65 +1,307 @@
+import asyncio
+import os
 from sqlalchemy import MetaData, Table, Column, String, select
 from sqlalchemy.exc import SQLAlchemyError, IntegrityError
 import logging as logger
 from sqlalchemy.orm import Session
-from database.db import Database
-from business_logic.users.users_schemas import UserAccountBase, UserCompleteCreation, UserEditProfile
-from uuid import uuid4
+from starlette.concurrency import run_in_threadpool
+from database.db import Database, DEFAULT_NEAR_RADIUS_KM
+from database.async_db import AsyncDatabase
+from database.pagination import DEFAULT_PAGE_SIZE
+from business_logic.users.users_schemas import UserAccountBase, UserCompleteCreation, UserEditProfile, FollowEdge
+from utils.engine import get_engine, get_async_engine, is_async_database
+from database.instrumentation import instrument_engine
+from utils.ttl_cache import TTLCache
+from utils.batch_loader import BatchLoader
+from utils.events import OutboxDispatcher, get_event_broker
+from utils.metrics import metrics_registry
+from uuid import UUID, uuid4
+from datetime import datetime
+
+# GET /users/{user_id} profiles cache, edits in this process invalidate it, the
+# ones made by other worker processes are seen after USER_CACHE_TTL seconds
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+# author lookups arriving within AUTHORS_BATCH_WAIT_MS are served by one query
+AUTHORS_BATCH_WAIT_MS = float(os.getenv("AUTHORS_BATCH_WAIT_MS", "2"))
+AUTHORS_BATCH_SIZE = int(os.getenv("AUTHORS_BATCH_SIZE", "5000"))
+
+def profile_key(user_id) -> str | None:
+    # one key per user whatever the id spelling, None for invalid ids
+    try:
+        return str(UUID(str(user_id)))
+    except ValueError:
+        return None
 
 class UserAccountService:
+    """
+    Service backed by the synchronous Database (psycopg2).
+
+    Every method is awaitable: _run executes the blocking Database call in the
+    threadpool so it never stalls the event loop. AsyncUserAccountService only
+    swaps _run to await AsyncDatabase directly.
+
+    Profiles (get_useraccount) are served from an LRU+TTL cache, the methods
+    that edit them invalidate it. Author lookups of concurrent requests are
+    coalesced by author_loader.
+
+    With an outbox dispatcher, inserts, follows, unfollows and profile edits
+    write a domain event (user.created, user.followed, user.unfollowed,
+    user.profile_updated) to the outbox in their own transaction, the
+    dispatcher publishes it in the background.
+    """
+    database_class = Database
+
+    def __init__(self, engine, outbox: OutboxDispatcher | None = None):
+        # no events are written without a dispatcher to publish them
+        self.outbox = outbox
+        self.database = self.database_class(engine, outbox=outbox is not None)
+        self.profile_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+        self.profile_invalidations = 0
+        self.author_loader = BatchLoader(self._load_authors, AUTHORS_BATCH_WAIT_MS / 1000, AUTHORS_BATCH_SIZE)
 
-    def __init__(self, engine):
-        self.database = Database(engine)
+    async def startup(self):
+        # the tables come from the migrate step (jobs.migrate). The username index loads
+        # in the background, GET /users?filter= uses the database until it is ready
+        self.username_index_task = asyncio.create_task(self._run(self.database.load_username_index))
+        if self.outbox:
+            self.outbox.start(self)
 
-    def insert_useraccount(self, user: UserAccountBase):
+    async def _run(self, method, *args):
+        return await run_in_threadpool(method, *args)
+
+    async def insert_useraccount(self, user: UserAccountBase):
         if not user.username:
             raise ValueError("Username is required")
-        return self.database.insert_user(user)
-
-    def get_useraccounts(self):
-        return self.database.get_users()
-
-    def get_useraccount(self, user_id: str):
-        return self.database.get_user_by_id(user_id)
-
-    def get_user_authors_info(self, user_id: str, authors: list[str]):
-        return self.database.get_user_authors_info(user_id, authors)
-    
-    def get_user_authors_info_id(self, user_id: str, authors: list[str]):
-        return self.database.get_user_authors_info_id(user_id, authors)
-
-    def get_email_by_username(self, username: str):
-        return self.database.get_email_by_username(username)
-    
-    def check_email_exists(self, email: str):
-        return self.database.check_email_exists(email)
-
-    def update_useraccount(self, user_id: str, data: UserCompleteCreation):
-        return self.database.update_user_id(user_id, data)
-
-    def get_usernames_starting_with(self, string: str):
-        return self.database.get_usernames_starting_with(string)
-    
-    def search_users(self, username: str):
-        return self.database.search_users(username)
-    
-    def follow_user(self, follower_user_id: str, followed_user_id: str):
-        return self.database.follow_user(follower_user_id, followed_user_id)
-
-    def unfollow_user(self, follower_user_id: str, followed_user_id: str):
-        return self.database.unfollow_user(follower_user_id, followed_user_id)
-    
-    def get_followers(self, user_id: str):
-        return self.database.get_followers(user_id)
-
-    def get_following(self, user_id: str):
-        return self.database.get_following(user_id)
-    
-    def update_user_profile(self, user_id: str, data: UserEditProfile):
-        return self.database.update_user_profile(user_id, data)
-    
-    def get_near_users(self, user_id:str):
-        return self.database.get_near_users(user_id)
-    
-    def get_users_with_common_interests(self, user_id:str):
-        return self.database.get_users_with_common_interests(user_id)
+        try:
+            return await self._run(self.database.insert_user, user)
+        finally:
+            self.events_written()
+
+    async def get_useraccounts(self, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        return await self._run(self.database.get_users, limit, cursor)
+
+    async def get_useraccount(self, user_id: str):
+        key = profile_key(user_id)
+        user = self.profile_cache.get(key) if key else None
+        if user is not None:
+            return user
+        invalidations = self.profile_invalidations
+        user = await self._run(self.database.get_user_by_id, user_id)
+        # an edit finished while reading, the row may predate it so it is not cached
+        if user is not None and key and invalidations == self.profile_invalidations:
+            self.profile_cache.set(key, user)
+        return user
+
+    def events_written(self):
+        # wakes the dispatcher of this process instead of waiting for its next poll
+        if self.outbox:
+            self.outbox.notify()
+
+    def invalidate_profiles(self, *user_ids):
+        self.profile_invalidations += 1
+        for user_id in user_ids:
+            key = profile_key(user_id)
+            if key:
+                self.profile_cache.invalidate(key)
+
+    async def _load_authors(self, keys: list[tuple]) -> dict:
+        # keys are ("id", UUID) or ("username", str)
+        ids = [value for kind, value in keys if kind == "id"]
+        usernames = [value for kind, value in keys if kind == "username"]
+        authors = await self._run(self.database.get_authors, ids, usernames)
+        found = {}
+        for author in authors:
+            found[("id", author["id"])] = author
+            found[("username", author["username"])] = author
+        return found
+
+    async def get_authors(self, ids: list[UUID], usernames: list[str]):
+        keys = [("id", author_id) for author_id in ids] + [("username", username) for username in usernames]
+        authors = await self.author_loader.load_many(keys)
+        # in request order, once each
+        unique = {}
+        for author in authors:
+            if author is not None:
+                unique.setdefault(author["id"], author)
+        return list(unique.values())
+
+    async def get_user_authors_info(self, user_id: str, authors: list[str]):
+        return await self.get_authors([], authors)
+
+    async def get_user_authors_info_id(self, user_id: str, authors: list[str]):
+        try:
+            author_ids = [UUID(author) for author in authors]
+        except ValueError:
+            logger.error("Invalid author id")
+            return None
+        return await self.get_authors(author_ids, [])
+
+    async def get_email_by_username(self, username: str):
+        return await self._run(self.database.get_email_by_username, username)
+
+    async def check_email_exists(self, email: str):
+        return await self._run(self.database.check_email_exists, email)
+
+    async def update_useraccount(self, user_id: str, data: UserCompleteCreation):
+        # invalid ids raise ValueError (400) here, before any query, whatever the database mode
+        UUID(user_id)
+        UUID(data.supabase_id)
+        try:
+            return await self._run(self.database.update_user_id, user_id, data)
+        finally:
+            # the user id changes to supabase_id
+            self.invalidate_profiles(user_id, data.supabase_id)
+
+    async def get_usernames_starting_with(self, string: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        return await self._run(self.database.get_usernames_starting_with, string, limit, cursor)
+
+    async def search_users(self, username: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        return await self._run(self.database.search_users, username, limit, cursor)
+
+    async def follow_user(self, follower_user_id: str, followed_user_id: str):
+        try:
+            return await self._run(self.database.follow_user, follower_user_id, followed_user_id)
+        finally:
+            # both profiles show the follow counters
+            self.invalidate_profiles(follower_user_id, followed_user_id)
+            self.events_written()
+
+    async def unfollow_user(self, follower_user_id: str, followed_user_id: str):
+        try:
+            return await self._run(self.database.unfollow_user, follower_user_id, followed_user_id)
+        finally:
+            self.invalidate_profiles(follower_user_id, followed_user_id)
+            self.events_written()
+
+    async def bulk_follow(self, edges: list[FollowEdge]):
+        results = await self._run(self.database.bulk_follow, edges)
+        self.invalidate_profiles(*{user_id for result in results if result.status == "followed" for user_id in (result.follower_id, result.followed_id)})
+        self.events_written()
+        return results
+
+    async def bulk_unfollow(self, edges: list[FollowEdge]):
+        results = await self._run(self.database.bulk_unfollow, edges)
+        self.invalidate_profiles(*{user_id for result in results if result.status == "unfollowed" for user_id in (result.follower_id, result.followed_id)})
+        self.events_written()
+        return results
+
+    async def reconcile_follow_counters(self, batch_size: int = 10000):
+        try:
+            return await self._run(self.database.reconcile_follow_counters, batch_size)
+        finally:
+            self.profile_cache.clear()
+
+    def export_users(self, since: datetime | None = None, until: datetime | None = None):
+        # not awaited: an iterator of NDJSON chunks (sync for Database, async for
+        # AsyncDatabase), StreamingResponse consumes both without blocking the loop
+        return self.database.export_users(since, until)
+
+    def export_followers(self, since: datetime | None = None, until: datetime | None = None):
+        return self.database.export_followers(since, until)
+
+    async def get_followers(self, user_id: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        return await self._run(self.database.get_followers, user_id, limit, cursor)
+
+    async def get_following(self, user_id: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        return await self._run(self.database.get_following, user_id, limit, cursor)
+
+    async def update_user_profile(self, user_id: str, data: UserEditProfile):
+        try:
+            return await self._run(self.database.update_user_profile, user_id, data)
+        finally:
+            self.invalidate_profiles(user_id)
+            self.events_written()
+
+    async def get_follow_suggestions(self, user_id: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        return await self._run(self.database.get_follow_suggestions, user_id, limit, cursor)
+
+    async def claim_outbox_events(self, batch_size: int, lease: float) -> list[dict]:
+        return await self._run(self.database.claim_outbox_events, batch_size, lease)
+
+    async def complete_outbox_events(self, event_ids: list[str]):
+        return await self._run(self.database.complete_outbox_events, event_ids)
+
+    async def release_outbox_events(self, event_ids: list[str], delay: float):
+        return await self._run(self.database.release_outbox_events, event_ids, delay)
+
+    async def purge_outbox_events(self, retention: float) -> int:
+        return await self._run(self.database.purge_outbox_events, retention)
+
+    async def count_pending_outbox_events(self) -> int:
+        return await self._run(self.database.count_pending_outbox_events)
+
+    async def get_near_users(self, user_id:str, radius_km: float = DEFAULT_NEAR_RADIUS_KM):
+        return await self._run(self.database.get_near_users, user_id, radius_km)
+
+    async def get_users_with_common_interests(self, user_id:str, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        return await self._run(self.database.get_users_with_common_interests, user_id, limit, cursor)
+
+class AsyncUserAccountService(UserAccountService):
+    """
+    Service backed by AsyncDatabase (asyncpg), every query is awaited natively.
+    """
+    database_class = AsyncDatabase
+
+    async def _run(self, method, *args):
+        return await method(*args)
+
+def get_user_service() -> UserAccountService:
+    # the tables are created by the migrate step (jobs.migrate), not here
+    broker = get_event_broker()
+    outbox = OutboxDispatcher(broker, registry=metrics_registry) if broker else None
+    service = AsyncUserAccountService(get_async_engine(), outbox) if is_async_database() else UserAccountService(get_engine(), outbox)
+    instrument_engine(service.database.engine)
+    return service
+
+class LazyUserService:
+    """
+    The service the routes use, created by factory on first use instead of at
+    import: the app lifespan creates it, so importing the app opens no
+    connection and every worker process builds its own engine and pool.
+    Attributes are forwarded to the service.
+    """
+    def __init__(self, factory=get_user_service):
+        self._factory = factory
+        self._service = None
+
+    @property
+    def created(self) -> bool:
+        return self._service is not None
+
+    def get(self) -> UserAccountService:
+        if self._service is None:
+            self._service = self._factory()
+        return self._service
+
+    def set(self, service: UserAccountService):
+        # points the routes at another service (benchmarks)
+        self._service = service
+
+    async def close(self):
+        """
+        Stops the outbox dispatcher and disposes the engine of the service, the
+        next use creates a new one.
+        """
+        service, self._service = self._service, None
+        if service is None:
+            return
+        if service.outbox:
+            await service.outbox.stop()
+        dispose = service.database.engine.dispose()
+        if asyncio.iscoroutine(dispose):
+            await dispose
+
+    def after_fork(self):
+        """
+        Forgets a service inherited from the parent process (gunicorn post_fork).
+        Its pooled connections are dropped without closing them, they belong to
+        the parent, and the next use creates a service for this process.
+        """
+        service, self._service = self._service, None
+        if service is not None:
+            engine = service.database.engine
+            getattr(engine, "sync_engine", engine).dispose(close=False)
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
@@ -0,0 +1,449 @@
+from sqlalchemy import select, delete, insert
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker
+from sqlalchemy.orm import selectinload
+from loguru import logger
+from business_logic.users.users_model import Users, UserInfo, Followers, UserInterests, OutboxEvents
+from business_logic.users.users_schemas import UserAccountBase, UserCreationResponse, UserCompleteCreation, FollowResponse, UserEditProfile, FollowEdge, BulkFollowResult, UserImportRow
+from database.db import export_users_statement, export_followers_statement, export_lines, EXPORT_BATCH_SIZE, import_users_statement, BULK_FOLLOW, BULK_UNFOLLOW, bulk_follow_statement, bulk_follow_results, follow_counters_statement, authors_statement, user_to_author_response, order_authors, filter_prefix, username_index_statement, USERNAME_INDEX_ENABLED, USERNAME_INDEX_REFRESH_SECONDS, USERNAME_INDEX_BATCH_SIZE, search_users_page, search_sort_key, normalize_interests, common_interests_page, common_interests_sort_key, user_to_common_interests_response, suggestions_page, suggestions_sort_key, user_to_suggestion_response, user_to_response, user_to_info_response, user_to_near_response, users_sort_key, USERS_SORT_COLUMNS, USER_RESPONSE_COLUMNS, follow_edges_page, follow_edges_sort_key, near_candidates_statement, DEFAULT_NEAR_RADIUS_KM
+from database.migrations import migrate, has_trigram, reconcile_follow_counters
+from database.outbox import CLAIM_OUTBOX_EVENTS, COMPLETE_OUTBOX_EVENTS, RELEASE_OUTBOX_EVENTS, PURGE_OUTBOX_EVENTS, COUNT_PENDING_OUTBOX_EVENTS, outbox_rows, outbox_event, follow_event_data, profile_event_data
+from database.pagination import DEFAULT_PAGE_SIZE, USERS_CURSOR_TYPES, decode_cursor, keyset_page, split_page
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+from utils.geo import rank_by_distance
+from utils.prefix_index import PrefixIndex
+
+class AsyncDatabase:
+    """
+    asyncio counterpart of Database, backed by an AsyncEngine (asyncpg).
+
+    Every method mirrors the one with the same name in Database and returns the
+    same schemas, but awaits Postgres instead of blocking the event loop.
+    Relationships are always eager loaded because lazy loads are not allowed
+    on an AsyncSession.
+    """
+    def __init__(self, engine: AsyncEngine, outbox: bool = False):
+        self.engine = engine
+        self.session = async_sessionmaker(engine, expire_on_commit=False)
+        self.users_table = Users.__table__
+        self.userinfo_table = UserInfo.__table__
+        self.followers_table = Followers.__table__
+        self.user_interests_table = UserInterests.__table__
+        self.outbox_table = OutboxEvents.__table__
+        self.outbox = outbox
+        # whether pg_trgm is installed, checked on the first search
+        self.trigram = None
+        self.username_index = PrefixIndex(USERNAME_INDEX_REFRESH_SECONDS)
+
+    async def create_table(self):
+        async with self.engine.begin() as connection:
+            try:
+                await connection.run_sync(migrate)
+                logger.info("Table created successfully")
+            except SQLAlchemyError as e:
+                logger.error(f"Error creating table: {e}")
+
+    async def insert_user(self, user: UserAccountBase):
+        local_timezone = timezone(timedelta(hours=-3))
+        now = datetime.now(local_timezone)
+        timestamp = now.isoformat()
+        # asyncpg does not coerce strings, the column is a naive timestamp
+        user_model_instance = Users(username=user.username, name=user.name, email=user.email, profilePic=None, createdat=now.replace(tzinfo=None))
+        async with self.session() as session:
+            try:
+                session.add(user_model_instance)
+                await session.flush()
+                new_user = UserCreationResponse(id=user_model_instance.id, username=user.username, email=user.email, name=user.name, created_at=timestamp)
+                await self.add_events(session, "user.created", new_user.model_dump(mode="json"))
+                await session.commit()
+                logger.info("User inserted successfully")
+                self.username_index.add(user_model_instance.username, user_model_instance.createdat, user_model_instance.internal_id)
+                return new_user
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+                await session.rollback()
+                raise e
+
+    async def get_user_by_id(self, user_id: str):
+        async with self.session() as session:
+            try:
+                statement = select(Users).options(selectinload(Users.userinfo)).where(Users.id == UUID(user_id))
+                user = (await session.scalars(statement)).one()
+                logger.info("User retrieved successfully")
+                return user_to_info_response(user)
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+
+    async def get_email_by_username(self, username: str):
+        async with self.session() as session:
+            try:
+                statement = select(Users.email).where(Users.username == username)
+                email = (await session.scalars(statement)).one_or_none()
+                if email:
+                    logger.info("Email retrieved successfully in database")
+                    return email
+                logger.error("Email not found")
+                return None
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+
+    async def check_email_exists(self, email: str):
+        async with self.session() as session:
+            try:
+                statement = select(Users.email).where(Users.email == email)
+                email = (await session.scalars(statement)).one_or_none()
+                if email:
+                    logger.info("Email retrieved successfully in database")
+                    return {"exists": True}
+                logger.error("Email not found")
+                return {"exists": False}
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+
+    async def get_users(self, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        users, next_cursor = [], None
+        async with self.session() as session:
+            try:
+                statement = keyset_page(select(*USER_RESPONSE_COLUMNS), USERS_SORT_COLUMNS, cursor, USERS_CURSOR_TYPES, limit)
+                user_objects, next_cursor = split_page((await session.execute(statement)).all(), limit, users_sort_key)
+                users = [user_to_response(user) for user in user_objects]
+                logger.info(f"{len(users)} users retrieved successfully")
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+        return users, next_cursor
+
+    async def update_user_id(self, user_id: str, data: UserCompleteCreation):
+        async with self.session() as session:
+            try:
+                statement = select(Users).options(selectinload(Users.userinfo)).where(Users.id == UUID(user_id))
+                user = (await session.scalars(statement)).one()
+                user.id = UUID(data.supabase_id)
+                logger.info(f"User id: {user.id}, profilePic: {data.profilePic}")
+                user.profilePic = data.profilePic
+                user.userinfo = UserInfo(birthdate=data.birthdate, locationLat=data.locationLat, locationLong=data.locationLong, country=data.country, isoCountry=data.isoCountry, region=data.region)
+                await session.commit()
+                logger.info("User updated successfully")
+                return user
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+                await session.rollback()
+                raise e
+
+    async def get_authors(self, ids: list[UUID], usernames: list[str]) -> list[dict]:
+        async with self.session() as session:
+            try:
+                authors = (await session.execute(authors_statement(ids, usernames))).all()
+                logger.info(f"{len(authors)} authors retrieved successfully")
+                return order_authors([user_to_author_response(author) for author in authors], ids, usernames)
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemy Error: {e}")
+                raise e
+
+    async def get_user_authors_info(self, user_id: str, authors: list[str]):
+        try:
+            return await self.get_authors([], authors)
+        except SQLAlchemyError:
+            return None
+
+    async def get_user_authors_info_id(self, user_id: str, authors: list[str]):
+        try:
+            return await self.get_authors([UUID(author) for author in authors], [])
+        except (ValueError, SQLAlchemyError):
+            logger.error("Invalid author id")
+            return None
+
+    async def get_usernames_starting_with(self, string: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        prefix = filter_prefix(string)
+        if prefix and self.username_index.ready:
+            page = await self._get_usernames_from_index(prefix, limit, cursor)
+            # None: the index can not serve this page cheaply (deep page of a common prefix)
+            if page is not None:
+                return page
+        users, next_cursor = [], None
+        async with self.session() as session:
+            try:
+                statement = keyset_page(select(*USER_RESPONSE_COLUMNS).where(Users.username.ilike(string)), USERS_SORT_COLUMNS, cursor, USERS_CURSOR_TYPES, limit)
+                user_objects, next_cursor = split_page((await session.execute(statement)).all(), limit, users_sort_key)
+                users = [user_to_response(user) for user in user_objects]
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+        return users, next_cursor
+
+    async def _get_usernames_from_index(self, prefix: str, limit: int, cursor: str | None):
+        after = decode_cursor(cursor, *USERS_CURSOR_TYPES) if cursor else None
+        async with self.session() as session:
+            try:
+                if self.username_index.needs_refresh():
+                    self.username_index.refresh((await session.execute(username_index_statement(self.username_index.watermark()))).all())
+                while True:
+                    internal_ids = self.username_index.lookup(prefix, limit + 1, after)
+                    if internal_ids is None:
+                        return None
+                    users = {user.internal_id: user for user in await session.execute(select(*USER_RESPONSE_COLUMNS).where(Users.internal_id.in_(internal_ids)))}
+                    deleted = set(internal_ids) - users.keys()
+                    if not deleted:
+                        break
+                    # deleted outside this process, drop them and look up again
+                    self.username_index.discard(deleted)
+                user_objects, next_cursor = split_page([users[internal_id] for internal_id in internal_ids], limit, users_sort_key)
+                return [user_to_response(user) for user in user_objects], next_cursor
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+                return [], None
+
+    async def load_username_index(self):
+        if not USERNAME_INDEX_ENABLED:
+            return
+        async with self.session() as session:
+            try:
+                result = await session.stream(username_index_statement())
+                rows = []
+                async for partition in result.partitions(USERNAME_INDEX_BATCH_SIZE):
+                    rows.extend(tuple(row) for row in partition)
+                self.username_index.load(rows)
+                logger.info(f"Username index loaded with {len(self.username_index)} users")
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+
+    async def search_users(self, username: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        async with self.session() as session:
+            try:
+                if self.trigram is None:
+                    self.trigram = await session.run_sync(lambda sync_session: has_trigram(sync_session.connection()))
+                statement = search_users_page(username, limit, cursor, fuzzy=self.trigram)
+                rows, next_cursor = split_page((await session.execute(statement)).all(), limit, search_sort_key)
+                logger.info("Users retrieved successfully in database")
+                return [user_to_response(row) for row in rows], next_cursor
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+
+    async def clear_table(self):
+        async with self.session() as session:
+            try:
+                await session.execute(self.followers_table.delete())
+                await session.execute(self.user_interests_table.delete())
+                await session.execute(self.userinfo_table.delete())
+                await session.execute(self.users_table.delete())
+                await session.execute(self.outbox_table.delete())
+                await session.commit()
+                self.username_index.clear()
+                logger.info("Tables cleared successfully.")
+            except Exception as e:
+                logger.error(f"Error clearing tables: {e}")
+                await session.rollback()
+
+    async def follow_user(self, follower_user_id: str, followed_user_id: str):
+        async with self.session() as session:
+            try:
+                local_timezone = timezone(timedelta(hours=-3))
+                now = datetime.now(local_timezone)
+                follower_model_instance = Followers(follower_id=UUID(follower_user_id), followed_id=UUID(followed_user_id), followed_at=now.replace(tzinfo=None))
+                session.add(follower_model_instance)
+                await session.flush()
+                await session.execute(follow_counters_statement(follower_model_instance.follower_id, follower_model_instance.followed_id, 1))
+                follow = FollowResponse(follower_id=follower_user_id, followed_id=followed_user_id, followed_at=now.isoformat())
+                await self.add_events(session, "user.followed", follow.model_dump(mode="json"))
+                await session.commit()
+                logger.info(f"User {follower_user_id} is now following user {followed_user_id}")
+                return follow
+            except (SQLAlchemyError, ValueError) as e:
+                logger.error(f"SQLAlchemyError: {e}")
+
+    async def unfollow_user(self, follower_user_id: str, followed_user_id: str):
+        async with self.session() as session:
+            try:
+                follower_id, followed_id = UUID(follower_user_id), UUID(followed_user_id)
+                result = await session.execute(delete(Followers).where(Followers.follower_id == follower_id, Followers.followed_id == followed_id))
+                if result.rowcount == 0:
+                    logger.error("Follow relationship not found")
+                    return None
+                await session.execute(follow_counters_statement(follower_id, followed_id, -1))
+                await self.add_events(session, "user.unfollowed", follow_event_data(follower_id, followed_id))
+                await session.commit()
+                logger.info(f"User {follower_user_id} start to unfollowing user {followed_user_id}")
+                return FollowResponse(follower_id=follower_user_id, followed_id=followed_user_id, followed_at="")
+            except (SQLAlchemyError, ValueError) as e:
+                logger.error(f"SQLAlchemyError: {e}")
+
+    async def bulk_follow(self, edges: list[FollowEdge]) -> list[BulkFollowResult]:
+        local_timezone = timezone(timedelta(hours=-3))
+        followed_at = datetime.now(local_timezone).replace(tzinfo=None)
+        async with self.session() as session:
+            try:
+                rows = (await session.execute(bulk_follow_statement(BULK_FOLLOW, edges, 1, followed_at=followed_at))).all()
+                await self.add_events(session, "user.followed", *(follow_event_data(row.follower_id, row.followed_id) for row in rows if row.changed))
+                await session.commit()
+                logger.info(f"{sum(row.changed for row in rows)} of {len(edges)} follows inserted")
+                return bulk_follow_results(edges, rows, "followed", "already_following", "user_not_found")
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+                await session.rollback()
+                raise e
+
+    async def bulk_unfollow(self, edges: list[FollowEdge]) -> list[BulkFollowResult]:
+        async with self.session() as session:
+            try:
+                rows = (await session.execute(bulk_follow_statement(BULK_UNFOLLOW, edges, -1))).all()
+                await self.add_events(session, "user.unfollowed", *(follow_event_data(row.follower_id, row.followed_id) for row in rows))
+                await session.commit()
+                logger.info(f"{len(rows)} of {len(edges)} follows deleted")
+                return bulk_follow_results(edges, rows, "unfollowed", "not_following", "not_following")
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+                await session.rollback()
+                raise e
+
+    async def import_users(self, rows: list[tuple[int, UserImportRow]]) -> set[int]:
+        local_timezone = timezone(timedelta(hours=-3))
+        createdat = datetime.now(local_timezone).replace(tzinfo=None)
+        async with self.session() as session:
+            try:
+                inserted = set((await session.scalars(import_users_statement(rows, createdat))).all())
+                await session.commit()
+                logger.info(f"{len(inserted)} of {len(rows)} users imported")
+                return inserted
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+                await session.rollback()
+                raise e
+
+    def export_users(self, since: datetime | None = None, until: datetime | None = None):
+        return self._export(export_users_statement(since, until), "users")
+
+    def export_followers(self, since: datetime | None = None, until: datetime | None = None):
+        return self._export(export_followers_statement(since, until), "follows")
+
+    async def _export(self, statement, name: str):
+        async with self.session() as session:
+            try:
+                exported = 0
+                result = await session.stream(statement)
+                async for rows in result.partitions(EXPORT_BATCH_SIZE):
+                    exported += len(rows)
+                    yield export_lines(rows)
+                logger.info(f"{exported} {name} exported")
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+                raise e
+
+    async def reconcile_follow_counters(self, batch_size: int = 10000) -> int:
+        async with self.engine.connect() as connection:
+            repaired = await connection.run_sync(reconcile_follow_counters, batch_size, True)
+        logger.info(f"Follow counters reconciled, {repaired} users repaired")
+        return repaired
+
+    async def add_events(self, session, type: str, *data: dict):
+        if self.outbox and data:
+            await session.execute(insert(OutboxEvents), outbox_rows(type, *data))
+
+    async def claim_outbox_events(self, batch_size: int, lease: float) -> list[dict]:
+        async with self.engine.begin() as connection:
+            rows = (await connection.execute(CLAIM_OUTBOX_EVENTS, {"batch_size": batch_size, "lease": lease})).all()
+        return [outbox_event(row) for row in sorted(rows, key=lambda row: row.id)]
+
+    async def complete_outbox_events(self, event_ids: list[str]):
+        async with self.engine.begin() as connection:
+            await connection.execute(COMPLETE_OUTBOX_EVENTS, {"event_ids": [UUID(event_id) for event_id in event_ids]})
+
+    async def release_outbox_events(self, event_ids: list[str], delay: float):
+        async with self.engine.begin() as connection:
+            await connection.execute(RELEASE_OUTBOX_EVENTS, {"event_ids": [UUID(event_id) for event_id in event_ids], "delay": delay})
+
+    async def purge_outbox_events(self, retention: float, batch_size: int = 10000) -> int:
+        async with self.engine.begin() as connection:
+            return (await connection.execute(PURGE_OUTBOX_EVENTS, {"retention": retention, "batch_size": batch_size})).rowcount
+
+    async def count_pending_outbox_events(self) -> int:
+        async with self.engine.connect() as connection:
+            return (await connection.execute(COUNT_PENDING_OUTBOX_EVENTS)).scalar()
+
+    async def _get_follow_edges(self, user_id: str, edge_column, user_column, limit: int, cursor: str | None):
+        async with self.session() as session:
+            try:
+                statement = follow_edges_page(UUID(user_id), edge_column, user_column, limit, cursor)
+                rows, next_cursor = split_page((await session.execute(statement)).all(), limit, follow_edges_sort_key)
+                logger.info("Followers info retrieved successfully")
+                return [user_to_response(row) for row in rows], next_cursor
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemy Error: {e}")
+
+    async def get_followers(self, user_id: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        try:
+            UUID(user_id)
+        except (TypeError, ValueError):
+            logger.error("User not found")
+            return None
+        return await self._get_follow_edges(user_id, Followers.followed_id, Followers.follower_id, limit, cursor)
+
+    async def get_following(self, user_id: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        try:
+            UUID(user_id)
+        except (TypeError, ValueError):
+            logger.error("User not found")
+            return None
+        return await self._get_follow_edges(user_id, Followers.follower_id, Followers.followed_id, limit, cursor)
+
+    async def update_user_profile(self, user_id: str, data: UserEditProfile):
+        async with self.session() as session:
+            try:
+                statement = select(Users).options(selectinload(Users.userinfo)).where(Users.id == UUID(user_id))
+                user = (await session.scalars(statement)).one()
+                if data.name:
+                    user.name = data.name
+                if data.birthdate:
+                    user.userinfo.birthdate = data.birthdate
+                if data.interests:
+                    user.userinfo.interests = data.interests
+                    await session.execute(delete(UserInterests).where(UserInterests.user_id == user.id))
+                    interests = normalize_interests(data.interests)
+                    if interests:
+                        await session.execute(insert(UserInterests), [{"user_id": user.id, "interest": interest} for interest in interests])
+                if data.profilePic:
+                    user.profilePic = data.profilePic
+                await self.add_events(session, "user.profile_updated", profile_event_data(user.id, data))
+                await session.commit()
+                logger.info("User updated successfully")
+                return user
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+                await session.rollback()
+                raise e
+
+    async def get_near_users(self, user_id: str, radius_km: float = DEFAULT_NEAR_RADIUS_KM):
+        async with self.session() as session:
+            try:
+                origin = (await session.execute(select(UserInfo.locationLat, UserInfo.locationLong).where(UserInfo.user_id == UUID(user_id)))).one_or_none()
+                if origin is None or None in origin:
+                    logger.error("User not found or without location")
+                    return []
+
+                candidates = (await session.execute(near_candidates_statement(UUID(user_id), origin.locationLat, origin.locationLong, radius_km))).all()
+                near_users = rank_by_distance(tuple(origin), candidates, radius_km, lambda row: (row.locationLat, row.locationLong))
+                logger.info(f"{len(near_users)} near users retrieved successfully out of {len(candidates)} candidates")
+                return [user_to_near_response(row, distance_km) for row, distance_km in near_users]
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+                return []
+
+    async def get_users_with_common_interests(self, user_id: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        async with self.session() as session:
+            try:
+                statement = common_interests_page(UUID(user_id), limit, cursor)
+                rows, next_cursor = split_page((await session.execute(statement)).all(), limit, common_interests_sort_key)
+                logger.info("Users with common interests retrieved successfully")
+                return [user_to_common_interests_response(row, row.shared_interests) for row in rows], next_cursor
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+                return [], None
+
+    async def get_follow_suggestions(self, user_id: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        async with self.session() as session:
+            try:
+                statement = suggestions_page(UUID(user_id), limit, cursor)
+                rows, next_cursor = split_page((await session.execute(statement)).all(), limit, suggestions_sort_key)
+                logger.info(f"{len(rows)} follow suggestions retrieved successfully")
+                return [user_to_suggestion_response(row) for row in rows], next_cursor
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+                return [], None
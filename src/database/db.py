@@ -1,62 +1,512 @@
-from sqlalchemy import create_engine, MetaData, Table, Column, String, or_, and_
+from sqlalchemy import create_engine, MetaData, Table, Column, String, Integer, Float, Boolean, DateTime, or_, and_, text, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
 from sqlalchemy.exc import NoResultFound, SQLAlchemyError, IntegrityError
 from sqlalchemy.orm import sessionmaker
 from loguru import logger
-from business_logic.users.users_model import Users, UserInfo, Followers
-from business_logic.users.users_schemas import UserAccountBase, UserCreationResponse, UserCompleteCreation,UserInfoResponse, FollowResponse, UserEditProfile
-from sqlalchemy.orm import Session
-from sqlalchemy import select
-from business_logic.users.users_model import Base
+from business_logic.users.users_model import Users, UserInfo, Followers, UserInterests, OutboxEvents
+from business_logic.users.users_schemas import UserAccountBase, UserCreationResponse, UserCompleteCreation,UserInfoResponse, FollowResponse, UserEditProfile, FollowEdge, BulkFollowResult, UserImportRow
+from sqlalchemy.orm import Session, aliased, joinedload
+from sqlalchemy import select, delete, insert, update, func, case, exists, true, false, literal, union_all, tuple_
 from datetime import datetime, timedelta, timezone
-from uuid import UUID
-from geopy.distance import geodesic
+from uuid import UUID, uuid4
+import orjson
+import os
+from utils.geo import bounding_box, rank_by_distance
+from utils.prefix_index import PrefixIndex
+from utils.json_response import json_default
+from database.migrations import migrate, has_trigram, reconcile_follow_counters
+from database.outbox import CLAIM_OUTBOX_EVENTS, COMPLETE_OUTBOX_EVENTS, RELEASE_OUTBOX_EVENTS, PURGE_OUTBOX_EVENTS, COUNT_PENDING_OUTBOX_EVENTS, outbox_rows, outbox_event, follow_event_data, profile_event_data
+from database.pagination import DEFAULT_PAGE_SIZE, USERS_CURSOR_TYPES, FOLLOWS_CURSOR_TYPES, COMMON_INTERESTS_CURSOR_TYPES, SEARCH_CURSOR_TYPES, SUGGESTIONS_CURSOR_TYPES, decode_cursor, keyset_page, split_page
+
+USERS_SORT_COLUMNS = (Users.createdat, Users.internal_id)
+# list pages select these columns instead of Users entities: rows are mapped
+# straight to response dicts, no ORM objects are built for them
+USER_RESPONSE_COLUMNS = (Users.id, Users.username, Users.name, Users.email, Users.createdat, Users.profilePic, Users.internal_id)
+DEFAULT_NEAR_RADIUS_KM = 10.0
+MAX_NEAR_RADIUS_KM = float(os.getenv("MAX_NEAR_RADIUS_KM", "500"))
+# follow suggestions walk the SUGGESTIONS_MAX_FOLLOWING latest follows of the
+# user and the SUGGESTIONS_FANOUT latest follows of each of them
+SUGGESTIONS_MAX_FOLLOWING = int(os.getenv("SUGGESTIONS_MAX_FOLLOWING", "1000"))
+SUGGESTIONS_FANOUT = int(os.getenv("SUGGESTIONS_FANOUT", "100"))
+USERNAME_INDEX_ENABLED = os.getenv("USERNAME_INDEX_ENABLED", "true").lower() == "true"
+USERNAME_INDEX_REFRESH_SECONDS = float(os.getenv("USERNAME_INDEX_REFRESH_SECONDS", "5"))
+USERNAME_INDEX_BATCH_SIZE = 10000
+# catch-ups re-read this far behind the newest indexed user, inserts of other processes may commit late
+USERNAME_INDEX_OVERLAP = timedelta(seconds=60)
+# rows fetched per round trip by the export server-side cursors, one NDJSON chunk each
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+# createdat / followed_at are stored as naive local (UTC-3) times
+LOCAL_TIMEZONE = timezone(timedelta(hours=-3))
+
+def users_sort_key(user) -> tuple:
+    return user.createdat, user.internal_id
+
+def filter_prefix(pattern: str) -> str | None:
+    """
+    Literal prefix of a GET /users filter like "sofi%", None for any other
+    LIKE pattern (those are only served by the database).
+    """
+    prefix = pattern[:-1]
+    if not pattern.endswith("%") or not prefix or any(char in prefix for char in "%_\\"):
+        return None
+    return prefix
+
+def username_index_statement(since: datetime | None = None):
+    statement = select(Users.username, Users.createdat, Users.internal_id)
+    if since is not None:
+        statement = statement.where(Users.createdat >= since - USERNAME_INDEX_OVERLAP)
+    return statement
+
+def follow_edges_page(user_id, edge_column, user_column, limit: int, cursor: str | None):
+    """
+    One page of the users on the other end of user_id's follow edges, in a
+    single join ordered by (followed_at, user_column).
+
+    Followers of X: edge_column=Followers.followed_id, user_column=Followers.follower_id
+    Followed by X: edge_column=Followers.follower_id, user_column=Followers.followed_id
+    """
+    statement = select(*USER_RESPONSE_COLUMNS, Followers.followed_at).join(Followers, user_column == Users.id).where(edge_column == user_id)
+    return keyset_page(statement, (Followers.followed_at, user_column), cursor, FOLLOWS_CURSOR_TYPES, limit)
+
+def follow_edges_sort_key(row) -> tuple:
+    return row.followed_at, row.id
+
+def near_candidates_statement(user_id, lat: float, long: float, radius_km: float):
+    """
+    Users whose location falls in the bounding box of radius_km around (lat, long).
+    """
+    min_lat, max_lat, long_ranges = bounding_box(lat, long, radius_km)
+    return select(*USER_RESPONSE_COLUMNS, UserInfo.locationLat, UserInfo.locationLong).join(UserInfo).where(
+        Users.id != user_id,
+        UserInfo.locationLat.between(min_lat, max_lat),
+        or_(*(UserInfo.locationLong.between(min_long, max_long) for min_long, max_long in long_ranges)),
+    )
+
+def normalize_interests(interests: str | None) -> list[str]:
+    """
+    ",Music, sports,," -> ["music", "sports"]
+    """
+    normalized = (interest.strip().lower() for interest in (interests or "").split(","))
+    return sorted({interest for interest in normalized if interest})
+
+def common_interests_page(user_id, limit: int, cursor: str | None):
+    """
+    Users sharing at least one interest with user_id, ranked by the number of
+    shared interests, in one query over the user_interests index.
+    """
+    mine = aliased(UserInterests)
+    other = aliased(UserInterests)
+    shared_interests = func.count()
+    statement = (
+        select(*USER_RESPONSE_COLUMNS, shared_interests.label("shared_interests"))
+        .join(other, other.user_id == Users.id)
+        .join(mine, and_(mine.interest == other.interest, mine.user_id == user_id))
+        .where(other.user_id != user_id)
+        .group_by(Users.internal_id)
+    )
+    return keyset_page(statement, (-shared_interests, Users.createdat, Users.internal_id), cursor, COMMON_INTERESTS_CURSOR_TYPES, limit, aggregate=True)
+
+def common_interests_sort_key(row) -> tuple:
+    return -row.shared_interests, row.createdat, row.internal_id
+
+def suggestions_page(user_id, limit: int, cursor: str | None, max_following: int = SUGGESTIONS_MAX_FOLLOWING, fanout: int = SUGGESTIONS_FANOUT):
+    """
+    Accounts followed by the accounts user_id follows (friends of friends) that
+    user_id does not follow yet, ranked by mutual connections: how many of the
+    accounts user_id follows follow them.
+
+    The walk is bounded whatever the size of the graph: the max_following
+    latest follows of user_id, then the fanout latest follows of each (one
+    LATERAL index range each), at most max_following * fanout edges. Accounts
+    that are not reached this way are not suggested. Every page re-ranks the
+    candidates, the cursor keeps pages from overlapping.
+    """
+    mine = aliased(Followers)
+    theirs = aliased(Followers)
+    already = aliased(Followers)
+    following = (
+        select(mine.followed_id)
+        .where(mine.follower_id == user_id)
+        .order_by(mine.followed_at.desc())
+        .limit(max_following)
+        .subquery("following")
+    )
+    their_follows = (
+        select(theirs.followed_id)
+        .where(theirs.follower_id == following.c.followed_id)
+        .order_by(theirs.followed_at.desc())
+        .limit(fanout)
+        .lateral("their_follows")
+    )
+    mutual_connections = func.count()
+    candidates = (
+        select(their_follows.c.followed_id.label("user_id"), mutual_connections.label("mutual_connections"))
+        .select_from(following)
+        .join(their_follows, true())
+        .where(their_follows.c.followed_id != user_id)
+        .group_by(their_follows.c.followed_id)
+        .subquery("candidates")
+    )
+    # every follow of user_id is excluded, not only the max_following walked, once per candidate
+    statement = (
+        select(*USER_RESPONSE_COLUMNS, candidates.c.mutual_connections)
+        .join(candidates, Users.id == candidates.c.user_id)
+        .where(~exists().where(already.follower_id == user_id, already.followed_id == candidates.c.user_id))
+    )
+    return keyset_page(statement, (-candidates.c.mutual_connections, Users.createdat, Users.internal_id), cursor, SUGGESTIONS_CURSOR_TYPES, limit)
+
+def suggestions_sort_key(row) -> tuple:
+    return -row.mutual_connections, row.createdat, row.internal_id
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def search_users_page(query: str, limit: int, cursor: str | None, fuzzy: bool = False):
+    """
+    Users whose username or name contains query, ranked exact (0) > prefix (1)
+    > substring (2) > fuzzy (3), then by creation.
+
+    One branch per rank, each excluding the better ranks, applying the cursor
+    and reading at most limit + 1 rows in (createdat, internal_id) order: a
+    page never ranks more than 4 * (limit + 1) rows, however common query is,
+    and every match is reached by following the cursors. A branch is not
+    run at all once the better ranks fill the page. Exact and prefix
+    matches are served by the lower(username) / lower(name) text_pattern_ops
+    indexes whatever the length of query. Substring matches use the trigram
+    GIN indexes (pg_trgm, 3 characters or more), and with fuzzy (pg_trgm
+    installed) similar usernames/names are matched too.
+    """
+    query = query.strip().lower()
+    escaped = escape_like(query)
+    username, name = func.lower(Users.username), func.lower(Users.name)
+    # inlined, a prepared statement's generic plan can not use the index for LIKE $1
+    pattern = literal(f"{escaped}%", literal_execute=True)
+    exact = or_(username == query, name == query)
+    prefix = or_(username.like(pattern, escape="\\"), name.like(pattern, escape="\\"))
+    substring = or_(Users.username.ilike(f"%{escaped}%", escape="\\"), Users.name.ilike(f"%{escaped}%", escape="\\"))
+    # IS NOT true, a NULL name makes the better rank's condition NULL
+    ranks = [exact, and_(prefix, exact.is_not(true())), and_(substring, prefix.is_not(true()))]
+    if fuzzy:
+        ranks.append(and_(or_(Users.username.bool_op("%")(query), Users.name.bool_op("%")(query)), substring.is_not(true())))
+
+    after = decode_cursor(cursor, *SEARCH_CURSOR_TYPES) if cursor else None
+    branches, found = [], None
+    for rank, condition in enumerate(ranks):
+        statement = select(*USER_RESPONSE_COLUMNS, literal(rank).label("rank"))
+        if after and rank < after[0]:
+            # ranks before the cursor are done, the planner skips the branch
+            statement = statement.where(false())
+        elif after and rank == after[0]:
+            statement = statement.where(condition, tuple_(*USERS_SORT_COLUMNS) > tuple_(*after[1:]))
+        else:
+            statement = statement.where(condition)
+        if found is not None:
+            # a one-time filter: the branch is not scanned once the better ranks fill the page
+            statement = statement.where(found <= limit)
+        branch = statement.order_by(*USERS_SORT_COLUMNS).limit(limit + 1).cte(f"rank_{rank}")
+        count = select(func.count()).select_from(branch).scalar_subquery()
+        found = count if found is None else found + count
+        branches.append(branch)
+    ranked = union_all(*(select(branch) for branch in branches)).subquery("ranked")
+    return select(ranked).order_by(ranked.c.rank, ranked.c.createdat, ranked.c.internal_id).limit(limit + 1)
+
+def search_sort_key(row) -> tuple:
+    return row.rank, row.createdat, row.internal_id
+
+# The list mappers build plain dicts with the fields of their response schema:
+# the routes send them as they are (FastJSONResponse), so they are not
+# validated a second time against response_model.
+
+def user_to_response(row) -> dict:
+    # UserCreationResponse from a row starting with USER_RESPONSE_COLUMNS,
+    # unpacked by position: several times faster than Row attribute lookups
+    id, username, name, email, createdat, profilePic = row[:6]
+    return {
+        "id": id,
+        "username": username,
+        "name": name,
+        "email": email,
+        "created_at": createdat.isoformat(),
+        "profilePic": profilePic,
+    }
+
+def user_to_near_response(row, distance_km: float) -> dict:
+    # NearUserResponse
+    return {**user_to_response(row), "distance_km": round(distance_km, 3)}
+
+def user_to_common_interests_response(row, shared_interests: int) -> dict:
+    # CommonInterestsUserResponse
+    return {**user_to_response(row), "shared_interests": shared_interests}
+
+def user_to_suggestion_response(row) -> dict:
+    # SuggestedUserResponse
+    return {**user_to_response(row), "mutual_connections": row.mutual_connections}
+
+def authors_statement(ids: list[UUID], usernames: list[str]):
+    # one query for users and their interests, whatever the number of authors
+    return select(*USER_RESPONSE_COLUMNS, Users.followers_count, Users.following_count, UserInfo.interests).outerjoin(UserInfo).where(or_(Users.id.in_(ids), Users.username.in_(usernames)))
+
+def follow_counters_statement(follower_id: UUID, followed_id: UUID, delta: int):
+    # both counters in one statement, the two rows locked in id order first (whatever the
+    # plan of the update), as the bulk statements lock theirs, so concurrent follows between
+    # the same users cannot deadlock. NO KEY UPDATE does not block foreign key checks
+    locked = select(Users.id).where(Users.id.in_([follower_id, followed_id])).order_by(Users.id).with_for_update(key_share=True).cte("locked")
+    return update(Users).add_cte(locked).where(Users.id.in_(select(locked.c.id))).values(
+        followers_count=Users.followers_count + case((Users.id == followed_id, delta), else_=0),
+        following_count=Users.following_count + case((Users.id == follower_id, delta), else_=0),
+    )
+
+# Bulk follow / unfollow: the edges come as two arrays, the counters of every
+# user whose edges changed are updated by the same statement
+FOLLOW_COUNTER_DELTAS = """
+deltas AS (
+    SELECT id, sum(followers) AS followers, sum(following) AS following FROM (
+        SELECT followed_id AS id, :delta AS followers, 0 AS following FROM changed
+        UNION ALL
+        SELECT follower_id AS id, 0 AS followers, :delta AS following FROM changed
+    ) AS edges GROUP BY id
+), locked AS (
+    -- the counter rows are locked in id order, as follow_counters_statement does, so
+    -- concurrent bulk calls and follows on the same users cannot deadlock. The
+    -- update only touches rows locked here. NO KEY UPDATE, as the update takes:
+    -- it does not block the foreign key checks of follow inserts
+    SELECT users.id FROM users WHERE users.id IN (SELECT id FROM deltas) ORDER BY users.id FOR NO KEY UPDATE
+), counted AS (
+    UPDATE users SET followers_count = users.followers_count + deltas.followers, following_count = users.following_count + deltas.following
+    FROM deltas JOIN locked ON locked.id = deltas.id WHERE users.id = deltas.id
+)
+"""
+
+BULK_FOLLOW = text(f"""
+WITH input AS (
+    SELECT DISTINCT follower_id, followed_id FROM unnest(:follower_ids, :followed_ids) AS input(follower_id, followed_id)
+), valid AS (
+    SELECT input.follower_id, input.followed_id FROM input
+    JOIN users AS follower ON follower.id = input.follower_id
+    JOIN users AS followed ON followed.id = input.followed_id
+), changed AS (
+    -- in key order, so concurrent calls wait on each other's edges in the same order
+    INSERT INTO followers (follower_id, followed_id, followed_at)
+    SELECT follower_id, followed_id, :followed_at FROM valid ORDER BY follower_id, followed_id
+    ON CONFLICT DO NOTHING
+    RETURNING follower_id, followed_id
+), {FOLLOW_COUNTER_DELTAS}
+SELECT valid.follower_id, valid.followed_id, changed.follower_id IS NOT NULL AS changed
+FROM valid LEFT JOIN changed ON changed.follower_id = valid.follower_id AND changed.followed_id = valid.followed_id
+""")
+
+BULK_UNFOLLOW = text(f"""
+WITH input AS (
+    SELECT DISTINCT follower_id, followed_id FROM unnest(:follower_ids, :followed_ids) AS input(follower_id, followed_id)
+), targets AS (
+    -- the edges are locked in key order before they are deleted, as BULK_FOLLOW inserts them
+    SELECT followers.follower_id, followers.followed_id FROM followers JOIN input
+        ON followers.follower_id = input.follower_id AND followers.followed_id = input.followed_id
+    ORDER BY followers.follower_id, followers.followed_id FOR UPDATE OF followers
+), changed AS (
+    DELETE FROM followers USING targets
+    WHERE followers.follower_id = targets.follower_id AND followers.followed_id = targets.followed_id
+    RETURNING followers.follower_id, followers.followed_id
+), {FOLLOW_COUNTER_DELTAS}
+SELECT follower_id, followed_id, true AS changed FROM changed
+""")
+
+def bulk_follow_statement(statement, edges: list[FollowEdge], delta: int, **params):
+    uuid_array = ARRAY(PG_UUID(as_uuid=True))
+    return statement.bindparams(
+        bindparam("follower_ids", [edge.follower_id for edge in edges], type_=uuid_array),
+        bindparam("followed_ids", [edge.followed_id for edge in edges], type_=uuid_array),
+        bindparam("delta", delta, type_=Integer),
+        *(bindparam(name, value, type_=DateTime) for name, value in params.items()),
+    )
+
+def bulk_follow_results(edges: list[FollowEdge], rows, changed: str, unchanged: str, missing: str) -> list[BulkFollowResult]:
+    """
+    One result per requested edge, in request order: changed if the statement
+    changed it, unchanged if it returned it unchanged, missing if it did not return it.
+    """
+    outcomes = {(row.follower_id, row.followed_id): changed if row.changed else unchanged for row in rows}
+    return [
+        BulkFollowResult(follower_id=edge.follower_id, followed_id=edge.followed_id, status=outcomes.get((edge.follower_id, edge.followed_id), missing))
+        for edge in edges
+    ]
+
+# Bulk import of users (and userinfo / user_interests of the completed ones),
+# rows rejected by a unique constraint are skipped, the inserted lines are returned
+IMPORT_USERS = text("""
+WITH input AS (
+    SELECT * FROM unnest(:lines, :internal_ids, :ids, :usernames, :names, :emails, :profile_pics, :completed,
+                         :birthdates, :lats, :longs, :countries, :iso_countries, :regions, :interests)
+        AS input(line, internal_id, id, username, name, email, profile_pic, completed,
+                 birthdate, lat, long, country, iso_country, region, interests)
+), inserted AS (
+    INSERT INTO users (internal_id, id, username, name, email, "profilePic", createdat)
+    SELECT internal_id, id, username, name, email, profile_pic, :createdat FROM input ORDER BY line
+    ON CONFLICT DO NOTHING
+    RETURNING internal_id
+), completed AS (
+    SELECT input.* FROM input JOIN inserted ON inserted.internal_id = input.internal_id WHERE input.completed
+), info AS (
+    INSERT INTO userinfo (user_id, birthdate, "locationLat", "locationLong", country, "isoCountry", region, interests)
+    SELECT id, birthdate, lat, long, country, iso_country, region, interests FROM completed
+), indexed_interests AS (
+    INSERT INTO user_interests (user_id, interest)
+    SELECT DISTINCT completed.id, lower(trim(interest)) FROM completed, unnest(string_to_array(completed.interests, ',')) AS interest
+    WHERE trim(interest) <> ''
+    ON CONFLICT DO NOTHING
+)
+SELECT input.line FROM input JOIN inserted ON inserted.internal_id = input.internal_id
+""")
+
+def import_users_statement(rows: list[tuple[int, UserImportRow]], createdat: datetime):
+    uuid_array, string_array, float_array = ARRAY(PG_UUID(as_uuid=True)), ARRAY(String), ARRAY(Float)
+    users = [user for _, user in rows]
+    columns = [
+        ("lines", [line for line, _ in rows], ARRAY(Integer)),
+        ("internal_ids", [uuid4() for _ in rows], uuid_array),
+        ("ids", [user.supabase_id or uuid4() for user in users], uuid_array),
+        ("usernames", [user.username for user in users], string_array),
+        ("names", [user.name for user in users], string_array),
+        ("emails", [user.email for user in users], string_array),
+        ("profile_pics", [user.profilePic for user in users], string_array),
+        ("completed", [user.supabase_id is not None for user in users], ARRAY(Boolean)),
+        ("birthdates", [user.birthdate for user in users], string_array),
+        ("lats", [user.locationLat for user in users], float_array),
+        ("longs", [user.locationLong for user in users], float_array),
+        ("countries", [user.country for user in users], string_array),
+        ("iso_countries", [user.isoCountry for user in users], string_array),
+        ("regions", [user.region for user in users], string_array),
+        ("interests", [user.interests for user in users], string_array),
+    ]
+    return IMPORT_USERS.bindparams(
+        *(bindparam(name, values, type_=type_) for name, values, type_ in columns),
+        bindparam("createdat", createdat, type_=DateTime),
+    )
+
+def export_range(column, since: datetime | None, until: datetime | None) -> list:
+    """
+    Conditions restricting column to [since, until). Timezone aware bounds are
+    converted to the stored local time, naive ones are taken as local already.
+    """
+    since, until = (value.astimezone(LOCAL_TIMEZONE).replace(tzinfo=None) if value and value.tzinfo else value for value in (since, until))
+    if since and until and since >= until:
+        raise ValueError("since must be before until")
+    conditions = []
+    if since:
+        conditions.append(column >= since)
+    if until:
+        conditions.append(column < until)
+    return conditions
+
+def export_users_statement(since: datetime | None = None, until: datetime | None = None):
+    # plain columns, the rows are not loaded into the session's identity map
+    return select(
+        Users.id, Users.username, Users.name, Users.email, Users.profilePic, Users.createdat.label("created_at"),
+        Users.followers_count, Users.following_count,
+        UserInfo.birthdate, UserInfo.locationLat, UserInfo.locationLong, UserInfo.country, UserInfo.isoCountry, UserInfo.region, UserInfo.interests,
+    ).outerjoin(UserInfo).where(*export_range(Users.createdat, since, until))
+
+def export_followers_statement(since: datetime | None = None, until: datetime | None = None):
+    return select(Followers.follower_id, Followers.followed_id, Followers.followed_at).where(*export_range(Followers.followed_at, since, until))
+
+def export_lines(rows) -> bytes:
+    # one JSON object per row and line (NDJSON), orjson encodes the UUIDs and datetimes
+    return b"".join(orjson.dumps(row._asdict(), default=json_default, option=orjson.OPT_APPEND_NEWLINE) for row in rows)
+
+def user_to_author_response(row) -> dict:
+    # UserInfoResponse from an authors_statement row, authors only carry their interests out of userinfo
+    followers_count, following_count, interests = row[-3:]
+    return {
+        **user_to_response(row),
+        "birthdate": None,
+        "locationLat": None,
+        "locationLong": None,
+        "country": None,
+        "isoCountry": None,
+        "region": None,
+        "interests": interests,
+        "followers_count": followers_count,
+        "following_count": following_count,
+    }
+
+def order_authors(authors: list[dict], ids: list[UUID], usernames: list[str]) -> list[dict]:
+    """
+    authors in the order they were requested (ids first, then usernames), once each.
+    """
+    by_id = {author["id"]: author for author in authors}
+    by_username = {author["username"]: author for author in authors}
+    ordered = {}
+    for author in [by_id.get(author_id) for author_id in ids] + [by_username.get(username) for username in usernames]:
+        if author is not None:
+            ordered.setdefault(author["id"], author)
+    return list(ordered.values())
+
+def user_to_info_response(user: Users) -> UserInfoResponse:
+    # user.userinfo must already be loaded (or loadable) by the caller's session
+    return UserInfoResponse(
+        id=user.id,
+        username=user.username,
+        name=user.name,
+        email=user.email,
+        created_at=user.createdat.isoformat(),
+        profilePic=user.profilePic,
+        birthdate=user.userinfo.birthdate if user.userinfo else None,
+        locationLat=user.userinfo.locationLat  if user.userinfo else None,
+        locationLong=user.userinfo.locationLong  if user.userinfo else None,
+        country=user.userinfo.country if user.userinfo else None,
+        isoCountry=user.userinfo.isoCountry if user.userinfo else None,
+        region=user.userinfo.region if user.userinfo else None,
+        interests=user.userinfo.interests if user.userinfo else None,
+        followers_count=user.followers_count,
+        following_count=user.following_count,
+    )
 
 class Database:
-    def __init__(self, engine):
+    def __init__(self, engine, outbox: bool = False):
         self.engine = engine
         self.users_table = Users.__table__
         self.userinfo_table = UserInfo.__table__
         self.followers_table = Followers.__table__
-        self.create_table()
+        self.user_interests_table = UserInterests.__table__
+        self.outbox_table = OutboxEvents.__table__
+        # with outbox, user inserts, follows, unfollows and profile edits write
+        # their domain event to outbox_events in the same transaction
+        self.outbox = outbox
+        # whether pg_trgm is installed, checked on the first search
+        self.trigram = None
+        self.username_index = PrefixIndex(USERNAME_INDEX_REFRESH_SECONDS)
 
     def create_table(self):
+        # the migrate step (jobs.migrate), Database itself runs no DDL
         with self.engine.connect() as connection:
             try:
-                Base.metadata.create_all(bind=connection) 
-                logger.info("Table created successfully")
+                migrate(connection)
                 connection.commit()
+                logger.info("Table created successfully")
             except SQLAlchemyError as e:
                 logger.error(f"Error creating table: {e}")
                 connection.rollback()
 
-            table_user_exists = connection.dialect.has_table(connection, "users") 
-            if table_user_exists:
-                logger.info("Table 'users' exists")
-            else:
-                logger.info("Table does not exist")
-
-            if connection.dialect.has_table(connection, "userinfo"):
-                logger.info("Table 'userinfo' exists")
-            else:
-                logger.info("Table 'userinfo' does not exist")
-
-            if connection.dialect.has_table(connection, "followers"):
-                logger.info("Table 'followers' exists")
-            else:
-                logger.info("Table 'followers' does not exist")
-
     def insert_user(self, user: UserAccountBase):
         local_timezone = timezone(timedelta(hours=-3))
-        timestamp = datetime.now(local_timezone).isoformat()
-        user_model_instance = Users(username=user.username, name=user.name, email=user.email, profilePic=None, createdat=timestamp)
+        now = datetime.now(local_timezone)
+        timestamp = now.isoformat()
+        # the column is a naive timestamp (the offset was ignored), the index gets the stored value
+        createdat = now.replace(tzinfo=None)
+        user_model_instance = Users(username=user.username, name=user.name, email=user.email, profilePic=None, createdat=createdat)
         # userinfo_model_instance = UserInfo(birthdate=user.birthdate, location=user.location)
         # user_model_instance.userinfo = userinfo_model_instance
         with Session(self.engine) as session:
             try: 
                 session.add(user_model_instance)
+                session.flush()
+                new_user = UserCreationResponse(id=user_model_instance.id, username=user.username, email=user.email, name=user.name, created_at=timestamp)
+                # read before the commit, it expires the instance (reading it after reloads the row)
+                internal_id = user_model_instance.internal_id
+                self.add_events(session, "user.created", new_user.model_dump(mode="json"))
                 session.commit()
                 logger.info("User inserted successfully")
-                new_user = UserCreationResponse(id=user_model_instance.id, username=user.username, email=user.email, name=user.name, created_at=timestamp)
+                self.username_index.add(user.username, createdat, internal_id)
             except IntegrityError as e:
                 logger.error(f"IntegrityError: {e}")
                 session.rollback()
@@ -73,23 +523,9 @@ class Database:
     def get_user_by_id(self, user_id: str):
         with Session(self.engine) as session:
             try:
-                statement = select(Users).where(Users.id == UUID(user_id))
+                statement = select(Users).options(joinedload(Users.userinfo)).where(Users.id == UUID(user_id))
                 user = session.scalars(statement).one()
-                user_creation_response = UserInfoResponse(
-                    id=user.id,
-                    username=user.username,
-                    name=user.name,
-                    email=user.email,
-                    created_at=user.createdat.isoformat(),
-                    profilePic=user.profilePic,
-                    birthdate=user.userinfo.birthdate if user.userinfo else None,
-                    locationLat=user.userinfo.locationLat  if user.userinfo else None,
-                    locationLong=user.userinfo.locationLong  if user.userinfo else None,
-                    country=user.userinfo.country if user.userinfo else None,
-                    isoCountry=user.userinfo.isoCountry if user.userinfo else None,
-                    region=user.userinfo.region if user.userinfo else None,
-                    interests=user.userinfo.interests if user.userinfo else None
-                )
+                user_creation_response = user_to_info_response(user)
                 logger.info("User retrieved successfully")  
                 return user_creation_response
             except SQLAlchemyError as e:
@@ -123,29 +559,19 @@ class Database:
             except SQLAlchemyError as e:
                 logger.error(f"SQLAlchemyError: {e}")
 
-    def get_users(self):
-        users = []
+    def get_users(self, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        users, next_cursor = [], None
         with Session(self.engine) as session:
             try:
-                statement = select(Users)
-                user_objects = session.scalars(statement).all()
-                logger.info("Users retrieved successfully")
-                for user in user_objects:
-                    user_creation_response = UserCreationResponse(
-                        id=user.id,
-                        username=user.username,
-                        name=user.name,
-                        email=user.email,
-                        created_at=user.createdat.isoformat(),
-                        profilePic=user.profilePic
-                    )
-                    users.append(user_creation_response)
+                statement = keyset_page(select(*USER_RESPONSE_COLUMNS), USERS_SORT_COLUMNS, cursor, USERS_CURSOR_TYPES, limit)
+                user_objects, next_cursor = split_page(session.execute(statement).all(), limit, users_sort_key)
+                users = [user_to_response(user) for user in user_objects]
+                logger.info(f"{len(users)} users retrieved successfully")
             except SQLAlchemyError as e:
                 logger.error(f"SQLAlchemyError: {e}")
             finally:
                 session.close()
-        logger.info(f"Users RETURNED: {users}")
-        return users
+        return users, next_cursor
 
     def update_user_id(self, user_id: str, data: UserCompleteCreation):
         with Session(self.engine) as session:
@@ -167,94 +593,93 @@ class Database:
                 session.rollback()
                 raise e
 
-    def get_user_authors_info(self, user_id: str, authors: list[str]):
-        authors_info = []
+    def get_authors(self, ids: list[UUID], usernames: list[str]) -> list[dict]:
         with Session(self.engine) as session:
             try:
-                statement = select(Users).where(Users.username.in_(authors))
-                author_records = session.scalars(statement).all()
-                for author in author_records:
-                    author_info = UserInfoResponse(
-                        id=author.id,
-                        username=author.username,
-                        name=author.name,
-                        email=author.email,
-                        created_at=author.createdat.isoformat(),
-                        profilePic=author.profilePic,
-                        interests=author.userinfo.interests if author.userinfo else None,
-                    )
-                    authors_info.append(author_info)
-                logger.info("Authors info retrieved successfully")
-                return authors_info
+                authors = session.execute(authors_statement(ids, usernames)).all()
+                logger.info(f"{len(authors)} authors retrieved successfully")
+                return order_authors([user_to_author_response(author) for author in authors], ids, usernames)
             except SQLAlchemyError as e:
                 logger.error(f"SQLAlchemy Error: {e}")
+                raise e
+
+    def get_user_authors_info(self, user_id: str, authors: list[str]):
+        try:
+            return self.get_authors([], authors)
+        except SQLAlchemyError:
+            return None
 
     def get_user_authors_info_id(self, user_id: str, authors: list[str]):
-        authors_info = []
+        try:
+            return self.get_authors([UUID(author) for author in authors], [])
+        except (ValueError, SQLAlchemyError):
+            logger.error("Invalid author id")
+            return None
+
+    def get_usernames_starting_with(self, string: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        prefix = filter_prefix(string)
+        if prefix and self.username_index.ready:
+            page = self._get_usernames_from_index(prefix, limit, cursor)
+            # None: the index can not serve this page cheaply (deep page of a common prefix)
+            if page is not None:
+                return page
+        users, next_cursor = [], None
         with Session(self.engine) as session:
             try:
-                statement = select(Users).where(Users.id.in_(authors))
-                author_records = session.scalars(statement).all()
-                for author in author_records:
-                    author_info = UserInfoResponse(
-                        id=author.id,
-                        username=author.username,
-                        name=author.name,
-                        email=author.email,
-                        created_at=author.createdat.isoformat(),
-                        profilePic=author.profilePic,
-                        interests=author.userinfo.interests if author.userinfo else None,
-                    )
-                    authors_info.append(author_info)
-                logger.info("Authors info retrieved successfully")
-                return authors_info
+                statement = keyset_page(select(*USER_RESPONSE_COLUMNS).where(Users.username.ilike(string)), USERS_SORT_COLUMNS, cursor, USERS_CURSOR_TYPES, limit)
+                user_objects, next_cursor = split_page(session.execute(statement).all(), limit, users_sort_key)
+                users = [user_to_response(user) for user in user_objects]
             except SQLAlchemyError as e:
-                logger.error(f"SQLAlchemy Error: {e}")
+                logger.error(f"SQLAlchemyError: {e}")
+            
+        return users, next_cursor
 
-    def get_usernames_starting_with(self, string: str):
-        users = []
+    def _get_usernames_from_index(self, prefix: str, limit: int, cursor: str | None):
+        after = decode_cursor(cursor, *USERS_CURSOR_TYPES) if cursor else None
         with Session(self.engine) as session:
             try:
-                statement = select(Users).where(Users.username.ilike(string))
-                user_objects = session.scalars(statement).all()
-                for user in user_objects:
-                    user_creation_response = UserCreationResponse(
-                        id=user.id,
-                        username=user.username,
-                        name=user.name,
-                        email=user.email,
-                        created_at=user.createdat.isoformat(),
-                        profilePic=user.profilePic
-                    )
-                    users.append(user_creation_response)
+                if self.username_index.needs_refresh():
+                    self.username_index.refresh(session.execute(username_index_statement(self.username_index.watermark())).all())
+                while True:
+                    internal_ids = self.username_index.lookup(prefix, limit + 1, after)
+                    if internal_ids is None:
+                        return None
+                    users = {user.internal_id: user for user in session.execute(select(*USER_RESPONSE_COLUMNS).where(Users.internal_id.in_(internal_ids)))}
+                    deleted = set(internal_ids) - users.keys()
+                    if not deleted:
+                        break
+                    # deleted outside this process, drop them and look up again
+                    self.username_index.discard(deleted)
+                user_objects, next_cursor = split_page([users[internal_id] for internal_id in internal_ids], limit, users_sort_key)
+                return [user_to_response(user) for user in user_objects], next_cursor
             except SQLAlchemyError as e:
                 logger.error(f"SQLAlchemyError: {e}")
-            
-        return users
+                return [], None
 
-    def search_users(self, username: str):
-        users_info = []
+    def load_username_index(self):
+        """
+        Streams (username, createdat, internal_id) of every user into the prefix
+        index, until then GET /users?filter= is served by the database.
+        """
+        if not USERNAME_INDEX_ENABLED:
+            return
         with Session(self.engine) as session:
             try:
-                statement = select(Users).where(
-                    or_(
-                        Users.username.ilike(f"%{username}%"),
-                        Users.name.ilike(f"%{username}%")
-                    )
-                )
-                users = session.scalars(statement).all()
-                for user in users:
-                    user_info = UserCreationResponse(
-                        id=user.id,
-                        username=user.username,
-                        name=user.name,
-                        email=user.email,
-                        created_at=user.createdat.isoformat(),
-                        profilePic=user.profilePic
-                    )
-                    users_info.append(user_info)
+                rows = session.execute(username_index_statement().execution_options(yield_per=USERNAME_INDEX_BATCH_SIZE))
+                self.username_index.load(tuple(row) for row in rows)
+                logger.info(f"Username index loaded with {len(self.username_index)} users")
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+
+    def search_users(self, username: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        with Session(self.engine) as session:
+            try:
+                if self.trigram is None:
+                    self.trigram = has_trigram(session.connection())
+                statement = search_users_page(username, limit, cursor, fuzzy=self.trigram)
+                rows, next_cursor = split_page(session.execute(statement).all(), limit, search_sort_key)
                 logger.info("Users retrieved successfully in database")
-                return users_info
+                return [user_to_response(row) for row in rows], next_cursor
             except SQLAlchemyError as e:
                 logger.error(f"SQLAlchemyError: {e}")
 
@@ -263,10 +688,13 @@ class Database:
         with Session(self.engine) as session:
             try:
                 session.execute(self.followers_table.delete())
+                session.execute(self.user_interests_table.delete())
                 session.execute(self.userinfo_table.delete())
                 session.execute(self.users_table.delete())
                 session.execute(self.followers_table.delete())
+                session.execute(self.outbox_table.delete())
                 session.commit()
+                self.username_index.clear()
                 logger.info("Tables cleared successfully.")
             except Exception as e:
                 logger.error(f"Error clearing tables: {e}")
@@ -276,17 +704,17 @@ class Database:
 
     def drop_table(self):
         """
-        Drop the table from the database.
+        Drop the tables from the database, in one transaction. Errors are raised.
         """
-        try:
-            with self.engine.connect() as connection:
-                self.followers_table.drop(connection)
-                self.userinfo_table.drop(connection)
-                self.users_table.drop(connection)
-                self.followers_table.drop(connection)
-                logger.info("Tables dropped successfully.")
-        except Exception as e:
-            logger.error(f"Error dropping table: {e}")
+        # cleared first, a failed drop leaves a cold index (the database serves) rather than a stale one
+        self.username_index.clear()
+        with self.engine.begin() as connection:
+            self.outbox_table.drop(connection)
+            self.followers_table.drop(connection)
+            self.user_interests_table.drop(connection)
+            self.userinfo_table.drop(connection)
+            self.users_table.drop(connection)
+        logger.info("Tables dropped successfully.")
 
     def follow_user(self, follower_user_id: str, followed_user_id: str):
         with Session(self.engine) as session:
@@ -297,80 +725,169 @@ class Database:
                 # Create instance of Followers
                 follower_model_instance = Followers(follower_id=follower_user_id, followed_id=followed_user_id, followed_at=timestamp)
                 session.add(follower_model_instance)
+                session.flush()
+                session.execute(follow_counters_statement(UUID(follower_user_id), UUID(followed_user_id), 1))
+                follow = FollowResponse(follower_id=follower_user_id, followed_id=followed_user_id, followed_at=timestamp)
+                self.add_events(session, "user.followed", follow.model_dump(mode="json"))
                 session.commit()
                 logger.info(f"User {follower_user_id} is now following user {followed_user_id}")
-                return FollowResponse(follower_id=follower_user_id, followed_id=followed_user_id, followed_at=timestamp)
-            except SQLAlchemyError as e:
+                return follow
+            except (SQLAlchemyError, ValueError) as e:
                 logger.error(f"SQLAlchemyError: {e}")
 
     def unfollow_user(self, follower_user_id: str, followed_user_id: str):
         with Session(self.engine) as session:
             try:
-                # Delete the follow relationship
-                follow_record = session.scalars(
-                    select(Followers).where(
-                        Followers.follower_id == follower_user_id,
-                        Followers.followed_id == followed_user_id
-                    )
-                ).one()
-                session.delete(follow_record)
+                # Delete the follow relationship, counters only change if it existed
+                follower_id, followed_id = UUID(follower_user_id), UUID(followed_user_id)
+                result = session.execute(delete(Followers).where(Followers.follower_id == follower_id, Followers.followed_id == followed_id))
+                if result.rowcount == 0:
+                    logger.error("Follow relationship not found")
+                    return None
+                session.execute(follow_counters_statement(follower_id, followed_id, -1))
+                self.add_events(session, "user.unfollowed", follow_event_data(follower_id, followed_id))
                 session.commit()
                 logger.info(f"User {follower_user_id} start to unfollowing user {followed_user_id}")
                 # Capaz conviene crear un modelo de respuesta a parte para esto
                 return FollowResponse(follower_id=follower_user_id, followed_id=followed_user_id, followed_at="")
-            except SQLAlchemyError as e:
+            except (SQLAlchemyError, ValueError) as e:
                 logger.error(f"SQLAlchemyError: {e}")
     
-    def get_followers(self, user_id:str):
-        followers = []
+    def bulk_follow(self, edges: list[FollowEdge]) -> list[BulkFollowResult]:
+        local_timezone = timezone(timedelta(hours=-3))
+        followed_at = datetime.now(local_timezone).replace(tzinfo=None)
         with Session(self.engine) as session:
             try:
-                if user_id is None:
-                    logger.error("User not found")
-                    return None
-                statement = select(Followers).where(Followers.followed_id == user_id)
-                followers_records = session.scalars(statement).all()
-                for follower in followers_records:
-                    user_follower = session.scalars(select(Users).where(Users.id == follower.follower_id)).one()
-                    follower_info = UserCreationResponse(
-                        id = user_follower.id,
-                        username = user_follower.username,
-                        name = user_follower.name,
-                        email = user_follower.email,
-                        created_at=user_follower.createdat.isoformat(),
-                        profilePic=user_follower.profilePic
-                    )
-                    followers.append(follower_info)
-                logger.info("Followers info retrieved successfully")
-                return followers
+                rows = session.execute(bulk_follow_statement(BULK_FOLLOW, edges, 1, followed_at=followed_at)).all()
+                self.add_events(session, "user.followed", *(follow_event_data(row.follower_id, row.followed_id) for row in rows if row.changed))
+                session.commit()
+                logger.info(f"{sum(row.changed for row in rows)} of {len(edges)} follows inserted")
+                return bulk_follow_results(edges, rows, "followed", "already_following", "user_not_found")
             except SQLAlchemyError as e:
-                logger.error(f"SQLAlchemy Error: {e}")
+                logger.error(f"SQLAlchemyError: {e}")
+                session.rollback()
+                raise e
 
-    def get_following(self, user_id:str):
-        followings = []
+    def bulk_unfollow(self, edges: list[FollowEdge]) -> list[BulkFollowResult]:
         with Session(self.engine) as session:
             try:
-                if user_id is None:
-                    logger.error("User not found")
-                    return None
-                statement = select(Followers).where(Followers.follower_id == user_id)
-                followings_records = session.scalars(statement).all()
-                for following in followings_records:
-                    user_following = session.scalars(select(Users).where(Users.id == following.followed_id)).one()
-                    following_info = UserCreationResponse(
-                        id = user_following.id,
-                        username = user_following.username,
-                        name = user_following.name,
-                        email = user_following.email,
-                        created_at=user_following.createdat.isoformat(),
-                        profilePic=user_following.profilePic
-                    )
-                    followings.append(following_info)
+                rows = session.execute(bulk_follow_statement(BULK_UNFOLLOW, edges, -1)).all()
+                self.add_events(session, "user.unfollowed", *(follow_event_data(row.follower_id, row.followed_id) for row in rows))
+                session.commit()
+                logger.info(f"{len(rows)} of {len(edges)} follows deleted")
+                return bulk_follow_results(edges, rows, "unfollowed", "not_following", "not_following")
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+                session.rollback()
+                raise e
+
+    def import_users(self, rows: list[tuple[int, UserImportRow]]) -> set[int]:
+        """
+        Inserts a batch of (line, user) rows in one statement, returns the lines
+        inserted. The others clashed with an existing (or earlier in the batch)
+        username, email or id.
+        """
+        local_timezone = timezone(timedelta(hours=-3))
+        createdat = datetime.now(local_timezone).replace(tzinfo=None)
+        with Session(self.engine) as session:
+            try:
+                inserted = set(session.scalars(import_users_statement(rows, createdat)).all())
+                session.commit()
+                logger.info(f"{len(inserted)} of {len(rows)} users imported")
+                return inserted
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+                session.rollback()
+                raise e
+
+    def export_users(self, since: datetime | None = None, until: datetime | None = None):
+        """
+        NDJSON chunks of every user (with its userinfo columns) created in
+        [since, until), streamed from a server-side cursor EXPORT_BATCH_SIZE rows at a time.
+        """
+        return self._export(export_users_statement(since, until), "users")
+
+    def export_followers(self, since: datetime | None = None, until: datetime | None = None):
+        """
+        NDJSON chunks of the follow edges made in [since, until).
+        """
+        return self._export(export_followers_statement(since, until), "follows")
+
+    def _export(self, statement, name: str):
+        with Session(self.engine) as session:
+            try:
+                exported = 0
+                for rows in session.execute(statement.execution_options(yield_per=EXPORT_BATCH_SIZE)).partitions():
+                    exported += len(rows)
+                    yield export_lines(rows)
+                logger.info(f"{exported} {name} exported")
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+                raise e
+
+    def reconcile_follow_counters(self, batch_size: int = 10000) -> int:
+        """
+        Repairs drifted follower / following counters from the followers table,
+        returns how many users had wrong counters.
+        """
+        with self.engine.connect() as connection:
+            repaired = reconcile_follow_counters(connection, batch_size, commit=True)
+        logger.info(f"Follow counters reconciled, {repaired} users repaired")
+        return repaired
+
+    def add_events(self, session, type: str, *data: dict):
+        # in the caller's transaction, committed (or rolled back) with the change
+        if self.outbox and data:
+            session.execute(insert(OutboxEvents), outbox_rows(type, *data))
+
+    def claim_outbox_events(self, batch_size: int, lease: float) -> list[dict]:
+        """
+        Claims up to batch_size pending outbox events for lease seconds, returns
+        them oldest first as published envelopes. Errors are raised, the
+        dispatcher retries.
+        """
+        with self.engine.begin() as connection:
+            rows = connection.execute(CLAIM_OUTBOX_EVENTS, {"batch_size": batch_size, "lease": lease}).all()
+        return [outbox_event(row) for row in sorted(rows, key=lambda row: row.id)]
+
+    def complete_outbox_events(self, event_ids: list[str]):
+        with self.engine.begin() as connection:
+            connection.execute(COMPLETE_OUTBOX_EVENTS, {"event_ids": [UUID(event_id) for event_id in event_ids]})
+
+    def release_outbox_events(self, event_ids: list[str], delay: float):
+        with self.engine.begin() as connection:
+            connection.execute(RELEASE_OUTBOX_EVENTS, {"event_ids": [UUID(event_id) for event_id in event_ids], "delay": delay})
+
+    def purge_outbox_events(self, retention: float, batch_size: int = 10000) -> int:
+        with self.engine.begin() as connection:
+            return connection.execute(PURGE_OUTBOX_EVENTS, {"retention": retention, "batch_size": batch_size}).rowcount
+
+    def count_pending_outbox_events(self) -> int:
+        with self.engine.connect() as connection:
+            return connection.execute(COUNT_PENDING_OUTBOX_EVENTS).scalar()
+
+    def _get_follow_edges(self, user_id: str, edge_column, user_column, limit: int, cursor: str | None):
+        with Session(self.engine) as session:
+            try:
+                statement = follow_edges_page(user_id, edge_column, user_column, limit, cursor)
+                rows, next_cursor = split_page(session.execute(statement).all(), limit, follow_edges_sort_key)
                 logger.info("Followers info retrieved successfully")
-                return followings
+                return [user_to_response(row) for row in rows], next_cursor
             except SQLAlchemyError as e:
                 logger.error(f"SQLAlchemy Error: {e}")
 
+    def get_followers(self, user_id: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        if user_id is None:
+            logger.error("User not found")
+            return None
+        return self._get_follow_edges(user_id, Followers.followed_id, Followers.follower_id, limit, cursor)
+
+    def get_following(self, user_id: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        if user_id is None:
+            logger.error("User not found")
+            return None
+        return self._get_follow_edges(user_id, Followers.follower_id, Followers.followed_id, limit, cursor)
+
     def update_user_profile(self, user_id: str, data: UserEditProfile):
         with Session(self.engine) as session:
             try:
@@ -385,8 +902,13 @@ class Database:
                     user.userinfo.birthdate = data.birthdate
                 if data.interests:
                     user.userinfo.interests = data.interests
+                    session.execute(delete(UserInterests).where(UserInterests.user_id == user.id))
+                    interests = normalize_interests(data.interests)
+                    if interests:
+                        session.execute(insert(UserInterests), [{"user_id": user.id, "interest": interest} for interest in interests])
                 if data.profilePic:
                     user.profilePic = data.profilePic
+                self.add_events(session, "user.profile_updated", profile_event_data(user.id, data))
                 
                 session.commit()
                 logger.info("User updated successfully")
@@ -396,85 +918,42 @@ class Database:
                 session.rollback()
                 raise e
             
-    def get_near_users(self, user_id: str, radius_km: float = 10.0):
-        my_user = self.get_user_by_id(user_id)
-        latitude, longitude = my_user.locationLat, my_user.locationLong
-        user_location = (latitude, longitude)  # Coordenadas del usuario
-        near_users = []
-
+    def get_near_users(self, user_id: str, radius_km: float = DEFAULT_NEAR_RADIUS_KM):
         with Session(self.engine) as session:
             try:
-                # Recuperar todos los usuarios excepto el propio
-                statement = select(Users).join(UserInfo).where(Users.id != user_id)
-                user_objects = session.scalars(statement).all()
-
-                # Filtrar usuarios cercanos usando geopy
-                for user in user_objects:
-                    user_info = session.get(UserInfo, user.id)
-                    if user_info:
-                        other_user_location = (user_info.locationLat, user_info.locationLong)
-                        distance_km = geodesic(user_location, other_user_location).kilometers
-
-                        if distance_km <= radius_km:
-                            near_users.append(
-                                UserCreationResponse(
-                                    id=user.id,
-                                    username=user.username,
-                                    name=user.name,
-                                    email=user.email,
-                                    created_at=user.createdat.isoformat(),
-                                    profilePic=user.profilePic
-                                )
-                            )
-
-                logger.info("Near users retrieved successfully")
-                return near_users
+                origin = session.execute(select(UserInfo.locationLat, UserInfo.locationLong).where(UserInfo.user_id == UUID(user_id))).one_or_none()
+                if origin is None or None in origin:
+                    logger.error("User not found or without location")
+                    return []
+
+                # Only the users inside the bounding box (index scan) get an exact distance
+                candidates = session.execute(near_candidates_statement(user_id, origin.locationLat, origin.locationLong, radius_km)).all()
+                near_users = rank_by_distance(tuple(origin), candidates, radius_km, lambda row: (row.locationLat, row.locationLong))
+                logger.info(f"{len(near_users)} near users retrieved successfully out of {len(candidates)} candidates")
+                return [user_to_near_response(row, distance_km) for row, distance_km in near_users]
 
             except SQLAlchemyError as e:
                 logger.error(f"SQLAlchemyError: {e}")
                 return []
-            except Exception as e:
-                logger.error(f"Error: {e}")
-                return []
             
-    def get_users_with_common_interests(self, user_id: str):
+    def get_users_with_common_interests(self, user_id: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
         with Session(self.engine) as session:
             try:
-                user = session.scalars(select(Users).join(UserInfo).where(Users.id == user_id)).one()
-                if not user:
-                    logger.error("User not found")
-                    return []
-
-                user_interests = user.userinfo.interests.split(',') if user.userinfo.interests else []
-
-                if user_interests == []:
-                    logger.error("User has no interests")
-                    return []
-                
-                common_interest_users = []
-                statement = select(Users).join(UserInfo).where(
-                    and_(
-                        Users.id != user_id,  
-                        or_(
-                            UserInfo.interests.ilike(f'%,{interest},%') for interest in user_interests
-                        )
-                    )
-                )
-                user_objects = session.scalars(statement).all()
-
-                for user in user_objects:
-                    user_info = UserCreationResponse(
-                        id=user.id,
-                        username=user.username,
-                        name=user.name,
-                        email=user.email,
-                        created_at=user.createdat.isoformat(),
-                        profilePic=user.profilePic
-                    )
-                    common_interest_users.append(user_info)
-
+                statement = common_interests_page(UUID(user_id), limit, cursor)
+                rows, next_cursor = split_page(session.execute(statement).all(), limit, common_interests_sort_key)
                 logger.info("Users with common interests retrieved successfully")
-                return common_interest_users
+                return [user_to_common_interests_response(row, row.shared_interests) for row in rows], next_cursor
+            except SQLAlchemyError as e:
+                logger.error(f"SQLAlchemyError: {e}")
+                return [], None
+
+    def get_follow_suggestions(self, user_id: str, limit: int = DEFAULT_PAGE_SIZE, cursor: str | None = None):
+        with Session(self.engine) as session:
+            try:
+                statement = suggestions_page(UUID(user_id), limit, cursor)
+                rows, next_cursor = split_page(session.execute(statement).all(), limit, suggestions_sort_key)
+                logger.info(f"{len(rows)} follow suggestions retrieved successfully")
+                return [user_to_suggestion_response(row) for row in rows], next_cursor
             except SQLAlchemyError as e:
                 logger.error(f"SQLAlchemyError: {e}")
-                return []
\ No newline at end of file
+                return [], None
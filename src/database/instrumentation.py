@@ -0,0 +1,132 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from greenlet import getcurrent
+from loguru import logger
+from sqlalchemy import event
+import os
+import sys
+import time
+
+# statements slower than this are logged with their parameters, 0 disables the log
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+# the same statement run this many times in one request is logged as a probable N+1
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+# longest parameters repr written to the slow query log
+MAX_LOGGED_PARAMETERS = 1000
+
+DATABASE_MODULES = ("database.db", "database.async_db")
+
+class QueryStats:
+    """
+    SQL statements executed and time spent in them, for one request (or any
+    block wrapped in track_queries / assert_max_queries).
+
+    Attributes:
+        statements: int
+        seconds: float
+        executions: dict (statement -> times executed)
+        n_plus_one: list[str] (statements repeated N_PLUS_ONE_THRESHOLD times)
+    """
+    __slots__ = ("statements", "seconds", "executions", "n_plus_one")
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+        self.executions = {}
+        self.n_plus_one = []
+
+    def record(self, statement: str, seconds: float) -> int:
+        # times statement was executed, compiled statements are cached so the string hash is too
+        self.statements += 1
+        self.seconds += seconds
+        executions = self.executions.get(statement, 0) + 1
+        self.executions[statement] = executions
+        return executions
+
+# stats of the request being served, copied into the threadpool (sync Database)
+# and the greenlets of AsyncSession along with the rest of the context
+current_queries: ContextVar[QueryStats | None] = ContextVar("current_queries", default=None)
+# assert_max_queries blocks, they see statements of every thread (e.g. a TestClient call)
+_process_trackers = []
+
+@contextmanager
+def track_queries():
+    """
+    Counts the statements of every instrumented engine run inside the block.
+    """
+    stats = QueryStats()
+    token = current_queries.set(stats)
+    try:
+        yield stats
+    finally:
+        current_queries.reset(token)
+
+@contextmanager
+def assert_max_queries(n: int):
+    """
+    Test helper, fails when more than n statements run on the instrumented
+    engines of this process while the block runs, listing them:
+
+        with assert_max_queries(1):
+            client.get(f"/users/followers/{user_id}/")
+    """
+    stats = QueryStats()
+    _process_trackers.append(stats)
+    try:
+        yield stats
+    finally:
+        _process_trackers.remove(stats)
+    if stats.statements > n:
+        executed = "\n".join(f"  {times}x {statement}" for statement, times in stats.executions.items())
+        raise AssertionError(f"{stats.statements} statements executed, at most {n} expected:\n{executed}")
+
+def calling_method() -> str:
+    """
+    Database / AsyncDatabase method running the current statement, e.g.
+    "Database.get_followers". Only called for slow and repeated statements.
+    """
+    frame = sys._getframe(1)
+    # AsyncSession runs the statement in a child greenlet, the method awaits in its parent
+    parent = getcurrent().parent
+    for frame in (frame, parent.gr_frame if parent is not None else None):
+        while frame is not None:
+            if frame.f_globals.get("__name__") in DATABASE_MODULES:
+                # not co_qualname, it is 3.11+ and the images run 3.10
+                owner = type(frame.f_locals.get("self")).__name__
+                if owner.endswith("Database"):
+                    return f"{owner}.{frame.f_code.co_name}"
+            frame = frame.f_back
+    return "unknown"
+
+def _parameters(parameters) -> str:
+    text = repr(parameters)
+    return text if len(text) <= MAX_LOGGED_PARAMETERS else text[:MAX_LOGGED_PARAMETERS] + "..."
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_start = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - context._query_start
+    stats = current_queries.get()
+    repeated = stats is not None and stats.record(statement, seconds) == N_PLUS_ONE_THRESHOLD
+    for tracker in _process_trackers:
+        tracker.record(statement, seconds)
+    # an exception raised here would fail the statement, instrumentation only logs
+    try:
+        if repeated:
+            stats.n_plus_one.append(statement)
+            logger.warning(f"Probable N+1: statement executed {N_PLUS_ONE_THRESHOLD} times in one request by {calling_method()}: {statement}")
+        if SLOW_QUERY_MS and seconds * 1000 >= SLOW_QUERY_MS:
+            logger.warning(f"Slow query ({seconds * 1000:.1f} ms) in {calling_method()}: {statement} parameters: {_parameters(parameters)}")
+    except Exception as e:
+        logger.error(f"Query instrumentation failed: {e}")
+
+def instrument_engine(engine):
+    """
+    Hooks the statement counters, slow query log and N+1 detection on engine
+    (an Engine or an AsyncEngine), once.
+    """
+    engine = getattr(engine, "sync_engine", engine)
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
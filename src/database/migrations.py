@@ -0,0 +1,126 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.exc import SQLAlchemyError
+from loguru import logger
+from business_logic.users.users_model import Base
+from uuid import UUID
+
+# Columns whose type changed after the table was first created: (table, column, new type, USING expression)
+COLUMN_TYPE_CHANGES = [
+    ("userinfo", "locationLat", "double precision", 'NULLIF("locationLat", \'\')::double precision'),
+    ("userinfo", "locationLong", "double precision", 'NULLIF("locationLong", \'\')::double precision'),
+]
+
+# Columns added after the table was first created: (table, column, definition)
+COLUMN_ADDITIONS = [
+    ("users", "followers_count", "integer NOT NULL DEFAULT 0"),
+    ("users", "following_count", "integer NOT NULL DEFAULT 0"),
+]
+
+# Recomputes the follow counters of the next batch of users (by internal_id),
+# returns the last internal_id of the batch (NULL when done) and the rows repaired
+RECONCILE_FOLLOW_COUNTERS = """
+WITH batch AS (
+    SELECT internal_id, id FROM users WHERE internal_id > :after ORDER BY internal_id LIMIT :batch_size
+), counts AS (
+    SELECT batch.internal_id,
+           (SELECT count(*) FROM followers WHERE followers.followed_id = batch.id) AS followers_count,
+           (SELECT count(*) FROM followers WHERE followers.follower_id = batch.id) AS following_count
+    FROM batch
+), repaired AS (
+    UPDATE users SET followers_count = counts.followers_count, following_count = counts.following_count
+    FROM counts
+    WHERE users.internal_id = counts.internal_id
+      AND (users.followers_count, users.following_count) IS DISTINCT FROM (counts.followers_count, counts.following_count)
+    RETURNING 1
+)
+SELECT (SELECT internal_id FROM batch ORDER BY internal_id DESC LIMIT 1) AS last_id, (SELECT count(*) FROM repaired) AS repaired
+"""
+
+BACKFILL_USER_INTERESTS = """
+INSERT INTO user_interests (user_id, interest)
+SELECT DISTINCT userinfo.user_id, lower(trim(interest))
+FROM userinfo, unnest(string_to_array(userinfo.interests, ',')) AS interest
+WHERE trim(interest) <> '' AND NOT EXISTS (SELECT 1 FROM user_interests)
+ON CONFLICT DO NOTHING
+"""
+
+# GIN trigram indexes behind /users/search/, they need the pg_trgm extension
+TRIGRAM_INDEXES = [
+    ("ix_users_username_trgm", "users", "username"),
+    ("ix_users_name_trgm", "users", "name"),
+]
+
+def reconcile_follow_counters(connection, batch_size: int = 10000, commit: bool = False) -> int:
+    """
+    Recomputes followers_count / following_count from the followers table in
+    batches of batch_size users, returns the number of users whose counters
+    were wrong. With commit each batch is committed on its own (short locks).
+
+    A follow committed while its batch is being counted can be overwritten by
+    the older count, running it again converges.
+    """
+    after, repaired = UUID(int=0), 0
+    while True:
+        row = connection.execute(text(RECONCILE_FOLLOW_COUNTERS), {"after": after, "batch_size": batch_size}).one()
+        if commit:
+            connection.commit()
+        if row.last_id is None:
+            return repaired
+        after, repaired = row.last_id, repaired + row.repaired
+
+def has_trigram(connection) -> bool:
+    return connection.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+
+def create_trigram_indexes(connection):
+    try:
+        with connection.begin_nested():
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except SQLAlchemyError as e:
+        logger.warning(f"pg_trgm is not available, user search runs without trigram indexes nor fuzzy matches: {e}")
+        return
+    for name, table, column in TRIGRAM_INDEXES:
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)"))
+
+def upgrade_schema(connection):
+    """
+    Brings tables created by an older version up to date. create_all only
+    creates missing tables, so changes to existing ones are applied here.
+    Every step is idempotent, it runs on a sync Connection (use run_sync on async ones).
+    """
+    inspector = inspect(connection)
+    added = []
+    for table, column, definition in COLUMN_ADDITIONS:
+        if inspector.has_table(table) and column not in {c["name"] for c in inspector.get_columns(table)}:
+            connection.execute(text(f'ALTER TABLE {table} ADD COLUMN "{column}" {definition}'))
+            added.append(column)
+            logger.info(f"Column {table}.{column} added")
+
+    for table, column, new_type, using in COLUMN_TYPE_CHANGES:
+        if not inspector.has_table(table):
+            continue
+        columns = {c["name"]: c for c in inspector.get_columns(table)}
+        if column in columns and columns[column]["type"].compile(dialect=connection.dialect).lower() != new_type:
+            connection.execute(text(f'ALTER TABLE {table} ALTER COLUMN "{column}" TYPE {new_type} USING {using}'))
+            logger.info(f"Column {table}.{column} changed to {new_type}")
+
+    # indexes added to existing tables
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+
+    create_trigram_indexes(connection)
+
+    if "followers_count" in added or "following_count" in added:
+        logger.info(f"Follow counters backfilled for {reconcile_follow_counters(connection)} users")
+
+    # user_interests is derived from userinfo.interests, fill it once when it is new
+    connection.execute(text(BACKFILL_USER_INTERESTS))
+
+def migrate(connection):
+    """
+    Creates the missing tables and brings the existing ones up to date. This is
+    the explicit migrate step (python -m jobs.migrate) run once per deploy before
+    the service starts, the service itself runs no DDL. Sync Connection only.
+    """
+    Base.metadata.create_all(bind=connection)
+    upgrade_schema(connection)
@@ -0,0 +1,62 @@
+from sqlalchemy import text, bindparam
+from sqlalchemy.dialects.postgresql import ARRAY, UUID as PG_UUID
+from uuid import uuid4
+
+# Claims the next batch_size pending events for lease seconds. SKIP LOCKED lets
+# the dispatchers of every worker and replica claim disjoint batches, the lease
+# hands the rows of a dispatcher that died (or failed to publish) to another one
+CLAIM_OUTBOX_EVENTS = text("""
+WITH claimable AS (
+    SELECT id FROM outbox_events
+    WHERE delivered_at IS NULL AND (claimed_until IS NULL OR claimed_until < now())
+    ORDER BY id
+    LIMIT :batch_size
+    FOR UPDATE SKIP LOCKED
+)
+UPDATE outbox_events SET claimed_until = now() + make_interval(secs => :lease), attempts = attempts + 1
+FROM claimable
+WHERE outbox_events.id = claimable.id
+RETURNING outbox_events.id, outbox_events.event_id, outbox_events.type, outbox_events.payload, outbox_events.created_at
+""")
+
+COMPLETE_OUTBOX_EVENTS = text("""
+UPDATE outbox_events SET delivered_at = now(), claimed_until = NULL WHERE event_id = ANY(:event_ids)
+""").bindparams(bindparam("event_ids", type_=ARRAY(PG_UUID(as_uuid=True))))
+
+# a failed batch is claimable again after delay seconds (by any dispatcher)
+RELEASE_OUTBOX_EVENTS = text("""
+UPDATE outbox_events SET claimed_until = now() + make_interval(secs => :delay) WHERE event_id = ANY(:event_ids)
+""").bindparams(bindparam("event_ids", type_=ARRAY(PG_UUID(as_uuid=True))))
+
+# events not delivered yet (claimed ones included), from the ix_outbox_events_pending index
+COUNT_PENDING_OUTBOX_EVENTS = text("SELECT count(*) FROM outbox_events WHERE delivered_at IS NULL")
+
+# delivered events older than retention seconds, at most batch_size per call
+PURGE_OUTBOX_EVENTS = text("""
+DELETE FROM outbox_events WHERE id IN (
+    SELECT id FROM outbox_events
+    WHERE delivered_at IS NOT NULL AND delivered_at < now() - make_interval(secs => :retention)
+    LIMIT :batch_size
+)
+""")
+
+def outbox_rows(type: str, *data: dict) -> list[dict]:
+    """
+    outbox_events rows of events of type, one per data (JSON types only), to
+    insert in the transaction of the change: session.execute(insert(OutboxEvents), rows).
+    """
+    return [{"event_id": uuid4(), "type": type, "payload": item} for item in data]
+
+def outbox_event(row) -> dict:
+    """
+    Published envelope of a claimed row: consumers deduplicate by id, delivery is at least once.
+    """
+    return {"id": str(row.event_id), "type": row.type, "occurred_at": row.created_at.isoformat(), "data": row.payload}
+
+def follow_event_data(follower_id, followed_id) -> dict:
+    return {"follower_id": str(follower_id), "followed_id": str(followed_id)}
+
+
+def profile_event_data(user_id, data) -> dict:
+    # only the fields the edit set (UserEditProfile), as update_user_profile applies them
+    return {"user_id": str(user_id), "changes": {field: value for field, value in data.model_dump().items() if value}}
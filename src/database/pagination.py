@@ -0,0 +1,70 @@
+import base64
+import json
+import os
+from datetime import datetime
+from uuid import UUID
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+MAX_PAGE_SIZE = int(os.getenv("MAX_PAGE_SIZE", "1000"))
+
+# users pages are sorted by (createdat, internal_id)
+USERS_CURSOR_TYPES = (datetime.fromisoformat, UUID)
+# followers / following pages are sorted by (followed_at, user id)
+FOLLOWS_CURSOR_TYPES = (datetime.fromisoformat, UUID)
+# common interests pages are sorted by (-shared interests, createdat, internal_id)
+COMMON_INTERESTS_CURSOR_TYPES = (int, datetime.fromisoformat, UUID)
+# search pages are sorted by (relevance rank, createdat, internal_id)
+SEARCH_CURSOR_TYPES = (int, datetime.fromisoformat, UUID)
+# follow suggestions pages are sorted by (-mutual connections, createdat, internal_id)
+SUGGESTIONS_CURSOR_TYPES = (int, datetime.fromisoformat, UUID)
+
+def _to_json(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def encode_cursor(*values) -> str:
+    """
+    Opaque cursor with the sort key of the last row of a page.
+    """
+    payload = json.dumps([_to_json(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, *types) -> tuple:
+    """
+    Inverse of encode_cursor, each value is parsed with the matching type
+    (e.g. datetime.fromisoformat, UUID). Raises ValueError on any malformed cursor.
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(payload)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError(f"Invalid cursor: {cursor}")
+        # values of the wrong JSON type (e.g. a number for a datetime) fail with TypeError / AttributeError
+        return tuple(parse(value) for parse, value in zip(types, values))
+    except (ValueError, TypeError, AttributeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def keyset_page(statement, sort_columns: tuple, cursor: str | None, types: tuple, limit: int, aggregate: bool = False):
+    """
+    Restricts statement to the rows after cursor in sort_columns order.
+
+    One extra row is fetched so split_page knows whether there is a next page
+    without a COUNT. With aggregate the condition goes in HAVING, for sort
+    columns computed by GROUP BY.
+    """
+    if cursor:
+        condition = tuple_(*sort_columns) > tuple_(*decode_cursor(cursor, *types))
+        statement = statement.having(condition) if aggregate else statement.where(condition)
+    return statement.order_by(*sort_columns).limit(limit + 1)
+
+def split_page(rows: list, limit: int, sort_key) -> tuple[list, str | None]:
+    """
+    Returns the first limit rows and the cursor of the next page (None on the last one).
+    sort_key maps a row to the values of the sort columns.
+    """
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*sort_key(rows[-1]))
@@ -0,0 +1,37 @@
+"""
+Production server: gunicorn managing WEB_CONCURRENCY uvicorn worker processes.
+
+    gunicorn main:app    (from src/, this file is read from the working directory)
+
+The app is imported once in the master (PRELOAD_APP) and the workers are
+forked from it. Importing the app opens no connection: every worker creates
+its own engine, pool, caches and username index in the app lifespan. A worker
+is replaced gracefully after MAX_REQUESTS requests (plus up to
+MAX_REQUESTS_JITTER, so they do not all restart at once).
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:9212")
+worker_class = "uvicorn_worker.UvicornWorker"
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+preload_app = os.getenv("PRELOAD_APP", "true").lower() == "true"
+# 0 disables the recycling
+max_requests = int(os.getenv("MAX_REQUESTS", "10000"))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", str(max_requests // 10)))
+# seconds a worker has to finish its requests when recycled or on shutdown
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+keepalive = int(os.getenv("KEEPALIVE", "5"))
+accesslog = None
+
+def post_fork(server, worker):
+    # nothing should have created the service in the master, if something did the
+    # worker drops the inherited pool (without closing the master's sockets)
+    from routers.routers import services
+    if services.created:
+        server.log.warning("The service was created before fork, the worker builds its own")
+    services.after_fork()
+
+def when_ready(server):
+    server.log.info(f"{workers} workers, preload_app={preload_app}, max_requests={max_requests}")
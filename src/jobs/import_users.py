@@ -0,0 +1,95 @@
+"""
+Bulk import of users from an NDJSON or CSV file (one UserImportRow per line,
+CSV with a header row named after its fields).
+
+    PYTHONPATH=src python -m jobs.import_users users.ndjson [--format ndjson|csv] [--batch-size 5000] [--rejections rejected.ndjson]
+
+The file is streamed and inserted in batches, one statement per batch. Rows
+that are invalid or clash with an existing username, email or id are
+reported (line and reason, as NDJSON) instead of aborting the import.
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+from itertools import islice
+from loguru import logger
+from pydantic import ValidationError
+from business_logic.users.users_schemas import UserImportRow
+from database.db import Database
+from utils.engine import get_engine
+
+def read_rows(file, format: str):
+    """
+    Yields (line, dict) for every record of file, line is 1-based (the CSV header is line 1).
+    """
+    if format == "csv":
+        for line, record in enumerate(csv.DictReader(file), start=2):
+            # empty CSV cells are missing values
+            yield line, {key: value for key, value in record.items() if value != ""}
+        return
+    for line, text in enumerate(file, start=1):
+        if text.strip():
+            try:
+                yield line, json.loads(text)
+            except json.JSONDecodeError as e:
+                yield line, e
+
+def import_users(database: Database, records, batch_size: int = 5000, on_rejected=lambda line, reason: None) -> dict:
+    """
+    Validates and inserts (line, dict) records, returns the imported / rejected
+    counts and the rows per second. on_rejected(line, reason) gets every rejected row.
+    """
+    imported = rejected = 0
+    start = time.perf_counter()
+    records = iter(records)
+    while batch := list(islice(records, batch_size)):
+        rows = []
+        for line, record in batch:
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                rows.append((line, UserImportRow.model_validate(record)))
+            except (ValidationError, ValueError) as e:
+                rejected += 1
+                on_rejected(line, f"invalid: {e}")
+        inserted = database.import_users(rows) if rows else set()
+        for line, _ in rows:
+            if line not in inserted:
+                on_rejected(line, "duplicate username, email or id")
+        imported += len(inserted)
+        rejected += len(rows) - len(inserted)
+    elapsed = time.perf_counter() - start
+    return {
+        "imported": imported,
+        "rejected": rejected,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": round((imported + rejected) / elapsed) if elapsed else 0,
+    }
+
+def main(path: str, format: str, batch_size: int, rejections) -> dict:
+    engine = get_engine()
+    try:
+        with open(path, newline="") as file:
+            def on_rejected(line, reason):
+                rejections.write(json.dumps({"line": line, "reason": reason}) + "\n")
+            return import_users(Database(engine), read_rows(file, format), batch_size, on_rejected)
+    finally:
+        engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["ndjson", "csv"], help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--rejections", help="file for the rejected rows, stderr by default")
+    args = parser.parse_args()
+    format = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    rejections = open(args.rejections, "w") if args.rejections else sys.stderr
+    try:
+        summary = main(args.path, format, args.batch_size, rejections)
+    finally:
+        if args.rejections:
+            rejections.close()
+    logger.info(f"{summary['imported']} users imported, {summary['rejected']} rejected in {summary['seconds']} s ({summary['rows_per_second']} rows/s)")
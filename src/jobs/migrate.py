@@ -0,0 +1,29 @@
+"""
+Creates the tables of the service and applies the pending schema upgrades
+(database.migrations.migrate). Run it once per deploy, before starting the
+service, which no longer runs DDL on startup:
+
+    PYTHONPATH=src python -m jobs.migrate
+
+Every step is idempotent, running it on an up to date database is a no-op.
+"""
+import argparse
+import time
+from loguru import logger
+from database.migrations import migrate
+from utils.engine import get_engine
+
+def main() -> float:
+    engine = get_engine()
+    try:
+        start = time.perf_counter()
+        with engine.begin() as connection:
+            migrate(connection)
+        return time.perf_counter() - start
+    finally:
+        engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+    logger.info(f"Schema migrated in {main():.2f} s")
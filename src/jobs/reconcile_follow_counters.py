@@ -0,0 +1,25 @@
+"""
+Recomputes every user's followers_count / following_count from the followers
+table and repairs the ones that drifted.
+
+    PYTHONPATH=src python -m jobs.reconcile_follow_counters [--batch-size 10000]
+
+Safe to run while the service is up, each batch of users is its own short transaction.
+"""
+import argparse
+from loguru import logger
+from database.db import Database
+from utils.engine import get_engine
+
+def main(batch_size: int) -> int:
+    engine = get_engine()
+    try:
+        return Database(engine).reconcile_follow_counters(batch_size)
+    finally:
+        engine.dispose()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+    logger.info(f"{main(args.batch_size)} users had wrong follow counters")
@@ -1,21 +1,36 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
-from routers.routers import router
+from contextlib import asynccontextmanager
+from routers.routers import router, services
+from routers.monitoring import monitoring_router
+from utils.metrics import metrics_registry
 from middleware.error_middleware import ErrorResponse, ErrorResponseException
+from middleware.api_key import ApiKeyValidator
+from middleware.metrics import MetricsMiddleware
 from fastapi.middleware.cors import CORSMiddleware
 import os
-import requests
 
 
-app = FastAPI()
+api_key_validator = ApiKeyValidator.from_env()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # the engine and its pool are created here, in the worker process serving the app
+    await services.startup()
+    yield
+    await api_key_validator.aclose()
+    await services.close()
+
+app = FastAPI(lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"], # It will only allow certain types of communication, excluding everything that involves credentials: Cookies, Authorization headers like those used with Bearer Tokens, etc.
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-
+    # paginated routes return the next page cursor in this header, browsers hide it otherwise
+    expose_headers=["X-Next-Cursor"],
 )
 
 @app.middleware("http")
@@ -46,15 +61,9 @@ async def useApiKey(request: Request, call_next):
             )
             
 
-        # make a POST request to ENV API_SERVICE_MANAGER providing de token as the body
+        # validate the token against ENV API_SERVICE_MANAGER, cached per token
 
-        res = requests.post(
-            f"{os.getenv('API_SERVICE_MANAGER')}/manager/validate",
-            headers={"Authorization": f"Bearer {os.getenv('API_KEY')}"},
-            json={"APIKey": token},
-        )
-
-        if res.status_code != 200:
+        if not await api_key_validator.is_valid(token):
             raise ErrorResponseException(
                 type="https://httpstatuses.com/503",
                 status=503,
@@ -77,7 +86,11 @@ async def useApiKey(request: Request, call_next):
             status_code=e.status, content=error_response.model_dump()
         )
 
+# added last so it is the outermost middleware, it times the others too
+app.add_middleware(MetricsMiddleware, registry=metrics_registry)
+
 app.include_router(router)
+app.include_router(monitoring_router)
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request: Request, exc: HTTPException):
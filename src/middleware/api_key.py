@@ -0,0 +1,112 @@
+import asyncio
+import os
+import time
+import httpx
+from loguru import logger
+from utils.ttl_cache import TTLCache
+
+class ApiKeyValidator:
+    """
+    Validates API keys against the service manager (POST /manager/validate).
+
+    Results are kept in a bounded TTL cache, rejected keys included (for a
+    shorter time), so only the first request with a given key pays the round
+    trip. Concurrent requests with the same uncached key share one validation
+    call and every call goes through a single keep-alive AsyncClient.
+
+    Attributes:
+        manager_url: str (base URL of the service manager)
+        api_key: str (key of this service, sent as Bearer token to the manager)
+        cache: TTLCache (token -> bool)
+        negative_ttl: float (seconds a rejected key stays cached)
+        validations: int (calls made to the manager)
+        coalesced: int (requests that waited on an in-flight validation)
+        errors: int (validations that failed to reach the manager)
+    """
+    def __init__(self, manager_url: str | None, api_key: str | None, ttl: float = 300.0, negative_ttl: float = 30.0,
+                 maxsize: int = 4096, timeout: float = 5.0, transport: httpx.AsyncBaseTransport | None = None, clock=time.monotonic):
+        self.manager_url = (manager_url or "").rstrip("/")
+        self.api_key = api_key
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl, clock=clock)
+        self.negative_ttl = negative_ttl
+        self.timeout = timeout
+        self.transport = transport
+        self.validations = 0
+        self.coalesced = 0
+        self.errors = 0
+        self._client: httpx.AsyncClient | None = None
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "ApiKeyValidator":
+        return cls(
+            manager_url=os.getenv("API_SERVICE_MANAGER"),
+            api_key=os.getenv("API_KEY"),
+            ttl=float(os.getenv("API_KEY_CACHE_TTL", "300")),
+            negative_ttl=float(os.getenv("API_KEY_NEGATIVE_CACHE_TTL", "30")),
+            maxsize=int(os.getenv("API_KEY_CACHE_SIZE", "4096")),
+            timeout=float(os.getenv("API_KEY_VALIDATION_TIMEOUT", "5")),
+            **kwargs,
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created lazily so it binds to the event loop serving the requests
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                transport=self.transport,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            )
+        return self._client
+
+    async def is_valid(self, token: str) -> bool:
+        cached = self.cache.get(token)
+        if cached is not None:
+            return cached
+
+        validation = self._inflight.get(token)
+        if validation is None:
+            validation = asyncio.ensure_future(self._validate(token))
+            self._inflight[token] = validation
+            validation.add_done_callback(lambda _: self._inflight.pop(token, None))
+        else:
+            self.coalesced += 1
+        # shield: a cancelled request must not cancel the validation others wait on
+        return await asyncio.shield(validation)
+
+    async def _validate(self, token: str) -> bool:
+        self.validations += 1
+        try:
+            res = await self.client.post(
+                f"{self.manager_url}/manager/validate",
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                json={"APIKey": token},
+            )
+        except httpx.HTTPError as e:
+            # The manager being down says nothing about the key, do not cache it
+            self.errors += 1
+            logger.error(f"Error validating API key: {e}")
+            return False
+
+        if res.status_code == 200:
+            self.cache.set(token, True)
+            return True
+        if res.status_code < 500:
+            self.cache.set(token, False, ttl=self.negative_ttl)
+        logger.error(f"API key rejected by manager with status {res.status_code}")
+        return False
+
+    def stats(self) -> dict:
+        return {
+            **self.cache.stats(),
+            "validations": self.validations,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "inflight": len(self._inflight),
+        }
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
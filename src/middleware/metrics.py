@@ -0,0 +1,58 @@
+import time
+from database.instrumentation import track_queries
+from utils.metrics import MetricsRegistry
+
+# statements per request
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request, labelled by method, route
+    template (e.g. /users/{user_id}, "unmatched" for unknown paths) and status.
+
+    It also tracks the statements run on the instrumented engines while the
+    request is served (see database.instrumentation). It has to be the
+    outermost middleware so every other one runs inside the tracked block.
+
+    Metrics:
+        http_requests_in_flight: gauge
+        http_request_duration_seconds: histogram {method, route, status}
+        http_request_db_seconds: histogram {method, route}
+        http_request_db_statements: histogram {method, route}
+        http_request_n_plus_one_total: counter {method, route}, requests with a probable N+1
+    """
+    def __init__(self, app, registry: MetricsRegistry):
+        self.app = app
+        self.in_flight = registry.gauge("http_requests_in_flight", "HTTP requests being served")
+        self.duration = registry.histogram("http_request_duration_seconds", "HTTP request latency, until the last byte of the body is sent", ("method", "route", "status"))
+        self.db_time = registry.histogram("http_request_db_seconds", "Time spent executing SQL statements per HTTP request", ("method", "route"))
+        self.db_statements = registry.histogram("http_request_db_statements", "SQL statements executed per HTTP request", ("method", "route"), STATEMENT_BUCKETS)
+        self.n_plus_one = registry.counter("http_request_n_plus_one_total", "HTTP requests that repeated a SQL statement N_PLUS_ONE_THRESHOLD times", ("method", "route"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        self.in_flight.inc()
+        with track_queries() as queries:
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                self.in_flight.dec()
+                # the router leaves the matched route in the scope
+                route = scope.get("route")
+                template = getattr(route, "path", "unmatched")
+                method = scope["method"]
+                self.duration.observe(time.perf_counter() - start, method, template, status)
+                self.db_time.observe(queries.seconds, method, template)
+                self.db_statements.observe(queries.statements, method, template)
+                if queries.n_plus_one:
+                    self.n_plus_one.inc(1, method, template)
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, status, HTTPException, Response
+from business_logic.monitoring.monitoring_schemas import PoolStatsResponse, CacheStatsResponse
+from middleware.error_middleware import ErrorResponse
+from routers.routers import services
+from utils.engine import get_pool_stats
+from utils.metrics import metrics_registry
+from loguru import logger
+
+monitoring_router = APIRouter()
+
+metrics_registry.gauge("db_pool_checked_out", "Database connections in use", callback=lambda: get_pool_stats(services.database.engine)["checked_out"])
+metrics_registry.counter("db_pool_waits_total", "Connection checkouts that waited for a free connection", callback=lambda: get_pool_stats(services.database.engine)["waits"])
+metrics_registry.counter("db_pool_timeouts_total", "Connection checkouts that timed out", callback=lambda: get_pool_stats(services.database.engine)["timeouts"])
+
+@monitoring_router.get("/monitoring/pool",
+    response_model = PoolStatsResponse,
+    status_code = status.HTTP_200_OK,
+    responses = {
+        200: {"description": "Connection pool stats retrieved successfully"},
+        500: {"model": ErrorResponse},
+    },)
+async def get_pool_status():
+    try:
+        return PoolStatsResponse(**get_pool_stats(services.database.engine))
+    except Exception as e:
+        logger.error(f"Internal server error retrieving pool stats: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@monitoring_router.get("/monitoring/cache",
+    response_model = CacheStatsResponse,
+    status_code = status.HTTP_200_OK,
+    responses = {
+        200: {"description": "User profile cache stats retrieved successfully"},
+        500: {"model": ErrorResponse},
+    },)
+async def get_cache_status():
+    try:
+        return CacheStatsResponse(**services.profile_cache.stats())
+    except Exception as e:
+        logger.error(f"Internal server error retrieving cache stats: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@monitoring_router.get("/monitoring/metrics",
+    response_class = Response,
+    status_code = status.HTTP_200_OK,
+    responses = {
+        200: {"description": "Metrics in the Prometheus text format", "content": {"text/plain": {}}},
+        500: {"model": ErrorResponse},
+    },)
+async def get_metrics():
+    try:
+        return Response(metrics_registry.render(), media_type=metrics_registry.content_type)
+    except Exception as e:
+        logger.error(f"Internal server error rendering metrics: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -1,9 +1,13 @@
 import json
+from datetime import datetime
 from fastapi import APIRouter, status, HTTPException, Query, Depends
-from utils.engine import get_engine
-from business_logic.users.users_schemas import UserAccountBase, UserCreationResponse, UserCompleteCreation, UserEmailResponse, UserInfoResponse, UserEmailExistsResponse, FollowResponse, FollowerAccountBase, UserEditProfile
-from business_logic.users.users_service import UserAccountService
+from fastapi.responses import StreamingResponse
+from business_logic.users.users_schemas import UserAccountBase, UserCreationResponse, UserCompleteCreation, UserEmailResponse, UserInfoResponse, UserEmailExistsResponse, FollowResponse, FollowerAccountBase, UserEditProfile, NearUserResponse, CommonInterestsUserResponse, SuggestedUserResponse, AuthorsLookup, BulkFollowRequest, BulkFollowResult
+from business_logic.users.users_service import LazyUserService
 from middleware.error_middleware import ErrorResponse, ErrorResponseException
+from database.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from database.db import DEFAULT_NEAR_RADIUS_KM, MAX_NEAR_RADIUS_KM
+from utils.json_response import FastJSONResponse
 from loguru import logger
 import os
 from fastapi.security import HTTPBearer
@@ -11,9 +15,14 @@ from fastapi.security import HTTPBearer
 
 
 router = APIRouter()
-services = UserAccountService(get_engine())
+# created by the app lifespan (or on first use), importing the routes opens no connection
+services = LazyUserService()
 security_scheme = HTTPBearer()
 
+def fast_json(content, next_cursor: str | None = None) -> FastJSONResponse:
+    # list bodies are plain dicts already shaped like their response_model, sent without re-validation
+    return FastJSONResponse(content, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
 @router.post("/users/temp", 
     response_model = UserCreationResponse,
     status_code = status.HTTP_201_CREATED,
@@ -26,7 +35,7 @@ security_scheme = HTTPBearer()
 async def create_user(user: UserAccountBase, token: str = Depends(security_scheme)):
     logger.debug(user.model_dump_json())
     try:
-        user = services.insert_useraccount(user)
+        user = await services.insert_useraccount(user)
         if isinstance(user, UserCreationResponse):
             logger.info("User created successfully")
         return user
@@ -63,7 +72,7 @@ async def create_user(user: UserAccountBase, token: str = Depends(security_schem
     },)
 async def update_user(user_id: str, data: UserCompleteCreation, token: str = Depends(security_scheme)):
     try:
-        if not services.update_useraccount(user_id, data):
+        if not await services.update_useraccount(user_id, data):
             logger.error("User not found")
             raise HTTPException(status_code=404, detail="User not found")
         logger.info("User updated")
@@ -93,14 +102,15 @@ async def update_user(user_id: str, data: UserCompleteCreation, token: str = Dep
         400: {"model": ErrorResponse},
         500: {"model": ErrorResponse},
     },)
-async def get_users(filter: str | None = None, token: str = Depends(security_scheme)):
+async def get_users(filter: str | None = None, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: str | None = None, token: str = Depends(security_scheme)):
     try:
         if filter:
-            users = services.get_usernames_starting_with(filter)
+            users, next_cursor = await services.get_usernames_starting_with(filter, limit, cursor)
         else:
-            users = services.get_useraccounts()
+            users, next_cursor = await services.get_useraccounts(limit, cursor)
+        # The body stays a plain list, the next page is requested with ?cursor=<X-Next-Cursor>
         logger.info("User list retrieved successfully")
-        return users
+        return fast_json(users, next_cursor)
     except ValueError as e:
         logger.error(f"Error retrieving users: {e}")
         raise HTTPException(status_code=400, detail="Error retrieving users")
@@ -119,7 +129,7 @@ async def get_users(filter: str | None = None, token: str = Depends(security_sch
     },)
 async def get_user(user_id: str, token: str = Depends(security_scheme)):
     try:
-        user = services.get_useraccount(user_id)
+        user = await services.get_useraccount(user_id)
         if user:
             logger.info("User retrieved successfully")
             return user
@@ -152,7 +162,7 @@ async def get_user(user_id: str, token: str = Depends(security_scheme)):
     },)
 async def get_email_by_username(username: str, token: str = Depends(security_scheme)):
     try:
-        email = services.get_email_by_username(username)
+        email = await services.get_email_by_username(username)
         if email:
             logger.info("Email retrieved successfully")
             return UserEmailResponse(email=email)
@@ -187,7 +197,7 @@ async def get_email_by_username(username: str, token: str = Depends(security_sch
     },)
 async def check_email_exists(email: str, token: str = Depends(security_scheme)):
     try:
-        res = services.check_email_exists(email)
+        res = await services.check_email_exists(email)
         return UserEmailExistsResponse(exists=res["exists"])
     except Exception as e:
         logger.error(f"Internal server error checking if email {email} exists: {e}")
@@ -204,10 +214,10 @@ async def check_email_exists(email: str, token: str = Depends(security_scheme)):
     },)
 async def get_user_authors_info(user_id: str, authors: list[str] = Query(...), token: str = Depends(security_scheme)):
     try:
-        users = services.get_user_authors_info(user_id, authors)
+        users = await services.get_user_authors_info(user_id, authors)
         if users:
             logger.info("Users retrieved successfully")
-            return users
+            return fast_json(users)
         else:
             logger.error("User not found")
             raise ErrorResponseException(
@@ -237,10 +247,10 @@ async def get_user_authors_info(user_id: str, authors: list[str] = Query(...), t
     },)
 async def get_user_authors_info_id(user_id: str, authors: list[str] = Query(...), token: str = Depends(security_scheme)):
     try:
-        users = services.get_user_authors_info_id(user_id, authors)
+        users = await services.get_user_authors_info_id(user_id, authors)
         if users:
             logger.info("Users retrieved successfully")
-            return users
+            return fast_json(users)
         else:
             logger.error("User not found")
             raise ErrorResponseException(
@@ -259,6 +269,24 @@ async def get_user_authors_info_id(user_id: str, authors: list[str] = Query(...)
         logger.error(f"Internal server error retrieving user: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
 
+@router.post("/users/authors/batch",
+    status_code = status.HTTP_200_OK,
+    response_model = list[UserInfoResponse],
+    responses = {
+        200: {"description": "Authors retrieved successfully"},
+        422: {"model": ErrorResponse},
+        500: {"model": ErrorResponse},
+    },)
+async def get_authors_batch(lookup: AuthorsLookup, token: str = Depends(security_scheme)):
+    # Authors found, in request order (ids first, then usernames), unknown ones are left out
+    try:
+        users = await services.get_authors(lookup.ids, lookup.usernames)
+        logger.info(f"{len(users)} authors retrieved successfully")
+        return fast_json(users)
+    except Exception as e:
+        logger.error(f"Internal server error retrieving authors: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
 @router.get("/users/search/", 
     response_model = list[UserCreationResponse],
     status_code = status.HTTP_200_OK,
@@ -268,12 +296,12 @@ async def get_user_authors_info_id(user_id: str, authors: list[str] = Query(...)
         404: {"model": ErrorResponse},
         500: {"model": ErrorResponse},
     },)
-async def search_users(username: str = Query(...), token: str = Depends(security_scheme)):
+async def search_users(username: str = Query(...), limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: str | None = None, token: str = Depends(security_scheme)):
     try: 
-        users = services.search_users(username)
+        users, next_cursor = await services.search_users(username, limit, cursor) or ([], None)
         if users:
             logger.info("User list retrieved successfully")
-            return users
+            return fast_json(users, next_cursor)
         else:
             logger.error("User not found")
             raise ErrorResponseException(
@@ -304,7 +332,7 @@ async def search_users(username: str = Query(...), token: str = Depends(security
 )
 async def follow_user(follower_data: FollowerAccountBase, user_id: str, token: str = Depends(security_scheme)):
     try: 
-        follow_action = services.follow_user(follower_user_id=follower_data.user_id, followed_user_id=user_id)
+        follow_action = await services.follow_user(follower_user_id=follower_data.user_id, followed_user_id=user_id)
         print(follow_action)
         if follow_action:
             logger.info("User followed successfully")
@@ -324,6 +352,70 @@ async def follow_user(follower_data: FollowerAccountBase, user_id: str, token: s
         logger.error(f"Internal server error: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
     
+@router.post("/users/bulk/follow/",
+    response_model=list[BulkFollowResult],
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Follows processed, one status per edge"},
+        422: {"model": ErrorResponse},
+        500: {"model": ErrorResponse},
+    },
+)
+async def bulk_follow(data: BulkFollowRequest, token: str = Depends(security_scheme)):
+    # status per edge: followed, already_following or user_not_found
+    try:
+        return await services.bulk_follow(data.edges)
+    except Exception as e:
+        logger.error(f"Internal server error: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@router.post("/users/bulk/unfollow/",
+    response_model=list[BulkFollowResult],
+    status_code=status.HTTP_200_OK,
+    responses={
+        200: {"description": "Unfollows processed, one status per edge"},
+        422: {"model": ErrorResponse},
+        500: {"model": ErrorResponse},
+    },
+)
+async def bulk_unfollow(data: BulkFollowRequest, token: str = Depends(security_scheme)):
+    # status per edge: unfollowed or not_following
+    try:
+        return await services.bulk_unfollow(data.edges)
+    except Exception as e:
+        logger.error(f"Internal server error: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+EXPORT_RESPONSES = {
+    200: {"description": "NDJSON stream, one object per line", "content": {"application/x-ndjson": {}}},
+    400: {"model": ErrorResponse},
+    500: {"model": ErrorResponse},
+}
+
+@router.get("/users/export/",
+    response_class = StreamingResponse,
+    status_code = status.HTTP_200_OK,
+    responses = EXPORT_RESPONSES,)
+async def export_users(since: datetime | None = None, until: datetime | None = None, token: str = Depends(security_scheme)):
+    # users (with their userinfo) created in [since, until), streamed without loading the table in memory
+    try:
+        return StreamingResponse(services.export_users(since, until), media_type="application/x-ndjson")
+    except ValueError as e:
+        logger.error(f"Error exporting users: {e}")
+        raise HTTPException(status_code=400, detail="Error exporting users")
+
+@router.get("/users/export/followers/",
+    response_class = StreamingResponse,
+    status_code = status.HTTP_200_OK,
+    responses = EXPORT_RESPONSES,)
+async def export_followers(since: datetime | None = None, until: datetime | None = None, token: str = Depends(security_scheme)):
+    # follow edges made in [since, until)
+    try:
+        return StreamingResponse(services.export_followers(since, until), media_type="application/x-ndjson")
+    except ValueError as e:
+        logger.error(f"Error exporting followers: {e}")
+        raise HTTPException(status_code=400, detail="Error exporting followers")
+
 @router.delete("/users/unfollow/{user_id}/", 
     status_code=status.HTTP_204_NO_CONTENT,
     responses={
@@ -335,7 +427,7 @@ async def follow_user(follower_data: FollowerAccountBase, user_id: str, token: s
 )
 async def unfollow_user(follower_data: FollowerAccountBase, user_id: str, token: str = Depends(security_scheme)):
     try: 
-        unfollow_action = services.unfollow_user(follower_user_id=follower_data.user_id, followed_user_id=user_id)
+        unfollow_action = await services.unfollow_user(follower_user_id=follower_data.user_id, followed_user_id=user_id)
         if unfollow_action:
             logger.info("User unfollowed successfully")
         else:
@@ -363,10 +455,10 @@ async def unfollow_user(follower_data: FollowerAccountBase, user_id: str, token:
         500: {"model": ErrorResponse},
     },
 )
-async def get_followers(user_id: str, token: str = Depends(security_scheme)):
+async def get_followers(user_id: str, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: str | None = None, token: str = Depends(security_scheme)):
     try: 
-        user_followers = services.get_followers(user_id)
-        if user_followers is None:
+        page = await services.get_followers(user_id, limit, cursor)
+        if page is None:
             logger.error("User not found")
             raise ErrorResponseException(
                 type="https://httpstatuses.com/404",
@@ -375,9 +467,13 @@ async def get_followers(user_id: str, token: str = Depends(security_scheme)):
                 detail="User not found",
                 instance="/users/followers/{user_id}/"
             )
-        return user_followers
+        user_followers, next_cursor = page
+        return fast_json(user_followers, next_cursor)
     except ErrorResponseException as e:
         raise e
+    except ValueError as e:
+        logger.error(f"Error retrieving users: {e}")
+        raise HTTPException(status_code=400, detail="Error retrieving users")
     except Exception as e:
         logger.error(f"Internal server error: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -392,10 +488,10 @@ async def get_followers(user_id: str, token: str = Depends(security_scheme)):
         500: {"model": ErrorResponse},
     },
 )
-async def get_following(user_id: str, token: str = Depends(security_scheme)):
+async def get_following(user_id: str, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: str | None = None, token: str = Depends(security_scheme)):
     try: 
-        user_followers = services.get_following(user_id)
-        if user_followers is None:
+        page = await services.get_following(user_id, limit, cursor)
+        if page is None:
             logger.error("User not found")
             raise ErrorResponseException(
                 type="https://httpstatuses.com/404",
@@ -404,9 +500,13 @@ async def get_following(user_id: str, token: str = Depends(security_scheme)):
                 detail="User not found",
                 instance="/users/{user_id}"
             )
-        return user_followers
+        user_followers, next_cursor = page
+        return fast_json(user_followers, next_cursor)
     except ErrorResponseException as e:
         raise e
+    except ValueError as e:
+        logger.error(f"Error retrieving users: {e}")
+        raise HTTPException(status_code=400, detail="Error retrieving users")
     except Exception as e:
         logger.error(f"Internal server error: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
@@ -422,7 +522,7 @@ async def get_following(user_id: str, token: str = Depends(security_scheme)):
 )
 async def edit_user_profile(user_id: str, data: UserEditProfile, token: str = Depends(security_scheme)):
     try:
-        if not services.update_user_profile(user_id, data):
+        if not await services.update_user_profile(user_id, data):
             logger.error("User not found")
             raise HTTPException(status_code=404, detail="User not found")
         logger.info("User updated")
@@ -444,7 +544,7 @@ async def edit_user_profile(user_id: str, data: UserEditProfile, token: str = De
         raise HTTPException(status_code=500, detail="Internal Server Error")
     
 @router.get("/users/near/{user_id}/", 
-    response_model = list[UserCreationResponse],
+    response_model = list[NearUserResponse],
     status_code = status.HTTP_200_OK,
     responses = {
         200: {"description": "User list retrieved successfully"},
@@ -452,11 +552,11 @@ async def edit_user_profile(user_id: str, data: UserEditProfile, token: str = De
         500: {"model": ErrorResponse},
     },
 )
-async def get_near_users(user_id: str):
+async def get_near_users(user_id: str, radius_km: float = Query(DEFAULT_NEAR_RADIUS_KM, gt=0, le=MAX_NEAR_RADIUS_KM)):
     try:
-        users = services.get_near_users(user_id)
+        users = await services.get_near_users(user_id, radius_km)
         logger.info("User list retrieved successfully")
-        return users
+        return fast_json(users)
     except ValueError as e:
         logger.error(f"Error retrieving users: {e}")
         raise HTTPException(status_code=400, detail="Error retrieving users")
@@ -465,7 +565,7 @@ async def get_near_users(user_id: str):
         raise HTTPException(status_code=500, detail="Internal Server Error")
     
 @router.get("/users/common-interests/{user_id}/", 
-    response_model = list[UserCreationResponse],
+    response_model = list[CommonInterestsUserResponse],
     status_code = status.HTTP_200_OK,
     responses = {
         200: {"description": "User list retrieved successfully"},
@@ -473,14 +573,36 @@ async def get_near_users(user_id: str):
         500: {"model": ErrorResponse},
     },
 )
-async def get_users_with_common_interests(user_id: str):
+async def get_users_with_common_interests(user_id: str, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: str | None = None):
     try:
-        users = services.get_users_with_common_interests(user_id)
+        users, next_cursor = await services.get_users_with_common_interests(user_id, limit, cursor)
         logger.info("User list retrieved successfully")
-        return users
+        return fast_json(users, next_cursor)
     except ValueError as e:
         logger.error(f"Error retrieving users: {e}")
         raise HTTPException(status_code=400, detail="Error retrieving users")
     except Exception as e:
         logger.error(f"Internal server error retrieving users: {e}")
+        raise HTTPException(status_code=500, detail="Internal Server Error")
+
+@router.get("/users/suggestions/{user_id}/", 
+    response_model = list[SuggestedUserResponse],
+    status_code = status.HTTP_200_OK,
+    responses = {
+        200: {"description": "Follow suggestions retrieved successfully"},
+        400: {"model": ErrorResponse},
+        500: {"model": ErrorResponse},
+    },
+)
+async def get_follow_suggestions(user_id: str, limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE), cursor: str | None = None):
+    # accounts followed by the ones user_id follows, not followed yet, most mutual connections first
+    try:
+        users, next_cursor = await services.get_follow_suggestions(user_id, limit, cursor)
+        logger.info("Follow suggestions retrieved successfully")
+        return fast_json(users, next_cursor)
+    except ValueError as e:
+        logger.error(f"Error retrieving follow suggestions: {e}")
+        raise HTTPException(status_code=400, detail="Error retrieving follow suggestions")
+    except Exception as e:
+        logger.error(f"Internal server error retrieving follow suggestions: {e}")
         raise HTTPException(status_code=500, detail="Internal Server Error")
\ No newline at end of file
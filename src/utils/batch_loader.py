@@ -0,0 +1,81 @@
+import asyncio
+
+class BatchLoader:
+    """
+    Coalesces the keys requested by concurrent coroutines into one batch call
+    (DataLoader style): keys are collected for `wait` seconds, or until
+    max_batch of them are pending, then batch_fn loads them all at once.
+
+    batch_fn is an async callable receiving the list of keys and returning a
+    dict key -> value, keys missing from it resolve to None. A failing batch
+    raises its exception in every caller waiting on it.
+
+    Attributes:
+        wait: float (seconds a batch stays open for more keys)
+        max_batch: int (keys per batch_fn call)
+        batches, keys, coalesced: int (counters, coalesced keys were already pending)
+    """
+    def __init__(self, batch_fn, wait: float = 0.002, max_batch: int = 5000):
+        self.batch_fn = batch_fn
+        self.wait = wait
+        self.max_batch = max_batch
+        self.batches = 0
+        self.keys = 0
+        self.coalesced = 0
+        self._pending = {}
+        self._timer = None
+        self._tasks = set()
+
+    async def load_many(self, keys: list) -> list:
+        loop = asyncio.get_running_loop()
+        futures = []
+        for key in keys:
+            future = self._pending.get(key)
+            if future is None:
+                future = loop.create_future()
+                self._pending[key] = future
+                self.keys += 1
+                if len(self._pending) >= self.max_batch:
+                    self._dispatch()
+            else:
+                self.coalesced += 1
+            futures.append(future)
+        if self._pending and self._timer is None:
+            self._timer = loop.call_later(self.wait, self._dispatch)
+        # shielded: a cancelled caller must not cancel the keys it shares with others
+        return await asyncio.gather(*(asyncio.shield(future) for future in futures))
+
+    async def load(self, key):
+        return (await self.load_many([key]))[0]
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        self.batches += 1
+        task = asyncio.ensure_future(self._run_batch(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: dict):
+        try:
+            results = await self.batch_fn(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for key, future in batch.items():
+            if not future.done():
+                future.set_result(results.get(key))
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "keys": self.keys,
+            "coalesced": self.coalesced,
+            "pending": len(self._pending),
+        }
@@ -1,17 +1,123 @@
 from typing import Optional
 from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from loguru import logger
 import os
+import threading
+import time
 from dotenv import load_dotenv
 
-def get_engine() -> Optional[create_engine]:
+class MonitoredPoolMixin:
+    """
+    Counts checkouts and the time spent waiting for a free connection.
+
+    A checkout is a wait when every connection (pool_size + max_overflow) was
+    already checked out when it was requested. Checkouts run on the threads of
+    the threadpool, the counters are updated under a lock.
+    """
+    checkouts = 0
+    waits = 0
+    wait_time = 0.0
+    timeouts = 0
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+
+    def _do_get(self):
+        exhausted = self._max_overflow > -1 and self.checkedout() >= self.size() + self._max_overflow
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self._count(time.perf_counter() - start, timeout=True)
+            raise
+        self._count(time.perf_counter() - start if exhausted else None)
+        return connection
+
+    def _count(self, waited: float | None, timeout: bool = False):
+        # waited is None when the checkout did not wait
+        with self._stats_lock:
+            if timeout:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            if waited is not None:
+                self.waits += 1
+                self.wait_time += waited
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            checkouts, waits, wait_time, timeouts = self.checkouts, self.waits, self.wait_time, self.timeouts
+        return {
+            "pool_size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "checked_in": self.checkedin(),
+            "overflow": max(self.overflow(), 0),
+            "checkouts": checkouts,
+            "waits": waits,
+            "wait_time_ms": round(wait_time * 1000, 3),
+            "timeouts": timeouts,
+        }
+
+class MonitoredQueuePool(MonitoredPoolMixin, QueuePool):
+    pass
+
+class MonitoredAsyncPool(MonitoredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+def get_database_url(driver: str = "postgresql") -> str:
     user = os.getenv('POSTGRES_USER')
     password = os.getenv('POSTGRES_PASSWORD')
     host = os.getenv('POSTGRES_HOST')
     port = os.getenv('POSTGRES_PORT')
     db = os.getenv('POSTGRES_DB')
-    database_url = f"postgresql://{user}:{password}@{host}:{port}/{db}"
+    return f"{driver}://{user}:{password}@{host}:{port}/{db}"
+
+def is_async_database() -> bool:
+    # DATABASE_MODE=async serves every request through asyncpg instead of psycopg2
+    return os.getenv('DATABASE_MODE', 'sync').lower() == 'async'
+
+def get_pool_settings() -> dict:
+    """
+    Pool configuration shared by both engines, from env vars:
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT (seconds), DB_POOL_RECYCLE (seconds),
+    DB_POOL_PRE_PING, DB_ECHO.
+    """
+    return {
+        "pool_size": int(os.getenv('DB_POOL_SIZE', '5')),
+        "max_overflow": int(os.getenv('DB_MAX_OVERFLOW', '10')),
+        "pool_timeout": float(os.getenv('DB_POOL_TIMEOUT', '30')),
+        "pool_recycle": int(os.getenv('DB_POOL_RECYCLE', '1800')),
+        "pool_pre_ping": os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true',
+        "echo": os.getenv('DB_ECHO', 'false').lower() == 'true',
+    }
+
+def get_statement_timeout() -> int:
+    # milliseconds, 0 disables it
+    return int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '0'))
+
+def get_engine() -> Optional[create_engine]:
+    database_url = get_database_url()
+    statement_timeout = get_statement_timeout()
+    connect_args = {"options": f"-c statement_timeout={statement_timeout}"} if statement_timeout else {}
 
     logger.info("Connecting Database via URL")
-    
-    return create_engine(database_url, echo=True)
+
+    return create_engine(database_url, poolclass=MonitoredQueuePool, connect_args=connect_args, **get_pool_settings())
+
+def get_async_engine() -> AsyncEngine:
+    database_url = get_database_url("postgresql+asyncpg")
+    statement_timeout = get_statement_timeout()
+    connect_args = {"server_settings": {"statement_timeout": str(statement_timeout)}} if statement_timeout else {}
+
+    logger.info("Connecting async Database via URL")
+
+    return create_async_engine(database_url, poolclass=MonitoredAsyncPool, connect_args=connect_args, **get_pool_settings())
+
+def get_pool_stats(engine) -> dict:
+    # works for both Engine and AsyncEngine, both expose the sync pool
+    return engine.pool.stats()
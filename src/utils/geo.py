@@ -0,0 +1,68 @@
+from math import asin, cos, degrees, radians, sin
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+# geodesic (WGS-84) distances differ from spherical ones by well under 1%
+BOUNDING_BOX_MARGIN = 1.01
+# haversine error vs WGS-84 is below 0.5%, candidates closer than this to the
+# radius are re-checked with the exact geodesic distance
+REFINEMENT_BAND = 0.006
+
+def bounding_box(lat: float, long: float, radius_km: float) -> tuple[float, float, list[tuple[float, float]]]:
+    """
+    Lat/long box that contains every point within radius_km of (lat, long).
+
+    Returns (min_lat, max_lat, long_ranges): long_ranges has two ranges when the
+    box crosses the antimeridian and covers every longitude when it reaches a pole.
+    """
+    angular_radius = radius_km * BOUNDING_BOX_MARGIN / EARTH_RADIUS_KM
+    delta_lat = degrees(angular_radius)
+    min_lat, max_lat = lat - delta_lat, lat + delta_lat
+    if min_lat <= -90 or max_lat >= 90 or angular_radius >= radians(90):
+        return max(min_lat, -90.0), min(max_lat, 90.0), [(-180.0, 180.0)]
+
+    ratio = sin(angular_radius) / cos(radians(lat))
+    if ratio >= 1:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+    delta_long = degrees(asin(ratio))
+    min_long, max_long = long - delta_long, long + delta_long
+    if min_long < -180:
+        return min_lat, max_lat, [(min_long + 360, 180.0), (-180.0, max_long)]
+    if max_long > 180:
+        return min_lat, max_lat, [(min_long, 180.0), (-180.0, max_long - 360)]
+    return min_lat, max_lat, [(min_long, max_long)]
+
+def haversine_km(lat: float, long: float, lats: np.ndarray, longs: np.ndarray) -> np.ndarray:
+    """
+    Great-circle distance from (lat, long) to every point of (lats, longs), in one vectorized pass.
+    """
+    lat1, long1 = np.radians(lat), np.radians(long)
+    lat2, long2 = np.radians(lats), np.radians(longs)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((long2 - long1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def rank_by_distance(origin: tuple[float, float], candidates: list, radius_km: float, location, refine: bool = True) -> list[tuple]:
+    """
+    Keeps the candidates within radius_km of origin sorted by distance.
+    location maps a candidate to its (lat, long). Returns [(candidate, distance_km)].
+
+    Distances are computed with haversine for the whole candidate array at once.
+    With refine, the few candidates close to the radius get the exact geodesic
+    distance so the cut matches WGS-84.
+    """
+    if not candidates:
+        return []
+    points = np.array([location(candidate) for candidate in candidates], dtype=float)
+    distances = haversine_km(origin[0], origin[1], points[:, 0], points[:, 1])
+
+    if refine:
+        borderline = np.flatnonzero(np.abs(distances - radius_km) <= radius_km * REFINEMENT_BAND)
+        if len(borderline):
+            # geopy loads all its geocoders on import, kept off the startup path
+            from geopy.distance import geodesic
+        for i in borderline:
+            distances[i] = geodesic(origin, tuple(points[i])).kilometers
+
+    inside = np.flatnonzero(distances <= radius_km)
+    inside = inside[np.argsort(distances[inside], kind="stable")]
+    return [(candidates[i], float(distances[i])) for i in inside]
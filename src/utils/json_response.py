@@ -0,0 +1,23 @@
+import orjson
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from uuid import UUID
+
+def json_default(value):
+    # orjson only encodes exact uuid.UUID, asyncpg returns its own subclass
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSONResponse encoded with orjson (UUIDs, datetimes and models included).
+
+    List routes return it with the plain dicts built by the database mappers:
+    a returned Response is sent as it is, so FastAPI skips validating and
+    serializing the body against response_model, which still documents it in OpenAPI.
+    """
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=json_default)
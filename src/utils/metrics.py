@@ -0,0 +1,135 @@
+from bisect import bisect_left
+
+# seconds, Prometheus client defaults
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    """
+    Observations counted in buckets, one series per label values.
+
+    observe() only bumps the bucket the value falls in, cumulative counts are
+    computed when rendering. Meant to be observed from the event loop thread,
+    there is no lock on the hot path.
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [bucket counts (+Inf last), sum, count]
+        self._series = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def samples(self):
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (None,), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound is None else f'le="{_number(float(bound))}"'
+                yield f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.label_names, labels)} {count}"
+
+class Gauge:
+    """
+    Value that goes up and down (inc / dec / set), or read from callback on
+    every render when one is given.
+    """
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), callback=None):
+        self.name = name
+        self.help = help
+        self.label_names = labels
+        self.callback = callback
+        self._values = {}
+
+    def inc(self, amount: float = 1, *labels):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, amount: float = 1, *labels):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, value: float, *labels):
+        self._values[labels] = value
+
+    def samples(self):
+        values = {(): self.callback()} if self.callback else self._values
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.label_names, labels)} {_number(value)}"
+
+class Counter(Gauge):
+    """
+    Monotonic Gauge, rendered as a Prometheus counter (name ending in _total).
+    """
+    type = "counter"
+
+    def dec(self, amount: float = 1, *labels):
+        raise ValueError("Counters only go up")
+
+class MetricsRegistry:
+    """
+    Metrics of this process, rendered in the Prometheus text exposition format
+    (version 0.0.4) for GET /monitoring/metrics.
+    """
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        """
+        Adds metric, or returns the one already registered with its name (e.g.
+        when Starlette builds the middleware stack again).
+        """
+        registered = self._metrics.get(metric.name)
+        if registered is not None:
+            if registered.type != metric.type:
+                raise ValueError(f"Metric {metric.name} is already registered as a {registered.type}")
+            return registered
+        self._metrics[metric.name] = metric
+        return metric
+
+    def histogram(self, name: str, help: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name: str, help: str, labels: tuple = (), callback=None) -> Gauge:
+        return self.register(Gauge(name, help, labels, callback))
+
+    def counter(self, name: str, help: str, labels: tuple = (), callback=None) -> Counter:
+        return self.register(Counter(name, help, labels, callback))
+
+    def get(self, name: str):
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+# metrics of this worker process, filled by MetricsMiddleware and the event publisher, scraped at /monitoring/metrics
+metrics_registry = MetricsRegistry()
@@ -0,0 +1,190 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timedelta
+from heapq import nsmallest
+from operator import itemgetter
+from threading import Lock
+from uuid import UUID
+import time
+
+EPOCH = datetime(1970, 1, 1)
+# code point above every other one, closes the range of keys starting with a prefix
+MAX_CHAR = "\U0010ffff"
+# prefixes up to this length keep their first top_size entries in sort order
+TOP_PREFIX_LENGTH = 3
+# entries kept per short prefix, above the largest page (MAX_PAGE_SIZE + 1)
+TOP_SIZE = 1024
+# matches a lookup sorts at most, prefixes matching more are served from their top list
+SCAN_LIMIT = 256
+
+def _micros(value: datetime) -> int:
+    return (value.replace(tzinfo=None) - EPOCH) // timedelta(microseconds=1)
+
+# (createdat, internal_id) of an entry
+_sort_key = itemgetter(1, 2)
+
+class PrefixIndex:
+    """
+    Case-insensitive username prefix index kept in process memory.
+
+    Entries are (lower username, createdat in microseconds, internal_id as int)
+    in a sorted list: the usernames starting with a prefix are a contiguous
+    range found with two bisections, and the page is taken from that range in
+    (createdat, internal_id) order, the same order (and cursor) as GET /users.
+
+    Short prefixes match a large part of the users, so prefixes of up to
+    TOP_PREFIX_LENGTH characters matching more than scan_limit users also keep
+    their first top_size entries in (createdat, internal_id) order (references
+    to the same tuples), and pages are sliced from that list. A lookup never
+    sorts more than scan_limit entries: pages beyond the top list, and longer
+    prefixes matching more than scan_limit users, are left to the database
+    (lookup returns None).
+
+    The index is cold until load() receives the whole users table, entries can
+    be added before that and are merged. Usernames never change, so adding new
+    users (and discarding deleted ones) keeps it current.
+
+    Attributes:
+        refresh_interval: float (seconds between catch-ups with rows inserted by other processes)
+        ready: bool (load() finished, lookups can be served)
+        lookups: int (lookups served)
+    """
+    def __init__(self, refresh_interval: float = 5.0, clock=time.monotonic, top_size: int = TOP_SIZE, scan_limit: int = SCAN_LIMIT):
+        self.refresh_interval = refresh_interval
+        self.top_size = top_size
+        self.scan_limit = scan_limit
+        self.clock = clock
+        self.ready = False
+        self.lookups = 0
+        self.refreshed_at = clock()
+        self._entries = []
+        # short prefix -> its first top_size entries (the same tuples as _entries) in sort order
+        self._top = {}
+        self._watermark = None
+        self._lock = Lock()
+
+    def load(self, rows):
+        """
+        Builds the index from (username, createdat, internal_id) rows, any iterable
+        (e.g. a streamed query). Entries added meanwhile are kept.
+        """
+        entries = [(username.lower(), _micros(createdat), internal_id.int) for username, createdat, internal_id in rows]
+        with self._lock:
+            entries.extend(self._entries)
+            entries.sort()
+            # rows added while loading are also in the scan, drop the copies
+            self._entries = [entry for i, entry in enumerate(entries) if i == 0 or entry != entries[i - 1]]
+            self._build_top()
+            self._watermark = max((entry[1] for entry in self._entries), default=None)
+            self.refreshed_at = self.clock()
+            self.ready = True
+
+    def add(self, username: str, createdat: datetime, internal_id: UUID):
+        entry = (username.lower(), _micros(createdat), internal_id.int)
+        with self._lock:
+            position = bisect_left(self._entries, entry)
+            if position == len(self._entries) or self._entries[position] != entry:
+                self._entries.insert(position, entry)
+                self._add_to_top(entry)
+            if self._watermark is None or entry[1] > self._watermark:
+                self._watermark = entry[1]
+
+    def discard(self, internal_ids: set[UUID]):
+        ids = {internal_id.int for internal_id in internal_ids}
+        with self._lock:
+            discarded = {entry[0][:length] for entry in self._entries if entry[2] in ids for length in range(1, TOP_PREFIX_LENGTH + 1)}
+            self._entries = [entry for entry in self._entries if entry[2] not in ids]
+            # a full top list misses the entries that followed the discarded ones
+            for prefix in discarded & self._top.keys():
+                self._set_top(prefix, *self._range(prefix))
+
+    def lookup(self, prefix: str, limit: int, after: tuple[datetime, UUID] | None = None) -> list[UUID] | None:
+        """
+        internal_ids of the first limit users whose username starts with prefix
+        (case-insensitive) in (createdat, internal_id) order, after the given sort key.
+        None when the index can not answer without sorting more than scan_limit
+        entries, the caller reads the page from the database.
+        """
+        prefix = prefix.lower()
+        after_key = (_micros(after[0]), after[1].int) if after else None
+        with self._lock:
+            self.lookups += 1
+            top = self._top.get(prefix)
+            if top is not None:
+                position = bisect_right(top, after_key, key=_sort_key) if after_key else 0
+                page = top[position:position + limit]
+                # the top list holds the first top_size matches, the page may continue past it
+                if len(page) < limit and len(top) == self.top_size:
+                    return None
+                return [UUID(int=entry[2]) for entry in page]
+            start, end = self._range(prefix)
+            if end - start > self.scan_limit:
+                return None
+            matches = self._entries[start:end]
+        if after_key:
+            matches = [entry for entry in matches if _sort_key(entry) > after_key]
+        # at most scan_limit matches, a sort is faster than a heap on them
+        return [UUID(int=entry[2]) for entry in sorted(matches, key=_sort_key)[:limit]]
+
+    def _range(self, prefix: str) -> tuple[int, int]:
+        return bisect_left(self._entries, (prefix,)), bisect_left(self._entries, (prefix + MAX_CHAR,))
+
+    def _set_top(self, prefix: str, start: int, end: int):
+        # only prefixes matching more than scan_limit users have a top list
+        if end - start > self.scan_limit:
+            self._top[prefix] = nsmallest(self.top_size, self._entries[start:end], key=_sort_key)
+        else:
+            self._top.pop(prefix, None)
+
+    def _build_top(self):
+        # one pass per prefix length over the distinct prefixes, jumping over each range
+        self._top = {}
+        for length in range(1, TOP_PREFIX_LENGTH + 1):
+            start = 0
+            while start < len(self._entries):
+                prefix = self._entries[start][0][:length]
+                if len(prefix) < length:
+                    start += 1
+                    continue
+                end = bisect_left(self._entries, (prefix + MAX_CHAR,), start)
+                self._set_top(prefix, start, end)
+                start = end
+
+    def _add_to_top(self, entry: tuple):
+        for length in range(1, min(len(entry[0]), TOP_PREFIX_LENGTH) + 1):
+            prefix = entry[0][:length]
+            top = self._top.get(prefix)
+            if top is None:
+                self._set_top(prefix, *self._range(prefix))
+            elif len(top) < self.top_size or _sort_key(entry) < _sort_key(top[-1]):
+                insort(top, entry, key=_sort_key)
+                if len(top) > self.top_size:
+                    top.pop()
+
+    def needs_refresh(self) -> bool:
+        return self.ready and self.clock() - self.refreshed_at >= self.refresh_interval
+
+    def watermark(self) -> datetime | None:
+        # newest createdat in the index, catch-ups read the rows created after it
+        return EPOCH + timedelta(microseconds=self._watermark) if self._watermark is not None else None
+
+    def refresh(self, rows):
+        for username, createdat, internal_id in rows:
+            self.add(username, createdat, internal_id)
+        self.refreshed_at = self.clock()
+
+    def clear(self):
+        with self._lock:
+            self._entries = []
+            self._top = {}
+            self._watermark = None
+            self.ready = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "ready": self.ready,
+            "lookups": self.lookups,
+        }
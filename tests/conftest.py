@@ -0,0 +1,13 @@
+
+import pytest
+from database.migrations import migrate
+from utils.engine import get_engine
+
+@pytest.fixture(scope="module")
+def migrated():
+    # the service runs no DDL, the tables come from the migrate step (jobs.migrate).
+    # Requested by the fixtures and tests that need the tables, unit tests run without a database
+    engine = get_engine()
+    with engine.begin() as connection:
+        migrate(connection)
+    engine.dispose()
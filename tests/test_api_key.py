@@ -0,0 +1,97 @@
+import asyncio
+import httpx
+from fastapi.testclient import TestClient
+from middleware.api_key import ApiKeyValidator
+import main
+
+class StubManager:
+    """Local stand-in for API_SERVICE_MANAGER/manager/validate"""
+    def __init__(self, valid_keys: set[str], delay: float = 0.0, status_on_invalid: int = 401):
+        self.valid_keys = valid_keys
+        self.delay = delay
+        self.status_on_invalid = status_on_invalid
+        self.calls = 0
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        assert request.url.path == "/manager/validate"
+        assert request.headers["Authorization"] == "Bearer 123"
+        await asyncio.sleep(self.delay)
+        key = httpx.Response(200, content=request.content).json()["APIKey"]
+        if key in self.valid_keys:
+            return httpx.Response(200, json={"valid": True})
+        return httpx.Response(self.status_on_invalid, json={"valid": False})
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def make_validator(manager: StubManager, **kwargs) -> ApiKeyValidator:
+    return ApiKeyValidator("http://manager/", "123", transport=httpx.MockTransport(manager.handler), **kwargs)
+
+def test_valid_key_is_cached():
+    manager = StubManager({"valid"})
+    validator = make_validator(manager)
+
+    async def scenario():
+        results = [await validator.is_valid("valid") for _ in range(5)]
+        await validator.aclose()
+        return results
+
+    assert asyncio.run(scenario()) == [True] * 5
+    assert manager.calls == 1
+    assert validator.stats()["hits"] == 4
+    assert validator.stats()["misses"] == 1
+
+def test_rejected_key_is_negatively_cached_until_expiry():
+    manager = StubManager({"valid"})
+    clock = FakeClock()
+    validator = make_validator(manager, negative_ttl=10, clock=clock)
+
+    async def scenario():
+        first = await validator.is_valid("invalid")
+        second = await validator.is_valid("invalid")
+        clock.now = 11
+        third = await validator.is_valid("invalid")
+        return first, second, third
+
+    assert asyncio.run(scenario()) == (False, False, False)
+    assert manager.calls == 2
+
+def test_manager_errors_are_not_cached():
+    manager = StubManager(set(), status_on_invalid=502)
+    validator = make_validator(manager)
+
+    async def scenario():
+        return await validator.is_valid("key"), await validator.is_valid("key")
+
+    assert asyncio.run(scenario()) == (False, False)
+    assert manager.calls == 2
+
+def test_concurrent_validations_are_coalesced():
+    manager = StubManager({"valid"}, delay=0.05)
+    validator = make_validator(manager)
+
+    async def scenario():
+        return await asyncio.gather(*(validator.is_valid("valid") for _ in range(50)))
+
+    assert asyncio.run(scenario()) == [True] * 50
+    assert manager.calls == 1
+    assert validator.stats()["coalesced"] == 49
+    assert validator.stats()["inflight"] == 0
+
+def test_middleware_rejects_invalid_key(monkeypatch):
+    manager = StubManager({"valid"})
+    monkeypatch.setenv("ENV", "development")
+    monkeypatch.setattr(main, "api_key_validator", make_validator(manager))
+    client = TestClient(main.app)
+
+    response = client.get("/users/hola/email", headers={"Authorization": "Bearer invalid"})
+    assert response.status_code == 503
+    assert response.json()["detail"] == "API key is invalid"
+
+    client.get("/users/hola/email", headers={"Authorization": "Bearer invalid"})
+    assert manager.calls == 1
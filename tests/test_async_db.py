@@ -0,0 +1,179 @@
+import asyncio
+import json
+import pytest
+from fastapi.testclient import TestClient
+from src.main import app
+from routers.routers import services
+from database.db import Database
+from business_logic.users.users_service import AsyncUserAccountService
+from business_logic.users.users_schemas import UserAccountBase, FollowEdge
+from utils.engine import get_engine, get_async_engine
+
+@pytest.fixture(scope="function")
+def setup(migrated):
+    db = Database(get_engine())
+    db.clear_table()
+    yield db
+    db.clear_table()
+
+headers = {
+    "Authorization": 'Bearer valid'
+}
+
+def run(scenario):
+    async def wrapper():
+        service = AsyncUserAccountService(get_async_engine())
+        try:
+            await service.startup()
+            return await scenario(service)
+        finally:
+            await service.database.engine.dispose()
+    return asyncio.run(wrapper())
+
+def test_async_service_create_and_get_user(setup):
+    async def scenario(service):
+        created = await service.insert_useraccount(UserAccountBase(username="sofisofi", name="Sofia", email="sofia@gmail.com"))
+        return created, await service.get_useraccount(str(created.id))
+
+    created, user = run(scenario)
+    assert user.id == created.id
+    assert user.username == "sofisofi"
+    assert user.email == "sofia@gmail.com"
+    assert user.interests is None
+
+def test_async_service_follow_and_search(setup):
+    async def scenario(service):
+        user1 = await service.insert_useraccount(UserAccountBase(username="sofisofi", name="Sofia", email="sofia@gmail.com"))
+        user2 = await service.insert_useraccount(UserAccountBase(username="sofisofia", name="Sofii", email="sofiia@gmail.com"))
+        await service.follow_user(str(user1.id), str(user2.id))
+        duplicated = await service.follow_user(str(user1.id), str(user2.id))
+        followers = await service.get_followers(str(user2.id))
+        following = await service.get_following(str(user1.id))
+        search = await service.search_users("sofisof")
+        profile = await service.get_useraccount(str(user2.id))
+        return duplicated, followers, following, search, profile
+
+    duplicated, followers, following, search, profile = run(scenario)
+    assert duplicated is None
+    assert (profile.followers_count, profile.following_count) == (1, 0)
+    assert [user["username"] for user in followers[0]] == ["sofisofi"]
+    assert [user["username"] for user in following[0]] == ["sofisofia"]
+    assert sorted(user["username"] for user in search[0]) == ["sofisofi", "sofisofia"]
+
+def test_async_service_serves_concurrent_requests(setup):
+    async def scenario(service):
+        created = await service.insert_useraccount(UserAccountBase(username="sofisofi", name="Sofia", email="sofia@gmail.com"))
+        return await asyncio.gather(*(service.get_useraccount(str(created.id)) for _ in range(20)))
+
+    users = run(scenario)
+    assert len(users) == 20
+    assert all(user.username == "sofisofi" for user in users)
+
+def test_async_service_invalid_ids(setup):
+    async def scenario(service):
+        return await service.get_followers("non-existent-id"), await service.get_user_authors_info_id("id", ["invalid-id"])
+
+    followers, authors = run(scenario)
+    assert followers is None
+    assert authors is None
+
+def test_async_service_paginates_users(setup):
+    async def scenario(service):
+        for i in range(3):
+            await service.insert_useraccount(UserAccountBase(username=f"user{i}", name="User", email=f"user{i}@gmail.com"))
+        first_page, cursor = await service.get_useraccounts(2)
+        second_page, last_cursor = await service.get_useraccounts(2, cursor)
+        return first_page, second_page, last_cursor
+
+    first_page, second_page, last_cursor = run(scenario)
+    assert [user["username"] for user in first_page] == ["user0", "user1"]
+    assert [user["username"] for user in second_page] == ["user2"]
+    assert last_cursor is None
+
+def test_async_service_unfollow_and_reconcile_counters(setup):
+    async def scenario(service):
+        user1 = await service.insert_useraccount(UserAccountBase(username="sofisofi", name="Sofia", email="sofia@gmail.com"))
+        user2 = await service.insert_useraccount(UserAccountBase(username="sofisofia", name="Sofii", email="sofiia@gmail.com"))
+        await service.follow_user(str(user1.id), str(user2.id))
+        unfollowed = await service.unfollow_user(str(user1.id), str(user2.id))
+        missing = await service.unfollow_user(str(user1.id), str(user2.id))
+        return unfollowed, missing, await service.reconcile_follow_counters(), await service.get_useraccount(str(user1.id))
+
+    unfollowed, missing, repaired, profile = run(scenario)
+    assert unfollowed is not None
+    assert missing is None
+    assert repaired == 0
+    assert (profile.followers_count, profile.following_count) == (0, 0)
+
+def test_async_service_bulk_follow(setup):
+    async def scenario(service):
+        users = [await service.insert_useraccount(UserAccountBase(username=f"user{i}", name="User", email=f"user{i}@gmail.com")) for i in range(3)]
+        edges = [FollowEdge(follower_id=users[0].id, followed_id=user.id) for user in users[1:]]
+        followed = await service.bulk_follow(edges)
+        again = await service.bulk_follow(edges)
+        unfollowed = await service.bulk_unfollow(edges[:1])
+        return followed, again, unfollowed, await service.get_useraccount(str(users[0].id))
+
+    followed, again, unfollowed, profile = run(scenario)
+    assert [result.status for result in followed] == ["followed", "followed"]
+    assert [result.status for result in again] == ["already_following", "already_following"]
+    assert [result.status for result in unfollowed] == ["unfollowed"]
+    assert profile.following_count == 1
+
+def test_async_service_follow_suggestions(setup):
+    async def scenario(service):
+        users = [await service.insert_useraccount(UserAccountBase(username=f"user{i}", name="User", email=f"user{i}@gmail.com")) for i in range(5)]
+        # user0 -> user1, user2; user1 -> user3, user4; user2 -> user3
+        pairs = [(0, 1), (0, 2), (1, 3), (1, 4), (2, 3)]
+        await service.bulk_follow([FollowEdge(follower_id=users[a].id, followed_id=users[b].id) for a, b in pairs])
+        first_page, cursor = await service.get_follow_suggestions(str(users[0].id), 1)
+        second_page, last_cursor = await service.get_follow_suggestions(str(users[0].id), 1, cursor)
+        return first_page, second_page, last_cursor
+
+    first_page, second_page, last_cursor = run(scenario)
+    assert [(user["username"], user["mutual_connections"]) for user in first_page] == [("user3", 2)]
+    assert [(user["username"], user["mutual_connections"]) for user in second_page] == [("user4", 1)]
+    assert last_cursor is None
+
+def test_async_service_exports_users_and_followers(setup):
+    async def scenario(service):
+        user1 = await service.insert_useraccount(UserAccountBase(username="sofisofi", name="Sofia", email="sofia@gmail.com"))
+        user2 = await service.insert_useraccount(UserAccountBase(username="sofisofia", name="Sofii", email="sofiia@gmail.com"))
+        await service.follow_user(str(user1.id), str(user2.id))
+        users = [chunk async for chunk in service.export_users()]
+        follows = [chunk async for chunk in service.export_followers()]
+        return user1, user2, users, follows
+
+    user1, user2, users, follows = run(scenario)
+    users = [json.loads(line) for line in b"".join(users).splitlines()]
+    follows = [json.loads(line) for line in b"".join(follows).splitlines()]
+    assert sorted(user["username"] for user in users) == ["sofisofi", "sofisofia"]
+    assert [(follow["follower_id"], follow["followed_id"]) for follow in follows] == [(str(user1.id), str(user2.id))]
+
+def test_async_service_pages_encode_with_fast_json(setup):
+    from utils.json_response import FastJSONResponse
+
+    async def scenario(service):
+        user1 = await service.insert_useraccount(UserAccountBase(username="sofisofi", name="Sofia", email="sofia@gmail.com"))
+        user2 = await service.insert_useraccount(UserAccountBase(username="sofisofia", name="Sofii", email="sofiia@gmail.com"))
+        await service.follow_user(str(user1.id), str(user2.id))
+        followers, _ = await service.get_followers(str(user2.id))
+        return user1, followers
+
+    # asyncpg rows carry its own UUID type
+    user1, followers = run(scenario)
+    assert json.loads(FastJSONResponse(followers).body)[0]["id"] == str(user1.id)
+
+@pytest.mark.parametrize("mode", ["sync", "async"])
+def test_update_user_ids_validated_in_both_modes(setup, monkeypatch, mode):
+    monkeypatch.setenv("DATABASE_MODE", mode)
+    asyncio.run(services.close())
+    completion = {"birthdate": "2000-01-01", "locationLat": -34.6, "locationLong": -58.4}
+    with TestClient(app) as client:
+        user_id = client.post("/users/temp", json={"username":"sofisofi", "name":"Sofia", "email":"sofia@gmail.com"}, headers=headers).json()["id"]
+        assert client.put(f"/users/{user_id}", json={"supabase_id": "invalid-id", **completion}, headers=headers).status_code == 400
+        assert client.put("/users/invalid-id", json={"supabase_id": user_id, **completion}, headers=headers).status_code == 400
+        assert client.get(f"/users/{user_id}", headers=headers).status_code == 200
+        supabase_id = "00000000-0000-4000-8000-000000000001"
+        assert client.put(f"/users/{user_id}", json={"supabase_id": supabase_id, **completion}, headers=headers).status_code == 204
+        assert client.get(f"/users/{supabase_id}", headers=headers).json()["username"] == "sofisofi"
@@ -0,0 +1,93 @@
+import asyncio
+import pytest
+from sqlalchemy import event
+from database.db import Database
+from utils.engine import get_engine
+from utils.batch_loader import BatchLoader
+from business_logic.users.users_service import UserAccountService
+from business_logic.users.users_schemas import UserAccountBase
+
+class StubBatch:
+    def __init__(self, fail: bool = False):
+        self.calls = []
+        self.fail = fail
+
+    async def __call__(self, keys):
+        self.calls.append(keys)
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError("database down")
+        return {key: key.upper() for key in keys if key != "missing"}
+
+def test_concurrent_loads_are_coalesced():
+    batch = StubBatch()
+    loader = BatchLoader(batch, wait=0.01)
+
+    async def scenario():
+        return await asyncio.gather(loader.load_many(["a", "b"]), loader.load_many(["b", "c", "missing"]), loader.load("a"))
+
+    first, second, third = asyncio.run(scenario())
+    assert first == ["A", "B"]
+    assert second == ["B", "C", None]
+    assert third == "A"
+    assert len(batch.calls) == 1
+    assert sorted(batch.calls[0]) == ["a", "b", "c", "missing"]
+    assert loader.stats()["coalesced"] == 2
+
+def test_batches_are_split_at_max_batch():
+    batch = StubBatch()
+    loader = BatchLoader(batch, wait=0.01, max_batch=2)
+    assert asyncio.run(loader.load_many(["a", "b", "c"])) == ["A", "B", "C"]
+    assert batch.calls == [["a", "b"], ["c"]]
+
+def test_batch_errors_reach_every_caller():
+    loader = BatchLoader(StubBatch(fail=True), wait=0.01)
+
+    async def scenario():
+        return await asyncio.gather(loader.load("a"), loader.load("b"), return_exceptions=True)
+
+    assert [str(result) for result in asyncio.run(scenario())] == ["database down", "database down"]
+
+def test_cancelled_caller_does_not_cancel_shared_keys():
+    batch = StubBatch()
+    loader = BatchLoader(batch, wait=0.01)
+
+    async def scenario():
+        cancelled = asyncio.ensure_future(loader.load("a"))
+        other = asyncio.ensure_future(loader.load("a"))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        return await other
+
+    assert asyncio.run(scenario()) == "A"
+
+@pytest.fixture(scope="function")
+def setup(migrated):
+    db = Database(get_engine())
+    db.clear_table()
+    yield db
+    db.clear_table()
+
+def test_concurrent_author_lookups_use_one_query(setup):
+    service = UserAccountService(get_engine())
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    async def scenario():
+        users = [await service.insert_useraccount(UserAccountBase(username=f"user{i}", name="User", email=f"user{i}@gmail.com")) for i in range(3)]
+        event.listen(service.database.engine, "before_cursor_execute", count_statement)
+        try:
+            return users, await asyncio.gather(
+                service.get_authors([users[0].id, users[1].id], []),
+                service.get_authors([], ["user2", "user0"]),
+                service.get_user_authors_info("id", ["user1"]),
+            )
+        finally:
+            event.remove(service.database.engine, "before_cursor_execute", count_statement)
+
+    users, (by_ids, by_usernames, legacy) = asyncio.run(scenario())
+    assert [user["username"] for user in by_ids] == ["user0", "user1"]
+    assert [user["username"] for user in by_usernames] == ["user2", "user0"]
+    assert [user["username"] for user in legacy] == ["user1"]
+    assert len(statements) == 1
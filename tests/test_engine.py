@@ -0,0 +1,104 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from src.main import app
+from business_logic.users.users_service import LazyUserService, UserAccountService
+from database.db import Database
+from database.instrumentation import assert_max_queries, instrument_engine
+from routers.routers import services
+from utils.engine import get_engine, get_pool_settings, get_pool_stats
+
+headers = {
+    "Authorization": 'Bearer valid'
+}
+
+client = TestClient(app)
+
+def test_pool_settings_from_env(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+    monkeypatch.setenv("DB_POOL_PRE_PING", "false")
+    settings = get_pool_settings()
+    assert settings["pool_size"] == 3
+    assert settings["max_overflow"] == 0
+    assert settings["pool_pre_ping"] is False
+    assert settings["echo"] is False
+
+def test_statement_timeout_is_set_per_connection(monkeypatch):
+    monkeypatch.setenv("DB_STATEMENT_TIMEOUT_MS", "1500")
+    engine = get_engine()
+    with engine.connect() as connection:
+        assert connection.execute(text("SHOW statement_timeout")).scalar() == "1500ms"
+    engine.dispose()
+
+def test_pool_counts_waits_and_timeouts(monkeypatch):
+    monkeypatch.setenv("DB_POOL_SIZE", "1")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+    monkeypatch.setenv("DB_POOL_TIMEOUT", "0.1")
+    engine = get_engine()
+    with engine.connect():
+        assert get_pool_stats(engine)["checked_out"] == 1
+        with pytest.raises(PoolTimeoutError):
+            engine.connect()
+    stats = get_pool_stats(engine)
+    engine.dispose()
+    assert stats["checked_out"] == 0
+    assert stats["checkouts"] == 1
+    assert stats["waits"] == 1
+    assert stats["timeouts"] == 1
+    assert stats["wait_time_ms"] >= 100
+
+def test_pool_counters_under_concurrent_checkouts(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    monkeypatch.setenv("DB_POOL_SIZE", "2")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "0")
+    engine = get_engine()
+
+    def checkouts(n):
+        for _ in range(n):
+            with engine.connect():
+                pass
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(checkouts, [50] * 8))
+    stats = get_pool_stats(engine)
+    engine.dispose()
+    assert stats["checkouts"] == 400
+    assert stats["checked_out"] == 0
+    assert 0 <= stats["waits"] <= 400
+
+def test_pool_stats_endpoint():
+    response = client.get("/monitoring/pool", headers=headers)
+    assert response.status_code == 200
+    response_data = response.json()
+    assert response_data["pool_size"] == get_pool_settings()["pool_size"]
+    assert response_data["checked_out"] >= 0
+
+def test_database_runs_no_statements_on_construction():
+    engine = get_engine()
+    instrument_engine(engine)
+    with assert_max_queries(0):
+        Database(engine)
+    engine.dispose()
+
+def test_lazy_service_is_created_on_first_use():
+    created = []
+    def factory():
+        created.append(UserAccountService(get_engine()))
+        return created[-1]
+
+    lazy = LazyUserService(factory)
+    assert not lazy.created and created == []
+    assert lazy.profile_cache is created[0].profile_cache
+    assert lazy.get() is created[0]
+    asyncio.run(lazy.close())
+    assert not lazy.created
+
+def test_lifespan_creates_and_closes_the_service(migrated):
+    asyncio.run(services.close())
+    with TestClient(app) as lifespan_client:
+        assert services.created
+        assert lifespan_client.get("/users", params={"limit": 1}, headers=headers).status_code == 200
+    assert not services.created
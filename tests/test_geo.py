@@ -0,0 +1,36 @@
+import numpy as np
+from geopy.distance import geodesic
+from utils.geo import bounding_box, haversine_km, rank_by_distance
+
+def test_haversine_matches_geodesic():
+    rng = np.random.default_rng(0)
+    lats = rng.uniform(-80, 80, 1000)
+    longs = rng.uniform(-180, 180, 1000)
+    distances = haversine_km(-34.6, -58.4, lats, longs)
+    exact = np.array([geodesic((-34.6, -58.4), (lat, long)).kilometers for lat, long in zip(lats, longs)])
+    assert np.all(np.abs(distances - exact) <= exact * 0.006 + 1e-6)
+
+def test_rank_by_distance_sorted_with_distances():
+    origin = (-34.6274, -58.4431)
+    candidates = [("far", (-34.9, -58.4431)), ("mid", (-34.7, -58.4431)), ("near", (-34.63, -58.4431))]
+    ranked = rank_by_distance(origin, candidates, 10, lambda candidate: candidate[1])
+    assert [candidate[0] for candidate, _ in ranked] == ["near", "mid"]
+    assert abs(ranked[1][1] - geodesic(origin, (-34.7, -58.4431)).kilometers) < 0.05
+
+def test_rank_by_distance_refines_radius_boundary():
+    origin = (0.0, 0.0)
+    # 1 degree of latitude at the equator: haversine says ~111.195 km, WGS-84 says ~110.574 km
+    candidates = [(1.0, 0.0)]
+    assert rank_by_distance(origin, candidates, 110.9, lambda candidate: candidate, refine=False) == []
+    ranked = rank_by_distance(origin, candidates, 110.9, lambda candidate: candidate)
+    assert len(ranked) == 1
+    assert abs(ranked[0][1] - geodesic(origin, (1.0, 0.0)).kilometers) < 1e-9
+
+def test_bounding_box_contains_radius():
+    min_lat, max_lat, long_ranges = bounding_box(-34.6, -58.4, 10)
+    assert min_lat < -34.6 - 0.089 and max_lat > -34.6 + 0.089
+    assert len(long_ranges) == 1
+    _, _, long_ranges = bounding_box(0, 179.99, 10)
+    assert len(long_ranges) == 2
+    _, _, long_ranges = bounding_box(89.99, 0, 10)
+    assert long_ranges == [(-180.0, 180.0)]
@@ -0,0 +1,66 @@
+import io
+import json
+import pytest
+from fastapi.testclient import TestClient
+from src.main import app
+from database.db import Database
+from utils.engine import get_engine
+from jobs.import_users import import_users, read_rows
+
+headers = {
+    "Authorization": 'Bearer valid'
+}
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def setup(migrated):
+    db = Database(get_engine())
+    db.clear_table()
+    yield db
+    db.clear_table()
+
+def run_import(db, file, format, batch_size=2):
+    rejected = []
+    summary = import_users(db, read_rows(file, format), batch_size, lambda line, reason: rejected.append((line, reason)))
+    return summary, rejected
+
+def test_import_ndjson_reports_rejected_rows(setup):
+    client.post("/users/temp", json={"username":"existing", "name":"User", "email":"existing@gmail.com"}, headers=headers)
+    supabase_id = "7f6b2c4e-1d2a-4c1b-9a61-2f1f4f5d0e11"
+    records = [
+        {"username": "user1", "name": "User", "email": "user1@gmail.com", "supabase_id": supabase_id, "birthdate": "01/01/2000",
+         "locationLat": -34.6, "locationLong": -58.4, "interests": "Music, sports"},
+        {"username": "existing", "name": "User", "email": "other@gmail.com"},
+        {"username": "user2", "name": "User", "email": "user1@gmail.com"},
+        {"username": "user3", "name": "User"},
+        {"username": "user4", "name": "User", "email": "user4@gmail.com"},
+    ]
+    file = io.StringIO("\n".join(json.dumps(record) for record in records) + "\n{not json\n")
+
+    summary, rejected = run_import(setup, file, "ndjson")
+    assert (summary["imported"], summary["rejected"]) == (2, 4)
+    assert [line for line, _ in sorted(rejected)] == [2, 3, 4, 6]
+    assert dict(rejected)[2] == "duplicate username, email or id"
+    assert dict(rejected)[4].startswith("invalid")
+
+    user = client.get(f"/users/{supabase_id}", headers=headers).json()
+    assert (user["username"], user["birthdate"], user["locationLat"], user["interests"]) == ("user1", "01/01/2000", -34.6, "Music, sports")
+    response_get = client.get("/users", params={"filter": "user%"}, headers=headers)
+    assert [user["username"] for user in response_get.json()] == ["user1", "user4"]
+
+def test_import_csv(setup):
+    file = io.StringIO(
+        "username,name,email,supabase_id,birthdate,locationLat,locationLong,interests\n"
+        "user1,User,user1@gmail.com,7f6b2c4e-1d2a-4c1b-9a61-2f1f4f5d0e11,01/01/2000,0,0,music\n"
+        "user2,User,user2@gmail.com,7f6b2c4e-1d2a-4c1b-9a61-2f1f4f5d0e12,01/01/2000,0,0,music\n"
+        "user3,User,user3@gmail.com,,,,,\n"
+        "user3,User,user3b@gmail.com,,,,,\n"
+    )
+    summary, rejected = run_import(setup, file, "csv", batch_size=10)
+    assert (summary["imported"], summary["rejected"]) == (3, 1)
+    assert rejected == [(5, "duplicate username, email or id")]
+
+    # imported interests are indexed like edited ones
+    response_get = client.get("/users/common-interests/7f6b2c4e-1d2a-4c1b-9a61-2f1f4f5d0e11/", headers=headers)
+    assert [user["username"] for user in response_get.json()] == ["user2"]
@@ -6,6 +6,8 @@ from loguru import logger
 from database.db import Database
 from utils.engine import get_engine
 from business_logic.users.users_schemas import UserAccountBase, FollowerAccountBase, FollowResponse
+import base64
+import json
 import os
 
 headers = {
@@ -568,4 +570,499 @@ def test_get_authors_id_invalid_id(setup):
     invalid_id = "invalid-user-id"
     authors = ["author1", "author2"]
     response_get = client.get(f"/users/{invalid_id}/authorsIds/", params={"authors": authors}, headers=headers)
-    assert response_get.status_code == 404
\ No newline at end of file
+    assert response_get.status_code == 404
+
+
+def test_get_users_paginated(setup):
+    for i in range(5):
+        client.post("/users/temp", json={"username":f"user{i}", "name":"User", "email":f"user{i}@gmail.com"}, headers=headers)
+
+    usernames = []
+    cursor = None
+    pages = 0
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        response_get = client.get("/users", params=params, headers=headers)
+        assert response_get.status_code == 200
+        assert len(response_get.json()) <= 2
+        usernames += [user["username"] for user in response_get.json()]
+        pages += 1
+        cursor = response_get.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    assert pages == 3
+    assert usernames == [f"user{i}" for i in range(5)]
+
+def test_cors_exposes_next_cursor(setup):
+    for i in range(3):
+        client.post("/users/temp", json={"username":f"user{i}", "name":"User", "email":f"user{i}@gmail.com"}, headers=headers)
+
+    response_get = client.get("/users", params={"limit": 2}, headers={**headers, "Origin": "https://twitsnap.example"})
+    assert response_get.status_code == 200
+    assert "X-Next-Cursor" in response_get.headers
+    assert "x-next-cursor" in response_get.headers["Access-Control-Expose-Headers"].lower()
+
+def test_get_users_with_filter_paginated(setup):
+    for username in ["sofisofi", "sofisofia", "otheruser", "sofisofi1"]:
+        client.post("/users/temp", json={"username":username, "name":"Sofia", "email":f"{username}@gmail.com"}, headers=headers)
+
+    response_get = client.get("/users", params={"filter": "sofi%", "limit": 2}, headers=headers)
+    assert [user["username"] for user in response_get.json()] == ["sofisofi", "sofisofia"]
+    cursor = response_get.headers["X-Next-Cursor"]
+
+    response_get = client.get("/users", params={"filter": "sofi%", "limit": 2, "cursor": cursor}, headers=headers)
+    assert [user["username"] for user in response_get.json()] == ["sofisofi1"]
+    assert "X-Next-Cursor" not in response_get.headers
+
+def test_get_users_invalid_cursor(setup):
+    response_get = client.get("/users", params={"cursor": "not-a-cursor"}, headers=headers)
+    assert response_get.status_code == 400
+    assert response_get.json()["detail"] == "Error retrieving users"
+
+def raw_cursor(values) -> str:
+    # a well-formed cursor whose values keep their JSON types
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+@pytest.mark.parametrize("values", [[1, 2], [None, None], ["2020-01-01", 5]])
+def test_get_users_cursor_of_wrong_types(setup, values):
+    response_get = client.get("/users", params={"cursor": raw_cursor(values)}, headers=headers)
+    assert response_get.status_code == 400
+
+def test_get_users_limit_over_max(setup):
+    response_get = client.get("/users", params={"limit": 100000}, headers=headers)
+    assert response_get.status_code == 422
+
+def test_get_followers_paginated_by_followed_at(setup):
+    response_post = client.post("/users/temp", json={"username":"followed", "name":"Followed", "email":"followed@gmail.com"}, headers=headers)
+    followed_user_id = response_post.json()["id"]
+    for i in range(3):
+        follower_id = client.post("/users/temp", json={"username":f"follower{i}", "name":"Follower", "email":f"follower{i}@gmail.com"}, headers=headers).json()["id"]
+        client.post(f"/users/follow/{followed_user_id}/", json={"user_id": follower_id}, headers=headers)
+
+    response_get = client.get(f"/users/followers/{followed_user_id}/", params={"limit": 2}, headers=headers)
+    assert [user["username"] for user in response_get.json()] == ["follower0", "follower1"]
+
+    cursor = response_get.headers["X-Next-Cursor"]
+    response_get = client.get(f"/users/followers/{followed_user_id}/", params={"limit": 2, "cursor": cursor}, headers=headers)
+    assert [user["username"] for user in response_get.json()] == ["follower2"]
+    assert "X-Next-Cursor" not in response_get.headers
+
+def test_get_followers_and_following_query_count_is_constant(setup):
+    from database.instrumentation import assert_max_queries
+
+    followed_user_id = client.post("/users/temp", json={"username":"followed", "name":"Followed", "email":"followed@gmail.com"}, headers=headers).json()["id"]
+
+    def follow_and_count(n):
+        for i in range(n):
+            follower_id = client.post("/users/temp", json={"username":f"follower{n}_{i}", "name":"Follower", "email":f"follower{n}_{i}@gmail.com"}, headers=headers).json()["id"]
+            client.post(f"/users/follow/{followed_user_id}/", json={"user_id": follower_id}, headers=headers)
+        with assert_max_queries(1) as queries:
+            followers = client.get(f"/users/followers/{followed_user_id}/", headers=headers).json()
+        return len(followers), queries.statements
+
+    followers_few, statements_few = follow_and_count(1)
+    followers_many, statements_many = follow_and_count(10)
+    assert (followers_few, followers_many) == (1, 11)
+    assert statements_few == statements_many == 1
+
+def test_get_near_users_sorted_by_distance_within_radius(setup):
+    locations = {
+        "user1": (-34.6274, -58.4431),
+        "user2": (-34.7000, -58.4431), # ~8 km
+        "user3": (-34.6300, -58.4431), # ~0.3 km
+        "user4": (-34.9000, -58.4431), # ~30 km
+        "user5": (34.0522, -118.2437),
+    }
+    user_ids = {}
+    for username, (lat, long) in locations.items():
+        user_id = client.post("/users/temp", json={"username":username, "name":"User", "email":f"{username}@gmail.com"}, headers=headers).json()["id"]
+        client.put(f"/users/{user_id}", json={"supabase_id": user_id, "birthdate": "", "locationLat": lat, "locationLong": long, "profilePic": ""}, headers=headers)
+        user_ids[username] = user_id
+
+    response_get = client.get(f"/users/near/{user_ids['user1']}/", headers=headers)
+    assert [user["username"] for user in response_get.json()] == ["user3", "user2"]
+    assert [round(user["distance_km"]) for user in response_get.json()] == [0, 8]
+
+    response_get = client.get(f"/users/near/{user_ids['user1']}/", params={"radius_km": 50}, headers=headers)
+    assert [user["username"] for user in response_get.json()] == ["user3", "user2", "user4"]
+
+    response_get = client.get(f"/users/near/{user_ids['user1']}/", params={"radius_km": 0}, headers=headers)
+    assert response_get.status_code == 422
+
+def test_get_near_users_across_antimeridian(setup):
+    user_ids = []
+    for username, long in [("user1", 179.99), ("user2", -179.99)]:
+        user_id = client.post("/users/temp", json={"username":username, "name":"User", "email":f"{username}@gmail.com"}, headers=headers).json()["id"]
+        client.put(f"/users/{user_id}", json={"supabase_id": user_id, "birthdate": "", "locationLat": 0.0, "locationLong": long, "profilePic": ""}, headers=headers)
+        user_ids.append(user_id)
+
+    response_get = client.get(f"/users/near/{user_ids[0]}/", headers=headers)
+    assert [user["username"] for user in response_get.json()] == ["user2"]
+
+def test_get_users_with_common_interests_ranked_by_shared_interests(setup):
+    interests = {
+        "user1": "music,reading,Sports",
+        "user2": "music",
+        "user3": "sports, reading,music",
+        "user4": "travel",
+        "user5": ",reading,",
+    }
+    user_ids = {}
+    for username, user_interests in interests.items():
+        user_id = client.post("/users/temp", json={"username":username, "name":"User", "email":f"{username}@gmail.com"}, headers=headers).json()["id"]
+        client.put(f"/users/{user_id}", json={"supabase_id": user_id, "birthdate": "", "locationLat": 0.0, "locationLong": 0.0, "profilePic": ""}, headers=headers)
+        client.put(f"/users/edit/{user_id}", json={"interests": user_interests}, headers=headers)
+        user_ids[username] = user_id
+
+    response_get = client.get(f"/users/common-interests/{user_ids['user1']}/", params={"limit": 2}, headers=headers)
+    assert response_get.status_code == 200
+    assert [(user["username"], user["shared_interests"]) for user in response_get.json()] == [("user3", 3), ("user2", 1)]
+
+    cursor = response_get.headers["X-Next-Cursor"]
+    response_get = client.get(f"/users/common-interests/{user_ids['user1']}/", params={"limit": 2, "cursor": cursor}, headers=headers)
+    assert [(user["username"], user["shared_interests"]) for user in response_get.json()] == [("user5", 1)]
+    assert "X-Next-Cursor" not in response_get.headers
+
+    # editing interests replaces the indexed ones
+    client.put(f"/users/edit/{user_ids['user3']}", json={"interests": "travel"}, headers=headers)
+    response_get = client.get(f"/users/common-interests/{user_ids['user1']}/", headers=headers)
+    assert [user["username"] for user in response_get.json()] == ["user2", "user5"]
+
+def test_get_users_with_common_interests_invalid_user(setup):
+    response_get = client.get("/users/common-interests/invalid/", headers=headers)
+    assert response_get.status_code == 400
+
+def create_follow_graph(follows: dict) -> dict:
+    # follows: username -> usernames it follows, in follow order
+    user_ids = {}
+    for username in follows:
+        user_ids[username] = client.post("/users/temp", json={"username":username, "name":"User", "email":f"{username}@gmail.com"}, headers=headers).json()["id"]
+    for username, followed in follows.items():
+        for followed_username in followed:
+            client.post(f"/users/follow/{user_ids[followed_username]}/", json={"user_id": user_ids[username]}, headers=headers)
+    return user_ids
+
+SUGGESTIONS_GRAPH = {
+    "me": ["a", "b", "c"],
+    "a": ["x", "y", "b", "me"],
+    "b": ["x", "y", "z"],
+    "c": ["x"],
+    "x": [],
+    "y": [],
+    "z": [],
+}
+
+def test_follow_suggestions_ranked_by_mutual_connections(setup):
+    user_ids = create_follow_graph(SUGGESTIONS_GRAPH)
+
+    response_get = client.get(f"/users/suggestions/{user_ids['me']}/", params={"limit": 2}, headers=headers)
+    assert response_get.status_code == 200
+    # b is followed already and me is the user, neither is suggested
+    assert [(user["username"], user["mutual_connections"]) for user in response_get.json()] == [("x", 3), ("y", 2)]
+    from business_logic.users.users_schemas import SuggestedUserResponse
+    assert all(SuggestedUserResponse.model_validate(user).model_dump(mode="json") == user for user in response_get.json())
+
+    cursor = response_get.headers["X-Next-Cursor"]
+    response_get = client.get(f"/users/suggestions/{user_ids['me']}/", params={"limit": 2, "cursor": cursor}, headers=headers)
+    assert [(user["username"], user["mutual_connections"]) for user in response_get.json()] == [("z", 1)]
+    assert "X-Next-Cursor" not in response_get.headers
+
+    # following a suggestion removes it
+    client.post(f"/users/follow/{user_ids['x']}/", json={"user_id": user_ids["me"]}, headers=headers)
+    response_get = client.get(f"/users/suggestions/{user_ids['me']}/", headers=headers)
+    assert [user["username"] for user in response_get.json()] == ["y", "z"]
+
+    response_get = client.get(f"/users/suggestions/{user_ids['z']}/", headers=headers)
+    assert response_get.status_code == 200
+    assert response_get.json() == []
+
+def test_follow_suggestions_walk_is_bounded(setup):
+    from sqlalchemy.orm import Session
+    from uuid import UUID
+    from database.db import suggestions_page
+
+    user_ids = create_follow_graph(SUGGESTIONS_GRAPH)
+    id_usernames = {UUID(user_id): username for username, user_id in user_ids.items()}
+
+    def suggested(max_following: int, fanout: int) -> dict:
+        with Session(setup.engine) as session:
+            rows = session.execute(suggestions_page(UUID(user_ids["me"]), 10, None, max_following, fanout)).all()
+        return {id_usernames[row.id]: row.mutual_connections for row in rows}
+
+    assert suggested(1000, 100) == {"x": 3, "y": 2, "z": 1}
+    # only the latest follow of me (c)
+    assert suggested(1, 100) == {"x": 1}
+    # only the latest follow of a (me), b (z) and c (x)
+    assert suggested(1000, 1) == {"z": 1, "x": 1}
+
+def test_follow_suggestions_invalid_user_or_cursor(setup):
+    response_get = client.get("/users/suggestions/invalid/", headers=headers)
+    assert response_get.status_code == 400
+    user_id = client.post("/users/temp", json={"username":"sofisofi", "name":"Sofia", "email":"sofia@gmail.com"}, headers=headers).json()["id"]
+    response_get = client.get(f"/users/suggestions/{user_id}/", params={"cursor": "invalid"}, headers=headers)
+    assert response_get.status_code == 400
+
+def test_search_users_ranked_and_paginated(setup):
+    for username, name in [("xsofia", "Other"), ("sofia_b", "Other"), ("sofia", "Other"), ("user1", "Sofia")]:
+        client.post("/users/temp", json={"username":username, "name":name, "email":f"{username}@gmail.com"}, headers=headers)
+
+    response_get = client.get("/users/search/", params={"username": "Sofia", "limit": 3}, headers=headers)
+    assert response_get.status_code == 200
+    # exact matches (username or name) first, then prefixes, then substrings
+    assert [user["username"] for user in response_get.json()] == ["sofia", "user1", "sofia_b"]
+
+    cursor = response_get.headers["X-Next-Cursor"]
+    response_get = client.get("/users/search/", params={"username": "Sofia", "limit": 3, "cursor": cursor}, headers=headers)
+    assert [user["username"] for user in response_get.json()] == ["xsofia"]
+    assert "X-Next-Cursor" not in response_get.headers
+
+def test_search_users_escapes_wildcards(setup):
+    client.post("/users/temp", json={"username":"sofisofi", "name":"Sofia", "email":"sofia@gmail.com"}, headers=headers)
+    client.post("/users/temp", json={"username":"sofi_a", "name":"Other", "email":"sofi@gmail.com"}, headers=headers)
+
+    response_get = client.get("/users/search/", params={"username": "sofi_"}, headers=headers)
+    assert [user["username"] for user in response_get.json()] == ["sofi_a"]
+    response_get = client.get("/users/search/", params={"username": "%"}, headers=headers)
+    assert response_get.status_code == 404
+
+def test_search_users_pages_reach_every_match(setup):
+    usernames = ["xsofia0", "sofia_b", "xsofia1", "sofia", "xsofia2", "sofia_c", "xsofia3", "xsofia4"]
+    for username in usernames:
+        client.post("/users/temp", json={"username":username, "name":"Other", "email":f"{username}@gmail.com"}, headers=headers)
+
+    pages, cursor = [], None
+    while True:
+        params = {"username": "sofia", "limit": 2, **({"cursor": cursor} if cursor else {})}
+        response_get = client.get("/users/search/", params=params, headers=headers)
+        pages.append([user["username"] for user in response_get.json()])
+        cursor = response_get.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    # pages cross the exact / prefix / substring boundaries, no match is left out
+    assert pages == [["sofia", "sofia_b"], ["sofia_c", "xsofia0"], ["xsofia1", "xsofia2"], ["xsofia3", "xsofia4"]]
+
+def test_search_users_invalid_cursor(setup):
+    response_get = client.get("/users/search/", params={"username": "sofi", "cursor": "invalid"}, headers=headers)
+    assert response_get.status_code == 400
+
+def test_search_users_cursor_of_wrong_types(setup):
+    cursor = raw_cursor([None, "2020-01-01", "00000000-0000-4000-8000-000000000001"])
+    response_get = client.get("/users/search/", params={"username": "sofi", "cursor": cursor}, headers=headers)
+    assert response_get.status_code == 400
+
+def test_get_users_with_filter_from_username_index(setup):
+    from routers.routers import services
+    for username in ["sofisofi", "otheruser", "sofisofia"]:
+        client.post("/users/temp", json={"username":username, "name":"Sofia", "email":f"{username}@gmail.com"}, headers=headers)
+    # entries added by previous tests' inserts are discarded lazily, start from a fresh index
+    services.database.username_index.clear()
+    services.database.load_username_index()
+    assert services.database.username_index.ready
+
+    # users created after loading are indexed on insert
+    client.post("/users/temp", json={"username":"SofiSofi1", "name":"Sofia", "email":"sofisofi1@gmail.com"}, headers=headers)
+    lookups = services.database.username_index.lookups
+
+    response_get = client.get("/users", params={"filter": "sofi%", "limit": 2}, headers=headers)
+    assert [user["username"] for user in response_get.json()] == ["sofisofi", "sofisofia"]
+    cursor = response_get.headers["X-Next-Cursor"]
+    response_get = client.get("/users", params={"filter": "sofi%", "limit": 2, "cursor": cursor}, headers=headers)
+    assert [user["username"] for user in response_get.json()] == ["SofiSofi1"]
+    assert "X-Next-Cursor" not in response_get.headers
+    assert services.database.username_index.lookups == lookups + 2
+
+    # other patterns still go to the database
+    response_get = client.get("/users", params={"filter": "sofisofi"}, headers=headers)
+    assert [user["username"] for user in response_get.json()] == ["sofisofi"]
+    assert services.database.username_index.lookups == lookups + 2
+
+    # users deleted by another process are dropped from the index
+    Database(get_engine()).clear_table()
+    response_get = client.get("/users", params={"filter": "sofi%"}, headers=headers)
+    assert response_get.json() == []
+    assert len(services.database.username_index) == 1
+
+def test_get_authors_batch(setup):
+    user_ids = [client.post("/users/temp", json={"username":f"user{i}", "name":"User", "email":f"user{i}@gmail.com"}, headers=headers).json()["id"] for i in range(3)]
+    client.put(f"/users/{user_ids[2]}", json={"supabase_id": user_ids[2], "birthdate": "", "locationLat": 0.0, "locationLong": 0.0, "profilePic": ""}, headers=headers)
+    client.put(f"/users/edit/{user_ids[2]}", json={"interests": "music"}, headers=headers)
+
+    response_post = client.post("/users/authors/batch", json={"ids": [user_ids[2], user_ids[0]], "usernames": ["user1", "user0", "unknown"]}, headers=headers)
+    assert response_post.status_code == 200
+    assert [(user["username"], user["interests"]) for user in response_post.json()] == [("user2", "music"), ("user0", None), ("user1", None)]
+
+    response_post = client.post("/users/authors/batch", json={"usernames": ["unknown"]}, headers=headers)
+    assert response_post.status_code == 200
+    assert response_post.json() == []
+
+def test_get_authors_batch_invalid_id(setup):
+    response_post = client.post("/users/authors/batch", json={"ids": ["invalid-id"]}, headers=headers)
+    assert response_post.status_code == 422
+
+def test_follow_counters_on_profile(setup):
+    user_ids = []
+    for i in range(3):
+        user_id = client.post("/users/temp", json={"username":f"user{i}", "name":"User", "email":f"user{i}@gmail.com"}, headers=headers).json()["id"]
+        client.put(f"/users/{user_id}", json={"supabase_id": user_id, "birthdate": "", "locationLat": 0.0, "locationLong": 0.0, "profilePic": ""}, headers=headers)
+        user_ids.append(user_id)
+
+    def counters(user_id):
+        user = client.get(f"/users/{user_id}", headers=headers).json()
+        return user["followers_count"], user["following_count"]
+
+    assert counters(user_ids[0]) == (0, 0)
+    client.post(f"/users/follow/{user_ids[0]}/", json={"user_id": user_ids[1]}, headers=headers)
+    client.post(f"/users/follow/{user_ids[0]}/", json={"user_id": user_ids[2]}, headers=headers)
+    # already following, nothing changes
+    assert client.post(f"/users/follow/{user_ids[0]}/", json={"user_id": user_ids[2]}, headers=headers).status_code == 404
+    assert counters(user_ids[0]) == (2, 0)
+    assert counters(user_ids[1]) == (0, 1)
+
+    client.request("DELETE", f"/users/unfollow/{user_ids[0]}/", json={"user_id": user_ids[1]}, headers=headers)
+    # not following anymore, nothing changes
+    assert client.request("DELETE", f"/users/unfollow/{user_ids[0]}/", json={"user_id": user_ids[1]}, headers=headers).status_code == 404
+    assert counters(user_ids[0]) == (1, 0)
+    assert counters(user_ids[1]) == (0, 0)
+
+def test_reconcile_follow_counters_repairs_drift(setup):
+    from sqlalchemy import text
+    from routers.routers import services
+
+    user_ids = [client.post("/users/temp", json={"username":f"user{i}", "name":"User", "email":f"user{i}@gmail.com"}, headers=headers).json()["id"] for i in range(3)]
+    client.post(f"/users/follow/{user_ids[0]}/", json={"user_id": user_ids[1]}, headers=headers)
+    with setup.engine.begin() as connection:
+        connection.execute(text("UPDATE users SET followers_count = 7, following_count = 3"))
+
+    assert setup.reconcile_follow_counters(batch_size=2) == 3
+    assert setup.reconcile_follow_counters() == 0
+    services.profile_cache.clear()
+    user = client.get(f"/users/{user_ids[0]}", headers=headers).json()
+    assert (user["followers_count"], user["following_count"]) == (1, 0)
+
+def test_bulk_follow_and_unfollow(setup):
+    from sqlalchemy import event
+    from routers.routers import services
+
+    user_ids = [client.post("/users/temp", json={"username":f"user{i}", "name":"User", "email":f"user{i}@gmail.com"}, headers=headers).json()["id"] for i in range(4)]
+    client.post(f"/users/follow/{user_ids[1]}/", json={"user_id": user_ids[0]}, headers=headers)
+    unknown_id = "7f6b2c4e-1d2a-4c1b-9a61-2f1f4f5d0e11"
+    edges = [
+        {"follower_id": user_ids[0], "followed_id": user_ids[1]},
+        {"follower_id": user_ids[0], "followed_id": user_ids[2]},
+        {"follower_id": user_ids[0], "followed_id": user_ids[3]},
+        {"follower_id": user_ids[0], "followed_id": unknown_id},
+        {"follower_id": user_ids[3], "followed_id": user_ids[2]},
+    ]
+
+    statements = []
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(services.database.engine, "before_cursor_execute", count_statement)
+    try:
+        response_post = client.post("/users/bulk/follow/", json={"edges": edges}, headers=headers)
+    finally:
+        event.remove(services.database.engine, "before_cursor_execute", count_statement)
+    assert response_post.status_code == 200
+    assert [edge["status"] for edge in response_post.json()] == ["already_following", "followed", "followed", "user_not_found", "followed"]
+    assert len(statements) == 1
+
+    response_get = client.get(f"/users/following/{user_ids[0]}/", headers=headers)
+    assert sorted(user["username"] for user in response_get.json()) == ["user1", "user2", "user3"]
+    assert client.get(f"/users/{user_ids[2]}", headers=headers).json()["followers_count"] == 2
+
+    response_post = client.post("/users/bulk/unfollow/", json={"edges": edges[1:3] + [{"follower_id": user_ids[2], "followed_id": user_ids[0]}]}, headers=headers)
+    assert [edge["status"] for edge in response_post.json()] == ["unfollowed", "unfollowed", "not_following"]
+    response_get = client.get(f"/users/following/{user_ids[0]}/", headers=headers)
+    assert [user["username"] for user in response_get.json()] == ["user1"]
+
+    # counters were kept in step with the edges
+    assert setup.reconcile_follow_counters() == 0
+
+def test_concurrent_bulk_follows_lock_users_in_order(setup):
+    import random
+    from concurrent.futures import ThreadPoolExecutor
+    from business_logic.users.users_schemas import FollowEdge
+
+    user_ids = [setup.insert_user(UserAccountBase(username=f"user{i}", name="User", email=f"user{i}@gmail.com")).id for i in range(60)]
+
+    def bulk(seed):
+        # overlapping users, each call in its own order
+        rng = random.Random(seed)
+        for _ in range(8):
+            edges = [FollowEdge(follower_id=follower_id, followed_id=followed_id) for follower_id, followed_id in (rng.sample(user_ids, 2) for _ in range(150))]
+            setup.bulk_follow(edges)
+            setup.bulk_unfollow(edges[::-1])
+
+    def single(seed):
+        rng = random.Random(seed)
+        for _ in range(60):
+            follower_id, followed_id = (str(user_id) for user_id in rng.sample(user_ids, 2))
+            if setup.follow_user(follower_id, followed_id) is not None:
+                setup.unfollow_user(follower_id, followed_id)
+
+    with ThreadPoolExecutor(6) as executor:
+        # a deadlock fails a bulk call (raised here)
+        for future in [executor.submit(bulk, seed) for seed in range(4)] + [executor.submit(single, seed) for seed in range(4, 6)]:
+            future.result()
+    assert setup.reconcile_follow_counters() == 0
+
+def test_bulk_follow_too_many_edges(setup):
+    edge = {"follower_id": "7f6b2c4e-1d2a-4c1b-9a61-2f1f4f5d0e11", "followed_id": "7f6b2c4e-1d2a-4c1b-9a61-2f1f4f5d0e12"}
+    response_post = client.post("/users/bulk/follow/", json={"edges": [edge] * 1001}, headers=headers)
+    assert response_post.status_code == 422
+
+def test_export_users_and_followers(setup):
+    from datetime import datetime, timedelta, timezone
+    from database import db
+
+    user_ids = [client.post("/users/temp", json={"username":f"user{i}", "name":"User", "email":f"user{i}@gmail.com"}, headers=headers).json()["id"] for i in range(3)]
+    client.put(f"/users/{user_ids[0]}", json={"supabase_id": user_ids[0], "birthdate": "", "locationLat": -34.6274, "locationLong": -58.4431, "profilePic": ""}, headers=headers)
+    client.post(f"/users/follow/{user_ids[1]}/", json={"user_id": user_ids[0]}, headers=headers)
+    client.post(f"/users/follow/{user_ids[2]}/", json={"user_id": user_ids[0]}, headers=headers)
+
+    # several fetch batches end up in the same stream
+    batch_size, db.EXPORT_BATCH_SIZE = db.EXPORT_BATCH_SIZE, 2
+    try:
+        response_get = client.get("/users/export/", headers=headers)
+    finally:
+        db.EXPORT_BATCH_SIZE = batch_size
+    assert response_get.status_code == 200
+    assert response_get.headers["content-type"] == "application/x-ndjson"
+    users = {user["username"]: user for user in map(json.loads, response_get.text.splitlines())}
+    assert sorted(users) == ["user0", "user1", "user2"]
+    assert users["user0"]["locationLat"] == -34.6274
+    assert users["user0"]["following_count"] == 2
+    assert users["user1"]["locationLat"] is None
+
+    response_get = client.get("/users/export/followers/", headers=headers)
+    follows = [json.loads(line) for line in response_get.text.splitlines()]
+    assert sorted(follow["followed_id"] for follow in follows) == sorted(user_ids[1:])
+    assert all(follow["follower_id"] == user_ids[0] for follow in follows)
+
+    now = datetime.now(timezone.utc)
+    response_get = client.get("/users/export/", params={"since": (now - timedelta(minutes=1)).isoformat()}, headers=headers)
+    assert len(response_get.text.splitlines()) == 3
+    response_get = client.get("/users/export/followers/", params={"since": (now + timedelta(minutes=1)).isoformat()}, headers=headers)
+    assert response_get.text == ""
+
+def test_export_invalid_range(setup):
+    response_get = client.get("/users/export/", params={"since": "2024-02-01T00:00:00", "until": "2024-01-01T00:00:00"}, headers=headers)
+    assert response_get.status_code == 400
+
+def test_list_bodies_match_response_models(setup):
+    from business_logic.users.users_schemas import UserCreationResponse, UserInfoResponse
+
+    user_ids = [client.post("/users/temp", json={"username":f"user{i}", "name":"User", "email":f"user{i}@gmail.com"}, headers=headers).json()["id"] for i in range(3)]
+    for user_id in user_ids[1:]:
+        client.post(f"/users/follow/{user_ids[0]}/", json={"user_id": user_id}, headers=headers)
+
+    # bodies are sent without response_model validation, they must still be what it would produce
+    response_get = client.get(f"/users/followers/{user_ids[0]}/", params={"limit": 1}, headers=headers)
+    assert response_get.headers["content-type"] == "application/json"
+    assert "X-Next-Cursor" in response_get.headers
+    for body in [response_get.json(), client.get("/users", headers=headers).json()]:
+        assert body and all(UserCreationResponse.model_validate(user).model_dump(mode="json") == user for user in body)
+    authors = client.post("/users/authors/batch", json={"ids": user_ids}, headers=headers).json()
+    assert [author["id"] for author in authors] == user_ids
+    assert all(UserInfoResponse.model_validate(author).model_dump(mode="json") == author for author in authors)
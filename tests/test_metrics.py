@@ -0,0 +1,185 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from src.main import app
+from loguru import logger
+from database import instrumentation
+from database.async_db import AsyncDatabase
+from database.db import Database
+from database.instrumentation import assert_max_queries, track_queries, instrument_engine
+from utils.engine import get_engine, get_async_engine
+from utils.metrics import MetricsRegistry
+
+headers = {
+    "Authorization": 'Bearer valid'
+}
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def setup(migrated):
+    db = Database(get_engine())
+    db.clear_table()
+    yield db
+    db.clear_table()
+
+@pytest.fixture(scope="function")
+def warnings():
+    messages = []
+    handler = logger.add(lambda message: messages.append(str(message)), level="WARNING")
+    yield messages
+    logger.remove(handler)
+
+def sample(body: str, name: str) -> float:
+    for line in body.splitlines():
+        if line.startswith(name + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+def test_histogram_renders_cumulative_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1))
+    for value in [0.05, 0.1, 0.5, 2]:
+        histogram.observe(value, '/a"b')
+    body = registry.render()
+    assert "# TYPE latency_seconds histogram" in body
+    assert sample(body, 'latency_seconds_bucket{route="/a\\"b",le="0.1"}') == 2
+    assert sample(body, 'latency_seconds_bucket{route="/a\\"b",le="1.0"}') == 3
+    assert sample(body, 'latency_seconds_bucket{route="/a\\"b",le="+Inf"}') == 4
+    assert sample(body, 'latency_seconds_count{route="/a\\"b"}') == 4
+    assert sample(body, 'latency_seconds_sum{route="/a\\"b"}') == pytest.approx(2.65)
+
+def test_registry_returns_registered_metrics():
+    registry = MetricsRegistry()
+    gauge = registry.gauge("in_flight", "In flight")
+    assert registry.gauge("in_flight", "In flight") is gauge
+    with pytest.raises(ValueError):
+        registry.histogram("in_flight", "In flight")
+
+def test_request_metrics_by_route_template(setup):
+    user_id = client.post("/users/temp", json={"username":"sofisofi", "name":"Sofia", "email":"sofia@gmail.com"}, headers=headers).json()["id"]
+    series = '{method="GET",route="/users/{user_id}"'
+    before = client.get("/monitoring/metrics", headers=headers).text
+    client.get(f"/users/{user_id}", headers=headers)
+    client.get(f"/users/{user_id}", headers=headers)
+    client.get("/no/such/path", headers=headers)
+    response = client.get("/monitoring/metrics", headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    body = response.text
+    count = 'http_request_duration_seconds_count' + series + ',status="200"}'
+    assert sample(body, count) - sample(before, count) == 2
+    # the second read is served by the profile cache, without statements
+    statements = 'http_request_db_statements_sum' + series + '}'
+    assert sample(body, statements) - sample(before, statements) == 1
+    assert sample(body, 'http_request_db_seconds_count' + series + '}') >= 2
+    assert sample(body, 'http_request_duration_seconds_count{method="GET",route="unmatched",status="404"}') >= 1
+    # the scrape itself is in flight while it renders
+    assert sample(body, "http_requests_in_flight") == 1
+    assert "db_pool_checked_out" in body
+
+def test_track_queries_counts_sync_and_async_statements():
+    engine = get_engine()
+    instrument_engine(engine)
+    with track_queries() as queries:
+        with engine.connect() as connection:
+            connection.execute(text("SELECT 1"))
+            connection.execute(text("SELECT pg_sleep(0.01)"))
+    engine.dispose()
+    assert queries.statements == 2
+    assert queries.seconds >= 0.01
+
+    async def scenario():
+        async_engine = get_async_engine()
+        instrument_engine(async_engine)
+        try:
+            with track_queries() as async_queries:
+                async with async_engine.connect() as connection:
+                    await connection.execute(text("SELECT 1"))
+            return async_queries
+        finally:
+            await async_engine.dispose()
+
+    assert asyncio.run(scenario()).statements == 1
+
+def test_slow_queries_are_logged_with_parameters_and_method(setup, warnings, monkeypatch):
+    monkeypatch.setattr(instrumentation, "SLOW_QUERY_MS", 1e-6)
+    user_id = "00000000-0000-0000-0000-000000000001"
+    database = Database(get_engine())
+    instrument_engine(database.engine)
+    try:
+        database.get_user_by_id(user_id)
+    finally:
+        database.engine.dispose()
+    slow = [message for message in warnings if "Slow query" in message]
+    assert slow and "Database.get_user_by_id" in slow[0] and user_id in slow[0]
+
+    async def scenario():
+        async_database = AsyncDatabase(get_async_engine())
+        instrument_engine(async_database.engine)
+        try:
+            await async_database.get_user_by_id(user_id)
+        finally:
+            await async_database.engine.dispose()
+
+    warnings.clear()
+    asyncio.run(scenario())
+    assert any("AsyncDatabase.get_user_by_id" in message for message in warnings)
+
+def test_repeated_statements_are_flagged_as_n_plus_one(setup, warnings, monkeypatch):
+    monkeypatch.setattr(instrumentation, "N_PLUS_ONE_THRESHOLD", 3)
+    database = Database(get_engine())
+    instrument_engine(database.engine)
+    try:
+        with track_queries() as queries:
+            for i in range(4):
+                database.get_user_by_id(f"00000000-0000-0000-0000-00000000000{i}")
+    finally:
+        database.engine.dispose()
+    assert len(queries.n_plus_one) == 1
+    flagged = [message for message in warnings if "Probable N+1" in message]
+    assert len(flagged) == 1 and "Database.get_user_by_id" in flagged[0]
+
+def test_instrumentation_errors_do_not_fail_statements(setup, warnings, monkeypatch):
+    def broken():
+        raise AttributeError("co_qualname")
+    monkeypatch.setattr(instrumentation, "SLOW_QUERY_MS", 1e-6)
+    monkeypatch.setattr(instrumentation, "calling_method", broken)
+    database = Database(get_engine())
+    instrument_engine(database.engine)
+    try:
+        assert database.get_user_by_id("00000000-0000-0000-0000-000000000001") is None
+    finally:
+        database.engine.dispose()
+    assert any("Query instrumentation failed" in message for message in warnings)
+
+def test_insert_user_runs_one_statement(setup):
+    from business_logic.users.users_schemas import UserAccountBase
+    database = Database(get_engine())
+    instrument_engine(database.engine)
+    try:
+        # the committed instance is not reloaded
+        with assert_max_queries(1):
+            user = database.insert_user(UserAccountBase(username="sofisofi", name="Sofia", email="sofia@gmail.com"))
+        with database.engine.connect() as connection:
+            createdat, internal_id = connection.execute(text("SELECT createdat, internal_id FROM users WHERE id = :id"), {"id": user.id}).one()
+    finally:
+        database.engine.dispose()
+    # indexed with the stored sort key
+    assert database.username_index.lookup("sofi", 1) == [internal_id]
+    assert database.username_index.lookup("sofi", 1, after=(createdat, internal_id)) == []
+
+def test_assert_max_queries_counts_statements_of_requests(setup):
+    user_id = client.post("/users/temp", json={"username":"sofisofi", "name":"Sofia", "email":"sofia@gmail.com"}, headers=headers).json()["id"]
+    with assert_max_queries(1) as queries:
+        client.get(f"/users/followers/{user_id}/", headers=headers)
+    assert queries.statements == 1
+
+    with pytest.raises(AssertionError) as error:
+        with assert_max_queries(1):
+            client.get(f"/users/followers/{user_id}/", headers=headers)
+            client.get(f"/users/following/{user_id}/", headers=headers)
+    assert "2 statements executed, at most 1 expected" in str(error.value)
+    assert "SELECT" in str(error.value)
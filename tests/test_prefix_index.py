@@ -0,0 +1,89 @@
+from datetime import datetime, timedelta
+from uuid import uuid4
+from utils.prefix_index import PrefixIndex
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def make_rows(usernames):
+    start = datetime(2024, 1, 1)
+    return [(username, start + timedelta(seconds=i), uuid4()) for i, username in enumerate(usernames)]
+
+def test_lookup_in_creation_order_case_insensitive():
+    rows = make_rows(["sofia", "Sofisofi", "other", "sofi", "so"])
+    index = PrefixIndex()
+    index.load(rows)
+    ids = {username: internal_id for username, _, internal_id in rows}
+    assert index.lookup("SOFI", 10) == [ids["sofia"], ids["Sofisofi"], ids["sofi"]]
+    assert index.lookup("sofi", 2) == [ids["sofia"], ids["Sofisofi"]]
+    assert index.lookup("x", 10) == []
+
+def test_lookup_after_sort_key():
+    rows = make_rows(["sofia", "sofib", "sofic"])
+    index = PrefixIndex()
+    index.load(rows)
+    _, createdat, internal_id = rows[0]
+    assert index.lookup("sofi", 10, (createdat, internal_id)) == [rows[1][2], rows[2][2]]
+
+def test_add_while_loading_and_discard():
+    rows = make_rows(["sofia", "sofib"])
+    index = PrefixIndex()
+    assert not index.ready
+    index.add(*rows[1])
+    index.load(rows)
+    assert index.ready
+    assert len(index) == 2
+    index.add(*rows[1])
+    assert len(index) == 2
+    index.discard({rows[0][2]})
+    assert index.lookup("sofi", 10) == [rows[1][2]]
+
+def test_refresh_interval_and_watermark():
+    clock = FakeClock()
+    rows = make_rows(["sofia", "sofib"])
+    index = PrefixIndex(refresh_interval=5, clock=clock)
+    assert not index.needs_refresh()
+    index.load(rows[:1])
+    assert index.watermark() == rows[0][1]
+    clock.now = 5
+    assert index.needs_refresh()
+    index.refresh(rows)
+    assert not index.needs_refresh()
+    assert index.watermark() == rows[1][1]
+    assert len(index) == 2
+
+def expected(rows, prefix, limit, after=None):
+    matches = sorted((createdat, internal_id) for username, createdat, internal_id in rows if username.lower().startswith(prefix))
+    return [internal_id for createdat, internal_id in matches if after is None or (createdat, internal_id) > after][:limit]
+
+def test_short_prefixes_served_from_their_top_list():
+    rows = make_rows([f"{first}{second}user{i}" for i in range(20) for first in "ab" for second in "xy"])
+    index = PrefixIndex(top_size=8, scan_limit=4)
+    index.load(rows)
+    # 40 usernames start with "a", 20 with "ax", 11 with "axuser1" (axuser1, axuser10 to axuser19)
+    assert index.lookup("A", 5) == expected(rows, "a", 5)
+    assert index.lookup("ax", 8) == expected(rows, "ax", 8)
+    after = (rows[4][1], rows[4][2])
+    assert index.lookup("a", 3, after) == expected(rows, "a", 3, after)
+    # past the top list, or too many matches to sort: left to the database
+    assert index.lookup("a", 9) is None
+    assert index.lookup("a", 3, (rows[40][1], rows[40][2])) is None
+    assert index.lookup("axuser1", 5) is None
+    assert index.lookup("axuser19", 5) == expected(rows, "axuser19", 5)
+
+def test_top_lists_follow_adds_and_discards():
+    rows = make_rows([f"sofi{i}" for i in range(12)])
+    index = PrefixIndex(top_size=4, scan_limit=2)
+    index.load(rows[4:])
+    for row in rows[:4]:
+        index.add(*row)
+    assert index.lookup("s", 4) == expected(rows, "s", 4)
+    index.discard({rows[0][2], rows[2][2]})
+    remaining = [row for i, row in enumerate(rows) if i not in (0, 2)]
+    assert index.lookup("so", 4) == expected(remaining, "so", 4)
+    index.discard({row[2] for row in remaining[2:]})
+    assert index.lookup("sof", 4) == expected(remaining[:2], "sof", 4)
@@ -0,0 +1,100 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from src.main import app
+from database.db import Database
+from utils.engine import get_engine
+from routers.routers import services
+from business_logic.users.users_service import UserAccountService
+from business_logic.users.users_schemas import UserEditProfile
+
+headers = {
+    "Authorization": 'Bearer valid'
+}
+
+client = TestClient(app)
+
+@pytest.fixture(scope="function")
+def setup(migrated):
+    db = Database(get_engine())
+    db.clear_table()
+    services.profile_cache.clear()
+    yield db
+    db.clear_table()
+    services.profile_cache.clear()
+
+def create_user(username: str) -> str:
+    user_id = client.post("/users/temp", json={"username":username, "name":"Sofia", "email":f"{username}@gmail.com"}, headers=headers).json()["id"]
+    client.put(f"/users/{user_id}", json={"supabase_id": user_id, "birthdate": "01/01/2000", "locationLat": 0.0, "locationLong": 0.0, "profilePic": ""}, headers=headers)
+    return user_id
+
+def test_profile_served_from_cache(setup):
+    user_id = create_user("sofisofi")
+    hits = services.profile_cache.hits
+
+    first = client.get(f"/users/{user_id}", headers=headers).json()
+    second = client.get(f"/users/{user_id.upper()}", headers=headers).json()
+    assert first == second
+    assert services.profile_cache.hits == hits + 1
+
+    response_get = client.get("/monitoring/cache", headers=headers)
+    assert response_get.status_code == 200
+    assert response_get.json()["hits"] == services.profile_cache.hits
+    assert response_get.json()["size"] == 1
+
+def test_no_stale_profile_after_edit(setup):
+    user_id = create_user("sofisofi")
+    assert client.get(f"/users/{user_id}", headers=headers).json()["name"] == "Sofia"
+
+    client.put(f"/users/edit/{user_id}", json={"name": "Sofi", "interests": "music"}, headers=headers)
+    user = client.get(f"/users/{user_id}", headers=headers).json()
+    assert user["name"] == "Sofi"
+    assert user["interests"] == "music"
+
+def test_no_stale_profile_after_update(setup):
+    user_id = client.post("/users/temp", json={"username":"sofisofi", "name":"Sofia", "email":"sofisofi@gmail.com"}, headers=headers).json()["id"]
+    assert client.get(f"/users/{user_id}", headers=headers).json()["birthdate"] is None
+
+    client.put(f"/users/{user_id}", json={"supabase_id": user_id, "birthdate": "02/02/2002", "locationLat": 1.0, "locationLong": 1.0, "profilePic": "pic"}, headers=headers)
+    user = client.get(f"/users/{user_id}", headers=headers).json()
+    assert user["birthdate"] == "02/02/2002"
+    assert user["profilePic"] == "pic"
+
+class SlowDatabase:
+    """
+    get_user_by_id returns the row read before an edit that commits while it runs.
+    """
+    def __init__(self):
+        self.name = "before"
+
+    def get_user_by_id(self, user_id):
+        return {"name": self.name}
+
+    def update_user_profile(self, user_id, data):
+        self.name = data.name
+        return True
+
+def test_profile_read_racing_an_edit_is_not_cached():
+    service = UserAccountService(get_engine())
+    service.database = SlowDatabase()
+    user_id = "7f6b2c4e-1d2a-4c1b-9a61-2f1f4f5d0e11"
+
+    async def racing_read(method, *args):
+        result = method(*args)
+        if method == service.database.get_user_by_id:
+            # the edit commits and invalidates after the row was read
+            await service.update_user_profile(user_id, UserEditProfile(name="after"))
+        return result
+
+    async def direct(method, *args):
+        return method(*args)
+
+    async def scenario():
+        service._run = racing_read
+        stale = await service.get_useraccount(user_id)
+        service._run = direct
+        return stale, await service.get_useraccount(user_id)
+
+    stale, fresh = asyncio.run(scenario())
+    assert stale == {"name": "before"}
+    assert fresh == {"name": "after"}
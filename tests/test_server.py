@@ -0,0 +1,38 @@
+import runpy
+from pathlib import Path
+from types import SimpleNamespace
+from sqlalchemy import text
+import routers.routers
+from business_logic.users.users_service import LazyUserService, UserAccountService
+from utils.engine import get_engine
+
+GUNICORN_CONF = Path(__file__).parents[1] / "src" / "gunicorn.conf.py"
+
+def test_gunicorn_settings_from_env(monkeypatch):
+    monkeypatch.setenv("WEB_CONCURRENCY", "4")
+    monkeypatch.setenv("MAX_REQUESTS", "2000")
+    monkeypatch.setenv("PRELOAD_APP", "false")
+    config = runpy.run_path(str(GUNICORN_CONF))
+    assert config["workers"] == 4
+    assert config["max_requests"] == 2000
+    assert config["max_requests_jitter"] == 200
+    assert config["preload_app"] is False
+    assert config["worker_class"] == "uvicorn_worker.UvicornWorker"
+
+def test_post_fork_drops_the_inherited_service(monkeypatch):
+    config = runpy.run_path(str(GUNICORN_CONF))
+    lazy = LazyUserService(lambda: UserAccountService(get_engine()))
+    monkeypatch.setattr(routers.routers, "services", lazy)
+    engine = lazy.database.engine
+    warnings = []
+    server = SimpleNamespace(log=SimpleNamespace(warning=warnings.append))
+
+    with engine.connect() as connection:
+        config["post_fork"](server, None)
+        assert not lazy.created
+        assert len(warnings) == 1
+        # the connections of the parent are left open
+        assert connection.execute(text("SELECT 1")).scalar() == 1
+    assert lazy.database.engine is not engine
+    engine.dispose()
+    lazy.database.engine.dispose()